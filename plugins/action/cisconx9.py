@@ -3,20 +3,163 @@
 
 # Copyright: Contributors to the Ansible project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+import os
 import sys
 import copy
+import json
+import socket
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from ansible import constants as C
 from ansible.utils.display import Display
-from ansible.module_utils._text import to_text
-from ansible.module_utils.connection import Connection
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.common.json import AnsibleJSONEncoder
+from ansible.executor.module_common import get_action_args_with_defaults
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.connection import Connection, recv_data, request_builder, send_data, write_to_file_descriptor
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.loader import cliconf_loader, connection_loader, terminal_loader
+from ansible.utils.collection_loader import AnsibleCollectionConfig
 from ansible_collections.ansible.netcommon.plugins.action.network import ActionModule as ActionNetworkModule
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import load_provider
-from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import cisconx9_provider_spec
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import cisconx9_provider_spec, reset_run_state
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import classwrapper
 
 
 display = Display()
+# cisconx9_facts options which need the module process: deadline threads
+# left running on timeout, tracemalloc of the whole process
+CONTROLLER_FALLBACK = ('time_budget', 'command_timeout', 'memory_budget')
+
+
+class ModuleFailed(Exception):
+    """fail_json of ControllerModule"""
+
+    def __init__(self, result):
+        super().__init__(result.get('msg'))
+        self.result = result
+
+
+class ControllerModule:
+    """Stands in for AnsibleModule when module code runs in the action
+    plugin: validated params, persistent connection socket, warnings"""
+
+    def __init__(self, argument_spec, args, socket_path):
+        validated = ArgumentSpecValidator(argument_spec).validate(args)
+        if validated.error_messages:
+            raise ModuleFailed({'failed': True, 'msg': '; '.join(validated.error_messages)})
+        self.params = validated.validated_parameters
+        self._socket_path = socket_path
+        self.warnings = []
+
+    def warn(self, msg):
+        """Collect warning"""
+        self.warnings.append(msg)
+
+    @staticmethod
+    def debug(msg):
+        """Debug message"""
+        display.debug(msg)
+
+    @staticmethod
+    def fail_json(msg, **kwargs):
+        """Stop with failed result"""
+        raise ModuleFailed(dict(kwargs, failed=True, msg=msg))
+
+    @staticmethod
+    def jsonify(data):
+        """Same as AnsibleModule"""
+        return json.dumps(data)
+
+
+def start_session(play_context, options, task_uuid, index):
+    """start_connection (ansible-connection) of extra session index.
+    ansible-connection keys its socket on host, port, user, connection and
+    playbook pid; index is added to the pid, so each index of a host has its
+    own persistent connection, reused by later tasks while it is alive.
+    Returns the socket path"""
+    for dirname in [C.ANSIBLE_CONNECTION_PATH or os.path.dirname(sys.argv[0])] + os.environ.get('PATH', '').split(os.pathsep):
+        ansible_connection = os.path.join(dirname, 'ansible-connection')
+        if os.path.isfile(ansible_connection):
+            break
+    else:
+        raise AnsibleError("Unable to find location of 'ansible-connection'")
+    env = dict(os.environ, ANSIBLE_COLLECTIONS_PATH=os.pathsep.join(AnsibleCollectionConfig.collection_paths),
+               ANSIBLE_CLICONF_PLUGINS=cliconf_loader.print_paths(), ANSIBLE_CONNECTION_PLUGINS=connection_loader.print_paths(),
+               ANSIBLE_TERMINAL_PLUGINS=terminal_loader.print_paths())
+    rfd, wfd = os.pipe()
+    with subprocess.Popen([sys.executable, ansible_connection, f"{os.getppid()}-session{index}", task_uuid],
+                          stdin=rfd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env) as proc:
+        os.close(rfd)
+        try:
+            write_to_file_descriptor(wfd, options)
+            write_to_file_descriptor(wfd, play_context.serialize())
+        finally:
+            os.close(wfd)
+        stdout, stderr = proc.communicate()
+    try:
+        result = json.loads(to_text(stdout if proc.returncode == 0 else stderr, errors='surrogate_then_replace'))
+    except ValueError:
+        result = {'error': to_text(stderr, errors='surrogate_then_replace')}
+    if 'error' in result:
+        raise AnsibleError(result['error'])
+    return result['socket_path']
+
+
+def session_prompt(socket_path, timeout):
+    """get_prompt of session (logs it in if needed), raises socket.timeout
+    if the session does not answer in timeout seconds (busy with a command
+    of another task)"""
+    request = json.dumps(request_builder('get_prompt'), cls=AnsibleJSONEncoder)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        send_data(sock, to_bytes(request))
+        response = json.loads(to_text(recv_data(sock) or b'{}', errors='surrogate_then_replace'))
+    if 'error' in response or 'result' not in response:
+        raise ConnectionError(response.get('error', {}).get('message', 'no reply'))
+    return response['result']
+
+
+class SessionPool:
+    """Extra CLI sessions to the device of the task (session_count). Each is
+    a persistent connection of ansible-connection like the main one (see
+    start_session): it stays logged in across tasks until it is idle for
+    persistent_connect_timeout, and its commands are bounded by
+    persistent_command_timeout there. Nothing is left to close per task"""
+
+    def __init__(self, play_context, options, task_uuid, count):
+        self.play_context = play_context
+        self.options = options
+        self.task_uuid = task_uuid
+        self.count = count
+        self.paths = []
+        self.errors = []
+
+    def check(self, index):
+        """Socket path of session index logged in, or the error"""
+        try:
+            path = start_session(self.play_context, self.options, self.task_uuid, index)
+            session_prompt(path, self.options.get('persistent_connect_timeout') or 30)
+        except socket.timeout:
+            return None, f"session {index}: busy"
+        except Exception as ex:  # pylint: disable=broad-except
+            return None, f"session {index}: {to_text(ex)}"
+        return path, None
+
+    def start(self):
+        """Start or reuse sessions (logins run in parallel). Returns socket
+        paths of the ones which are logged in and idle"""
+        with ThreadPoolExecutor(max_workers=self.count) as pool:
+            for path, error in pool.map(self.check, range(2, self.count + 2)):
+                if path is not None:
+                    self.paths.append(path)
+                else:
+                    self.errors.append(error)
+        return self.paths
+
 
 @classwrapper
 class ActionModule(ActionNetworkModule):
@@ -72,5 +215,66 @@ class ActionModule(ActionNetworkModule):
             conn.send_command('exit')
             out = conn.get_prompt()
 
-        result = super(ActionModule, self).run(task_vars=task_vars)
+        action = self._task.action.split('.')[-1]
+        if action not in ('cisconx9_facts', 'cisconx9_command'):
+            return super(ActionModule, self).run(task_vars=task_vars)
+        args = get_action_args_with_defaults(self._task.resolved_action or self._task.action, self._task.args,
+                                             self._task.module_defaults, self._templar,
+                                             action_groups=self._task._parent._play._action_groups)
+        pool = self.session_pool(args, persConn)
+        if pool is not None:
+            args['sessions'] = self._task.args['sessions'] = list(args.get('sessions') or []) + pool.start()
+            for error in pool.errors:
+                display.warning(f"session_count: {error}")
+        if action == 'cisconx9_facts' and self.parse_on_controller(args):
+            return self.facts_on_controller(args, sockPath)
+        return super(ActionModule, self).run(task_vars=task_vars)
+
+    def session_pool(self, args, persConn):
+        """SessionPool of session_count - 1 extra sessions (the main
+        connection is the first one), None if not needed"""
+        try:
+            count = int(args.get('session_count') or 1)
+        except (TypeError, ValueError):
+            count = 1
+        if count < 2:
+            return None
+        if persConn == 'local':
+            display.warning('session_count needs a persistent connection (network_cli), running with one session')
+            return None
+        return SessionPool(self._play_context, self._connection.get_options(), self._task._uuid, count - 1)  # pylint: disable=protected-access
+
+    @staticmethod
+    def parse_on_controller(args):
+        """parse_on_controller is set and none of CONTROLLER_FALLBACK
+        options is (those run as a module)"""
+        if not boolean(args.get('parse_on_controller', False), strict=False):
+            return False
+        used = [key for key in CONTROLLER_FALLBACK if args.get(key)]
+        if used:
+            display.warning(f"parse_on_controller is not used with {', '.join(used)}, running as a module")
+            return False
+        return True
+
+    def facts_on_controller(self, args, socket_path):
+        """Run cisconx9_facts code here: replies come straight from the
+        persistent connection and facts are returned without a module
+        process and its JSON output. Parsing is serial (no worker
+        processes forked from the controller)"""
+        # pylint: disable=import-outside-toplevel
+        from ansible_collections.sense.cisconx9.plugins.modules.cisconx9_facts import facts_argument_spec, facts_result, gather_facts
+        reset_run_state()
+        try:
+            module = ControllerModule(facts_argument_spec(), dict(args, parse_mode='serial'), socket_path)
+            result = facts_result(module, gather_facts(module))
+        except ModuleFailed as ex:
+            return ex.result
+        except Exception as ex:  # pylint: disable=broad-except
+            # gather_facts raises errors of fetch/parse with their traceback,
+            # fail_json among them
+            if isinstance(ex.__cause__, ModuleFailed):
+                return ex.__cause__.result
+            return {'failed': True, 'msg': to_text(ex)}
+        result['warnings'] = result['warnings'] + module.warnings
+        result['changed'] = False
         return result
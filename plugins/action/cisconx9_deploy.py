@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""cisconx9_deploy action: config push to many hosts from one task
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+For each target host, its persistent connection is started (or reused)
+from its host vars the way the task executor does it for a task of that
+host, then deploy() pushes the lines over all of them.
+"""
+from ansible import constants as C
+from ansible.errors import AnsibleAction, AnsibleActionFail, AnsibleError
+from ansible.executor.task_executor import start_connection
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.deploy import DeployTarget, check_names, connection_for, deploy, plan
+from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import classwrapper
+from ansible_collections.sense.cisconx9.plugins.modules.cisconx9_deploy import deploy_argument_spec
+
+display = Display()
+
+
+@classwrapper
+class ActionModule(ActionBase):
+    """cisconx9_deploy Ansible Action Module"""
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        """Open connections of targets and deploy"""
+        result = super(ActionModule, self).run(tmp, task_vars)
+        try:
+            _, args = self.validate_argument_spec(deploy_argument_spec())
+            hostvars = (task_vars or {}).get('hostvars', {})
+            for item in args['targets']:
+                if item['host'] not in hostvars:
+                    raise AnsibleActionFail(f"cisconx9_deploy: unknown host {item['host']}")
+            try:
+                if self._task.check_mode:
+                    # No sessions are opened, nothing is sent
+                    out = plan([DeployTarget(item['host'], None, item['lines'], item['wave']) for item in args['targets']])
+                else:
+                    check_names([DeployTarget(item['host'], None, [], item['wave']) for item in args['targets']])
+                    targets = [DeployTarget(item['host'], connection_for(self.socket_path(item['host'], hostvars[item['host']])),
+                                            item['lines'], item['wave']) for item in args['targets']]
+                    out = deploy(targets, max_workers=args['max_workers'], save=args['save'],
+                                 abort_on_failure=args['abort_on_failure'], match=args['match'])
+            except ValueError as ex:
+                raise AnsibleActionFail(f"cisconx9_deploy: {ex}") from ex
+        except AnsibleAction as ex:
+            result.update(ex.result)
+            return result
+        result.update(out)
+        result['changed'] = any(dev['changed'] for dev in out['devices'].values())
+        if not out['ok']:
+            result['failed'] = True
+            result['msg'] = 'cisconx9_deploy failed on: ' + ', '.join(
+                name for name, dev in out['devices'].items() if dev['status'] == 'failed')
+        return result
+
+    def socket_path(self, host, hostvars):
+        """Persistent connection socket of host (hostvars: its HostVarsVars)"""
+        name = hostvars.get('ansible_connection') or self._play_context.connection
+        loader = self._shared_loader_obj.connection_loader
+        plugin = loader.get(name, class_only=True)
+        if plugin is None:
+            raise AnsibleActionFail(f"cisconx9_deploy: {host}: connection plugin {name} not found")
+        option_vars = C.config.get_plugin_vars('connection', plugin._load_name)  # pylint: disable=protected-access
+        names = set(option_vars).union(*C.MAGIC_VARIABLE_MAPPING.values())
+        variables = {key: hostvars[key] for key in names if key in hostvars}
+        plc = self._play_context.set_task_and_variable_override(task=self._task, variables=variables, templar=self._templar)
+        plc.connection = name
+        if not any(key in variables for key in C.MAGIC_VARIABLE_MAPPING['remote_addr']):
+            # play context of this task is of another host
+            plc.remote_addr = hostvars.get('inventory_hostname', host)
+        conn = loader.get(name, plc, '/dev/null')
+        if not (conn.supports_persistence and C.USE_PERSISTENT_CONNECTIONS) and not conn.force_persistence:
+            raise AnsibleActionFail(f"cisconx9_deploy: {host}: connection {name} is not persistent (use network_cli)")
+        conn.set_options(var_options={key: variables[key] for key in option_vars if key in variables})
+        plc.timeout = conn.get_option('persistent_command_timeout')
+        try:
+            socket_path = start_connection(plc, conn.get_options(), self._task._uuid)  # pylint: disable=protected-access
+        except AnsibleError as ex:
+            raise AnsibleActionFail(f"cisconx9_deploy: {host}: {ex}") from ex
+        display.vvvv(f'socket_path: {socket_path}', plc.remote_addr)
+        return socket_path
@@ -3,17 +3,46 @@
 
 # Copyright: Contributors to the Ansible project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+import os
 import re
 import json
+import time
+import atexit
+import shutil
+import tempfile
 
-from ansible.module_utils._text import to_text
+from ansible.module_utils._text import to_bytes, to_text
 from ansible.plugins.cliconf import CliconfBase, enable_mode
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import to_list
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import classwrapper
 
+# Spooled replies not picked up by a module within this many seconds are
+# removed (module gave up on a deadline or failed before decoding)
+SPOOL_EXPIRY = 600
+# Characters of a spooled reply encoded and written at a time
+SPOOL_CHUNK = 256 * 1024
+
+
 @classwrapper
 class Cliconf(CliconfBase):
 
+    _spool_dir = None
+
+    def spool_dir(self):
+        """Per connection directory of spooled replies, removed when the
+        persistent connection exits. Expired replies are removed on each use"""
+        if self._spool_dir is None:
+            self._spool_dir = tempfile.mkdtemp(prefix='cisconx9_spool_')
+            atexit.register(shutil.rmtree, self._spool_dir, True)
+        expired = time.time() - SPOOL_EXPIRY
+        for entry in os.scandir(self._spool_dir):
+            try:
+                if entry.stat().st_mtime < expired:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+        return self._spool_dir
+
     def get_device_info(self):
         """Get Device Info"""
         devInfo = {}
@@ -55,6 +84,29 @@ class Cliconf(CliconfBase):
         return self.send_command(command=command, prompt=prompt, answer=answer,
                                  sendonly=sendonly, newline=newline, check_all=check_all)
 
+    def get_spooled(self, command, threshold=1048576):
+        """Get command output. Outputs of at least threshold bytes are written
+        to a temp file (the module maps it and unlinks it right away) instead
+        of being returned through JSON-RPC. Files the module never opened are
+        cleaned up, see spool_dir. Returns {"size", "elapsed"} and "path" or "output"."""
+        start = time.perf_counter()
+        reply = self.send_command(command=command)
+        elapsed = round(time.perf_counter() - start, 6)
+        # Characters, never more than the bytes
+        if not reply or len(reply) < threshold:
+            return {'size': len(to_bytes(reply, errors='surrogate_or_strict')), 'elapsed': elapsed, 'output': reply}
+        fd, path = tempfile.mkstemp(prefix='cisconx9_reply_', suffix='.json', dir=self.spool_dir())
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as fobj:
+                # Encoded a chunk at a time, not as one more copy of the reply
+                for pos in range(0, len(reply), SPOOL_CHUNK):
+                    size += fobj.write(to_bytes(reply[pos:pos + SPOOL_CHUNK], errors='surrogate_or_strict'))
+        except BaseException:
+            os.unlink(path)
+            raise
+        return {'size': size, 'elapsed': elapsed, 'path': path}
+
     def get_capabilities(self):
         """Get capabilities"""
         result = super(Cliconf, self).get_capabilities()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Replay connection: network_cli over a recorded NX9 session
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Everything above the SSH channel (persistent connection, JSON-RPC,
+cliconf, terminal prompt/error regexes, action plugin) is the real
+network_cli code path; only the channel is replaced with ReplayShell.
+
+    ansible_connection: sense.cisconx9.cisconx9_replay
+    ansible_network_os: sense.cisconx9.cisconx9
+    ansible_cisconx9_replay_session: /path/to/session.json (or fixtures dir)
+    ansible_cisconx9_replay_latency: 0.05
+    ansible_cisconx9_replay_scale: 10
+"""
+from ansible_collections.ansible.netcommon.plugins.connection.network_cli import DOCUMENTATION as NETWORK_CLI_DOCUMENTATION
+from ansible_collections.ansible.netcommon.plugins.connection.network_cli import Connection as NetworkCliConnection
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.replay import ReplaySession, ReplayShell
+
+# network_cli options (options: is the last section) + replay options
+DOCUMENTATION = NETWORK_CLI_DOCUMENTATION.replace("name: network_cli", "name: cisconx9_replay", 1) + """\
+  replay_session:
+    type: path
+    description:
+    - Recorded session JSON file or directory of command fixtures.
+    env:
+    - name: ANSIBLE_CISCONX9_REPLAY_SESSION
+    vars:
+    - name: ansible_cisconx9_replay_session
+  replay_latency:
+    type: float
+    default: 0.0
+    description:
+    - Seconds before output of each command becomes available.
+    env:
+    - name: ANSIBLE_CISCONX9_REPLAY_LATENCY
+    vars:
+    - name: ansible_cisconx9_replay_latency
+  replay_bandwidth:
+    type: int
+    default: 0
+    description:
+    - Output bytes per second, 0 is unlimited.
+    env:
+    - name: ANSIBLE_CISCONX9_REPLAY_BANDWIDTH
+    vars:
+    - name: ansible_cisconx9_replay_bandwidth
+  replay_scale:
+    type: int
+    default: 1
+    description:
+    - Multiply all ROW_ lists of JSON replies to simulate bigger devices.
+    env:
+    - name: ANSIBLE_CISCONX9_REPLAY_SCALE
+    vars:
+    - name: ansible_cisconx9_replay_scale
+"""
+
+
+class Connection(NetworkCliConnection):
+    """network_cli connection served from a recorded session"""
+
+    transport = "sense.cisconx9.cisconx9_replay"
+
+    def __init__(self, play_context, new_stdin, *args, **kwargs):
+        super().__init__(play_context, new_stdin, *args, **kwargs)
+        # receive() reads the shell as a paramiko channel
+        self._ssh_type = "paramiko"
+
+    def get_options(self, hostvars=None):
+        # There is no underlying ssh connection plugin
+        return super(NetworkCliConnection, self).get_options(hostvars=hostvars)
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(NetworkCliConnection, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+
+    def _connect(self):
+        """Open replay shell and start the terminal"""
+        self._single_user_mode = self.get_option("single_user_mode")
+        if not self.connected:
+            session = ReplaySession.load(self.get_option("replay_session"), scale=self.get_option("replay_scale"))
+            self._ssh_shell = ReplayShell(session, latency=self.get_option("replay_latency"),
+                                          bandwidth=self.get_option("replay_bandwidth"))
+            self._ssh_shell.settimeout(self.get_option("persistent_command_timeout"))
+            self._connected = True
+            self.queue_message("vvvv", f"replaying session {self.get_option('replay_session')}")
+            self.receive(prompts=self._terminal.terminal_initial_prompt,
+                         answer=self._terminal.terminal_initial_answer,
+                         newline=self._terminal.terminal_inital_prompt_newline,
+                         check_all=False)
+            if self._play_context.become:
+                self._on_become(become_pass=self._play_context.become_pass)
+            self._on_open_shell()
+        return self
+
+    def close(self):
+        """Close replay shell"""
+        if self._connected and self._ssh_shell:
+            self._terminal.on_close_shell()
+            self._ssh_shell.close()
+            self._ssh_shell = None
+        super(NetworkCliConnection, self).close()
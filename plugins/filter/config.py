@@ -0,0 +1,28 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Running-config filters
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+    {{ ansible_net_config | sense.cisconx9.cisconx9_config_unpack }}
+"""
+from ansible.errors import AnsibleFilterError
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.configpack import unpack_config
+
+
+def cisconx9_config_unpack(config):
+    """Running-config JSON of ansible_net_config (config_format dedup/compressed or json)"""
+    try:
+        return unpack_config(config)
+    except (KeyError, TypeError, ValueError) as ex:
+        raise AnsibleFilterError(f"cisconx9_config_unpack: corrupted config: {ex}") from ex
+
+
+class FilterModule:
+    """Running-config filters"""
+
+    def filters(self):
+        """Return filters"""
+        return {
+            "cisconx9_config_unpack": cisconx9_config_unpack,
+        }
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Route lookup filters
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+    {{ ansible_net_route_index | sense.cisconx9.cisconx9_route_lookup('10.1.1.1', vrf='default') }}
+    {{ (ansible_net_ipv4 + ansible_net_ipv6) | sense.cisconx9.cisconx9_route_index }}
+"""
+from ansible.errors import AnsibleFilterError
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.routes import build_route_index, lookup_route
+
+
+def cisconx9_route_index(routes):
+    """Build route index from ansible_net_ipv4/ansible_net_ipv6 facts"""
+    if not isinstance(routes, list):
+        raise AnsibleFilterError("cisconx9_route_index expects a list of routes")
+    return build_route_index(routes)
+
+
+def cisconx9_route_lookup(index, address, vrf="default"):
+    """Longest prefix match lookup. Accepts route index or list of routes"""
+    if isinstance(index, list):
+        index = build_route_index(index)
+    if not isinstance(index, dict):
+        raise AnsibleFilterError("cisconx9_route_lookup expects route index (ansible_net_route_index)")
+    try:
+        return lookup_route(index, address, vrf)
+    except (ValueError, OSError) as ex:
+        raise AnsibleFilterError(f"cisconx9_route_lookup: wrong address {address}: {ex}") from ex
+
+
+class FilterModule:
+    """Route lookup filters"""
+
+    def filters(self):
+        """Return filters"""
+        return {
+            "cisconx9_route_index": cisconx9_route_index,
+            "cisconx9_route_lookup": cisconx9_route_lookup,
+        }
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""LLDP topology filters
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+    {{ hostvars | sense.cisconx9.cisconx9_topology(previous=topology) }}
+    {{ topology | sense.cisconx9.cisconx9_neighbors('r-sensetb-fcc2-1') }}
+"""
+from ansible.errors import AnsibleFilterError
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.topology import Topology
+
+
+def cisconx9_topology(hosts, previous=None):
+    """Update topology (previous serialized form) with LLDP facts of hosts
+    (hostvars or {host: facts}). Hosts without ansible_net_lldp are left as
+    they were. Returns serialized topology with "changes" of this update"""
+    if not hasattr(hosts, "items"):
+        raise AnsibleFilterError("cisconx9_topology expects hostvars or dict of host facts")
+    topo = Topology.load(previous) if previous else Topology()
+    devices = []
+    for host, facts in hosts.items():
+        if not hasattr(facts, "get") or not isinstance(facts.get("ansible_net_lldp"), dict):
+            continue
+        name = facts.get("ansible_net_hostname") or host
+        macs = (facts.get("ansible_net_info") or {}).get("macs", [])
+        topo.add_macs(name, macs)
+        devices.append((name, facts["ansible_net_lldp"], macs))
+    added, removed = set(), set()
+    for name, lldp, macs in devices:
+        hostadded, hostremoved = topo.update_host(name, lldp, macs)
+        added = (added - hostremoved) | hostadded
+        removed = (removed - hostadded) | hostremoved
+    out = topo.dump()
+    out["changes"] = {"added": sorted(topo.edge_names(edge) for edge in added),
+                      "removed": sorted(topo.edge_names(edge) for edge in removed)}
+    return out
+
+
+def cisconx9_neighbors(topology, host):
+    """{local port: [remote node, remote port]} of host in serialized topology"""
+    return {port: list(remote) for port, remote in Topology.load(topology).neighbors(host).items()}
+
+
+class FilterModule:
+    """LLDP topology filters"""
+
+    def filters(self):
+        """Return filters"""
+        return {
+            "cisconx9_topology": cisconx9_topology,
+            "cisconx9_neighbors": cisconx9_neighbors,
+        }
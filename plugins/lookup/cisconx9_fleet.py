@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Fleet store lookup
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Queries the SQLite store cisconx9_facts writes with fleet_db:
+    {{ query('sense.cisconx9.cisconx9_fleet', 'mac=a4:11:bb:40:c6:01', db='/var/lib/fleet.db') }}
+    {{ query('sense.cisconx9.cisconx9_fleet', 'vlan=1312', 'neighbor=r-sensetb-fcc2-1') }}
+"""
+DOCUMENTATION = """
+    name: cisconx9_fleet
+    short_description: Indexed queries of facts of many switches
+    description:
+      - Looks up rows of the fleet store written by cisconx9_facts fleet_db.
+      - Each term is kind=value, kind is mac, vlan, interface, neighbor, prefix or address.
+      - Returns the rows of all terms, each a dict with host and the row columns.
+    options:
+      _terms:
+        description: kind=value queries.
+        required: true
+      db:
+        description: Fleet store path.
+        type: path
+        required: true
+        env:
+          - name: ANSIBLE_CISCONX9_FLEET_DB
+        vars:
+          - name: ansible_cisconx9_fleet_db
+      host:
+        description: Only rows of this host.
+        type: str
+"""
+import sqlite3
+
+from ansible.errors import AnsibleLookupError
+from ansible.plugins.lookup import LookupBase
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.fleetstore import FleetStore
+
+
+class LookupModule(LookupBase):
+    """Fleet store lookup"""
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        path = self.get_option("db")
+        out = []
+        try:
+            with FleetStore(path, readonly=True) as store:
+                for term in terms:
+                    kind, sep, value = str(term).partition("=")
+                    if not sep:
+                        raise AnsibleLookupError(f"cisconx9_fleet: expected kind=value, got {term}")
+                    out.extend(store.query(kind.strip(), value.strip(), host=self.get_option("host")))
+        except (ValueError, OSError) as ex:
+            raise AnsibleLookupError(f"cisconx9_fleet: {ex}") from ex
+        except sqlite3.Error as ex:
+            raise AnsibleLookupError(f"cisconx9_fleet: store {path}: {ex}") from ex
+        return out
@@ -3,15 +3,56 @@
 
 # Copyright: Contributors to the Ansible project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+import os
+import re
 import json
+import mmap
+import time
+import hashlib
+import threading
 from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import env_fallback
-from ansible.module_utils.connection import exec_command
-from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import to_list, ComplexList
-from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.config import NetworkConfig, ConfigLine
+from ansible.module_utils.connection import Connection, ConnectionError, exec_command  # pylint: disable=redefined-builtin
+from ansible_collections.sense.cisconx9.plugins.module_utils.statestore import StateStore
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import functionwrapper
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 _DEVICE_CONFIGS = {}
+# Cheap config change indication: time of last config change and number of
+# config commands run (accounting log). Full config stays on the device.
+FINGERPRINT_COMMANDS = ('show running-config | include "last done at"',
+                        'show accounting log last-index')
+# Set once the connection turned out not to support Cliconf.get_spooled
+_SPOOL_UNSUPPORTED = []
+_COMMAND_KEYS = frozenset(('command', 'prompt', 'answer'))
+# Replies of at least this many bytes are spooled to a file by the connection
+SPOOL_THRESHOLD = 1024 * 1024
+# orjson reserves a parse buffer of about 12 times the reply up front, which
+# was the peak memory of facts on dense switches. With normalization it is no
+# faster than json and the object_hook, so only smaller replies use it.
+ORJSON_MAX_SIZE = 256 * 1024
+# JSON whitespace (iter_rows)
+_JSON_WS = r"[ \t\n\r]*"
+_JSON_WS_RE = re.compile(_JSON_WS)
+# exec_command rc of a ConnectionError without JSON-RPC error code: socket
+# missing or unreachable, broken reply. Errors of the device have the code
+# of the JSON-RPC error.
+_TRANSPORT_ERROR = 1
+# Retries of show commands after a transport error, backoff (seconds)
+# doubles from TRANSPORT_BACKOFF up to TRANSPORT_BACKOFF_MAX
+TRANSPORT_RETRIES = 2
+TRANSPORT_BACKOFF = 0.5
+TRANSPORT_BACKOFF_MAX = 2.0
+# JSON-RPC "Method not found" (connection without Cliconf.get_spooled)
+_RPC_METHOD_NOT_FOUND = -32601
+# Sockets with a command past its deadline. The connection serves one
+# request at a time, so anything sent there would wait behind it.
+_BLOCKED_SESSIONS = set()
 
 WARNING_PROMPTS_RE = [
     r"[\r\n]?\[yes/no\]:\s?$",
@@ -32,6 +73,88 @@ cisconx9_argument_spec = {
     'provider': {'type': 'dict', 'options': cisconx9_provider_spec}
 }
 
+
+class ReplyDecodeError(ValueError):
+    """Raised when a reply expected to be JSON can not be decoded"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when commands did not finish before the deadline. responses
+    (set by run_commands) has the replies of all commands, None for the
+    ones which did not finish"""
+
+    def __init__(self, command):
+        super().__init__(f"Deadline exceeded running '{command}'")
+        self.command = command
+        self.responses = []
+
+
+class Deadline:
+    """Time budget of a run and timeout of each command (seconds, 0/None is
+    unlimited)"""
+
+    def __init__(self, budget=None, command_timeout=None):
+        self.end = time.monotonic() + budget if budget else None
+        self.command_timeout = command_timeout or None
+
+    def for_command(self):
+        """Deadline (time.monotonic()) of a command started now, None if unlimited"""
+        ends = [self.end, time.monotonic() + self.command_timeout if self.command_timeout else None]
+        ends = [end for end in ends if end is not None]
+        return min(ends) if ends else None
+
+
+def call_with_deadline(deadline, func, *args):
+    """Return func(*args), run in a daemon thread and waited for until
+    deadline (time.monotonic()). Raises DeadlineExceeded if it is still
+    running; the thread is left behind and does not block module exit."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(func.__name__)
+    result = []
+
+    def runner():
+        try:
+            result.append((True, func(*args)))
+        except Exception as ex:  # pylint: disable=broad-except
+            result.append((False, ex))
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    thread.join(remaining)
+    if not result:
+        raise DeadlineExceeded(func.__name__)
+    success, value = result[0]
+    if not success:
+        raise value
+    return value
+
+
+class SpooledReply:
+    """Reply spooled to a file by Cliconf.get_spooled. The file is opened and
+    unlinked right away; the open file (inherited by forked parse workers)
+    is mapped read only when the reply is decoded."""
+
+    def __init__(self, path, size, elapsed):
+        self.size = size
+        self.elapsed = elapsed
+        try:
+            self.fobj = open(path, 'rb')  # pylint: disable=consider-using-with
+        finally:
+            os.unlink(path)
+
+    def __len__(self):
+        return self.size
+
+    def buffer(self):
+        """Read only mmap of the reply"""
+        return mmap.mmap(self.fobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Close spooled file"""
+        self.fobj.close()
+
+
 @functionwrapper
 def to_json(out):
     """Check and change output to dict if possible"""
@@ -40,6 +163,176 @@ def to_json(out):
     except ValueError:
         return out
 
+
+def is_json_command(command):
+    """Check if command asks device for a JSON reply"""
+    return command.replace(' ', '').endswith('|json')
+
+
+def _normalize_obj(obj, schema):
+    """Normalize a single decoded JSON object in place.
+    NX-OS returns a dict instead of a list if ROW_* has a single entry and
+    keeps all numbers as strings. Make ROW_* always a list and convert
+    fields listed in schema (key: type) to their native type."""
+    for key, value in obj.items():
+        if isinstance(value, dict) and key.startswith('ROW_'):
+            obj[key] = [value]
+        elif schema and key in schema and isinstance(value, str):
+            try:
+                obj[key] = schema[key](value)
+            except ValueError:
+                pass
+    return obj
+
+
+def normalize_reply(data, schema=None):
+    """Normalize already decoded reply (walk all nested objects)"""
+    if isinstance(data, dict):
+        for value in data.values():
+            if isinstance(value, (dict, list)):
+                normalize_reply(value, schema)
+        _normalize_obj(data, schema)
+    elif isinstance(data, list):
+        for value in data:
+            if isinstance(value, (dict, list)):
+                normalize_reply(value, schema)
+    return data
+
+
+def reply_text(out):
+    """Text of a text/SpooledReply reply. SpooledReply is decoded straight
+    from its mmap (json decodes bytes to text first anyway, so a bytes copy
+    would be a second copy)"""
+    if not isinstance(out, SpooledReply):
+        return out
+    try:
+        buf = out.buffer()
+    except (OSError, ValueError) as ex:
+        raise ReplyDecodeError(str(ex)) from ex
+    with buf:
+        view = memoryview(buf)
+        try:
+            # Same decoding as json.loads of bytes
+            return str(view, 'utf-8', 'surrogatepass')
+        except UnicodeDecodeError as ex:
+            raise ReplyDecodeError(str(ex)) from ex
+        finally:
+            view.release()
+
+
+def reply_size(out):
+    """Size of a text/bytes/SpooledReply reply in bytes (as sent by the device)"""
+    if isinstance(out, str) and not out.isascii():
+        return len(out.encode('utf-8', 'surrogatepass'))
+    return len(out or '')
+
+
+def decode_reply(out, schema=None):
+    """Decode JSON reply once and normalize it.
+    Uses orjson for replies up to ORJSON_MAX_SIZE if available, otherwise
+    json with an object_hook, so that normalization happens during the same
+    pass as decoding. SpooledReply is decoded from its mmap: orjson reads it
+    as it is, json gets its text (reply_text)."""
+    if isinstance(out, SpooledReply):
+        if HAS_ORJSON and len(out) <= ORJSON_MAX_SIZE:
+            try:
+                buf = out.buffer()
+            except (OSError, ValueError) as ex:
+                raise ReplyDecodeError(str(ex)) from ex
+            with buf:
+                view = memoryview(buf)
+                try:
+                    return decode_reply(view, schema)
+                finally:
+                    view.release()
+        return decode_reply(reply_text(out), schema)
+    try:
+        if HAS_ORJSON and len(out) <= ORJSON_MAX_SIZE:
+            return normalize_reply(orjson.loads(out), schema)
+        return json.loads(out, object_hook=lambda obj: _normalize_obj(obj, schema))
+    except ValueError as ex:
+        raise ReplyDecodeError(str(ex)) from ex
+
+
+def iter_rows(text, row):
+    """Yield the ROW_x dicts (row) of JSON reply text one at a time, without
+    decoding the rest of the reply. Only the first row key is read (replies
+    with a single table). Returns False if text has no such key"""
+    match = re.search(r'"%s"%s:%s' % (re.escape(row), _JSON_WS, _JSON_WS), text)
+    if match is None:
+        return False
+    decoder = json.JSONDecoder()
+    pos = match.end()
+    try:
+        if text.startswith('{', pos):
+            # Not normalized single row
+            yield decoder.raw_decode(text, pos)[0]
+            return True
+        if not text.startswith('[', pos):
+            raise ReplyDecodeError(f"{row} is not a list")
+        pos = _JSON_WS_RE.match(text, pos + 1).end()
+        if text.startswith(']', pos):
+            return True
+        raw_decode = decoder.raw_decode
+        while True:
+            value, pos = raw_decode(text, pos)
+            yield value
+            char = text[pos:pos + 1]
+            if char not in ',]':
+                pos = _JSON_WS_RE.match(text, pos).end()
+                char = text[pos:pos + 1]
+            if char == ']':
+                break
+            if char != ',':
+                raise ReplyDecodeError(f"Expecting ',' delimiter in {row}: char {pos}")
+            pos += 1
+            if not text.startswith('{', pos):
+                pos = _JSON_WS_RE.match(text, pos).end()
+    except ReplyDecodeError:
+        raise
+    except ValueError as ex:
+        raise ReplyDecodeError(str(ex)) from ex
+    return True
+
+
+def reply_rows(module, command, out, row, stats=None):
+    """Yield ROW_x dicts (row) of a text/SpooledReply reply of a '| json'
+    command one at a time (iter_rows), so the decoded reply is never in
+    memory as a whole. A reply which can not be decoded is reported as a
+    warning (as decode_replies). Time until the last row is consumed is
+    appended to stats as decode time (if given)"""
+    start = time.perf_counter()
+    try:
+        text = reply_text(out)
+        found = yield from iter_rows(text, row)
+        if not found:
+            # Empty table or not a JSON reply
+            decode_reply(text)
+    except ReplyDecodeError as ex:
+        module.warn(f"Unable to decode JSON reply of '{command}': {ex}")
+    finally:
+        if isinstance(out, SpooledReply):
+            out.close()
+        if stats is not None:
+            stats.append({'command': command, 'decode': time.perf_counter() - start})
+
+
+def reset_run_state():
+    """Forget per run caches and blocked sessions. Needed when module code
+    runs in a longer lived process (action plugin parse_on_controller)"""
+    _DEVICE_CONFIGS.clear()
+    _SPOOL_UNSUPPORTED[:] = []
+    _BLOCKED_SESSIONS.clear()
+
+def to_list(val):
+    """Same as netcommon to_list. netcommon utils imports jinja2 and yaml,
+    so it is imported only where ComplexList is really needed."""
+    if isinstance(val, (list, tuple, set)):
+        return list(val)
+    if val is not None:
+        return [val]
+    return []
+
 @functionwrapper
 def check_args(module, warnings):
     """Check args pass"""
@@ -63,9 +356,60 @@ def get_config(module, flags=None):
         _DEVICE_CONFIGS[cmd] = cfg
         return cfg
 
+@functionwrapper
+def config_fingerprint(module, commands=None, deadline=None):
+    """Return sha256 of FINGERPRINT_COMMANDS (or commands) outputs, which
+    changes whenever running config changes. Commands the device rejects are
+    left out; None if all of them were rejected."""
+    commands = list(commands or FINGERPRINT_COMMANDS)
+    parts = []
+    for cmd, out in zip(commands, run_commands(module, commands, check_rc=False, deadline=deadline)):
+        if isinstance(out, str) and out.strip() and not out.lstrip().startswith('%'):
+            parts.append(f"{cmd}\n{out.strip()}")
+    if not parts:
+        return None
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+@functionwrapper
+def get_cached_config(module, flags=None, fingerprint=None, deadline=None):
+    """Get running config, downloaded only if config_fingerprint changed
+    since the last download (kept in the 'running-config' state store)"""
+    cmd = ('show running-config ' + ' '.join(flags or [])).strip()
+    if cmd in _DEVICE_CONFIGS:
+        return _DEVICE_CONFIGS[cmd]
+    fingerprint = fingerprint or config_fingerprint(module, deadline=deadline)
+    store = StateStore(module, 'running-config')
+    state = store.load()
+    if fingerprint is not None and state.get('fingerprint') == fingerprint and cmd in state.get('configs', {}):
+        _DEVICE_CONFIGS[cmd] = state['configs'][cmd]
+        return _DEVICE_CONFIGS[cmd]
+    if deadline is None:
+        cfg = get_config(module, flags)
+    else:
+        cfg = _DEVICE_CONFIGS[cmd] = run_commands(module, [cmd], raw=True, deadline=deadline)[0].strip()
+    if fingerprint is not None:
+        configs = state.get('configs', {}) if state.get('fingerprint') == fingerprint else {}
+        configs[cmd] = cfg
+        store.save({'fingerprint': fingerprint, 'configs': configs})
+    return cfg
+
+def _command_dict(cmd):
+    """Command as ComplexList would transform it, or None if it needs
+    ComplexList validation (unknown keys, missing command)"""
+    if isinstance(cmd, str):
+        return {'command': cmd, 'prompt': None, 'answer': None}
+    if isinstance(cmd, dict) and cmd.get('command') is not None and _COMMAND_KEYS.issuperset(cmd):
+        return {'command': cmd['command'], 'prompt': cmd.get('prompt'), 'answer': cmd.get('answer')}
+    return None
+
 @functionwrapper
 def to_commands(module, commands):
-    """Transform commands"""
+    """Transform commands. Plain commands are converted directly, ComplexList
+    (and netcommon utils with it) is imported only to validate the rest"""
+    transformed = [_command_dict(cmd) for cmd in commands]
+    if None not in transformed:
+        return transformed
+    from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import ComplexList  # pylint: disable=import-outside-toplevel
     spec = {
         'command': {'key': True},
         'prompt': {},
@@ -74,38 +418,227 @@ def to_commands(module, commands):
     transform = ComplexList(spec, module)
     return transform(commands)
 
+def session_exec(socket_path, command):
+    """exec_command on the persistent connection at socket_path"""
+    try:
+        out = Connection(socket_path).exec_command(command)
+    except ConnectionError as exc:
+        code = getattr(exc, 'code', 1)
+        return code, '', to_text(getattr(exc, 'err', exc), errors='surrogate_then_replace')
+    return 0, out, ''
+
+def get_spooled(module, command, threshold=SPOOL_THRESHOLD, socket_path=None):
+    """Run command through Cliconf.get_spooled.
+    Returns (rc, reply, err, meta); reply is text or SpooledReply, meta has
+    size/elapsed of the command. rc is None if the connection does not
+    support spooling."""
+    try:
+        meta = Connection(socket_path or module._socket_path).get_spooled(command=command, threshold=threshold)
+    except ConnectionError as exc:
+        code = getattr(exc, 'code', 1)
+        if code == _RPC_METHOD_NOT_FOUND:
+            return None, None, None, None
+        return code, '', to_text(getattr(exc, 'err', exc), errors='surrogate_then_replace'), None
+    if 'path' in meta:
+        return 0, SpooledReply(meta['path'], meta['size'], meta['elapsed']), '', meta
+    return 0, meta['output'], '', meta
+
+def _run_command(module, cmd, spool, stats, socket_path=None, deadline=None):
+    """Run one command dict (spooled if spool is set), returns (rc, out, err).
+    Transport errors (_TRANSPORT_ERROR) are retried up to TRANSPORT_RETRIES
+    times with a doubling backoff, device errors are not. With deadline
+    (Deadline), raises DeadlineExceeded if the command did not finish in
+    time (and blocks its session for the rest of the run)"""
+    end = deadline.for_command() if deadline is not None else None
+    if end is not None:
+        session = socket_path or module._socket_path
+        if session in _BLOCKED_SESSIONS:
+            raise DeadlineExceeded(cmd['command'])
+        try:
+            return call_with_deadline(end, _run_command, module, cmd, spool, stats, socket_path)
+        except DeadlineExceeded:
+            _BLOCKED_SESSIONS.add(session)
+            raise DeadlineExceeded(cmd['command']) from None
+    for attempt in range(TRANSPORT_RETRIES + 1):
+        if attempt:
+            time.sleep(min(TRANSPORT_BACKOFF * 2 ** (attempt - 1), TRANSPORT_BACKOFF_MAX))
+        start = time.perf_counter()
+        ret, out, err = _exec_once(module, cmd, spool, socket_path)
+        if stats is not None:
+            stats.append({'command': cmd['command'], 'size': reply_size(out), 'elapsed': time.perf_counter() - start,
+                          'spooled': isinstance(out, SpooledReply), 'retry': attempt > 0})
+        if ret != _TRANSPORT_ERROR:
+            break
+    return ret, out, err
+
+def _exec_once(module, cmd, spool, socket_path=None):
+    """Run one command dict once, returns (rc, out, err)"""
+    ret = None
+    if spool and not cmd['prompt'] and not _SPOOL_UNSUPPORTED:
+        ret, out, err, meta = get_spooled(module, cmd['command'], spool, socket_path)
+        if ret is None:
+            _SPOOL_UNSUPPORTED.append(True)
+    if ret is None:
+        if socket_path:
+            ret, out, err = session_exec(socket_path, module.jsonify(cmd))
+        else:
+            ret, out, err = exec_command(module, module.jsonify(cmd))
+    return ret, out, err
+
+def dispatch_commands(module, commands, sessions, spool=None, stats=None, deadline=None):
+    """Run command dicts over several persistent connections (socket paths)
+    to the same device. Each session runs one command at a time and takes
+    the next pending one when done, so slow commands do not hold back the
+    rest. Returns [(rc, out, err)] in command order; None for commands not
+    finished before deadline (a session stops at its first such command)."""
+    # pylint: disable=import-outside-toplevel
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    results = [None] * len(commands)
+    pending = deque(enumerate(commands))
+
+    def worker(socket_path):
+        while True:
+            try:
+                index, cmd = pending.popleft()
+            except IndexError:
+                return
+            try:
+                results[index] = _run_command(module, cmd, spool, stats, socket_path, deadline)
+            except DeadlineExceeded:
+                return
+
+    with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+        for future in [pool.submit(worker, path) for path in sessions]:
+            future.result()
+    return results
+
 @functionwrapper
-def run_commands(module, commands, check_rc=True):
-    """Run Commands"""
+def run_commands(module, commands, check_rc=True, normalize=False, schema=None, raw=False, spool=None, stats=None, sessions=None,
+                 deadline=None):
+    """Run Commands.
+    If normalize is set, replies of '| json' commands are decoded with
+    decode_reply (ROW_* always lists, schema fields converted) and decode
+    failures are reported as warnings. If raw is set, replies are returned
+    undecoded (to be decoded later with decode_replies); with spool set to a
+    size, replies at least that big are returned as SpooledReply instead of
+    text. Size/timing of each command run is appended to stats (if given,
+    see perf_report). With sessions (extra socket paths of the same device), commands
+    run concurrently over them and the module connection (see
+    dispatch_commands). With deadline (Deadline), DeadlineExceeded
+    is raised if any command did not finish in time, after all others did
+    (see DeadlineExceeded.responses). Other replies are returned as before."""
     responses = []
     commands = to_commands(module, to_list(commands))
-    for cmd in commands:
-        cmd = module.jsonify(cmd)
-        ret, out, err = exec_command(module, cmd)
-        if check_rc and ret != 0:
-            module.fail_json(msg=to_text(err, errors='surrogate_or_strict'), rc=ret)
-        responses.append(to_json(to_text(out, errors='surrogate_or_strict')))
+    spool = spool if raw else None
+    sessions = list(dict.fromkeys([module._socket_path] + list(sessions or []))) if sessions else []
+    if len(sessions) > 1 and len(commands) > 1:
+        results = dispatch_commands(module, commands, sessions, spool, stats, deadline)
+    else:
+        results = (_run_command(module, cmd, spool, stats, deadline=deadline) for cmd in commands)
+    missing = None
+    try:
+        for cmd, result in zip(commands, results):
+            command = cmd['command']
+            if result is None:
+                missing = missing or DeadlineExceeded(command)
+                responses.append(None)
+                continue
+            ret, out, err = result
+            if check_rc and ret != 0:
+                module.fail_json(msg=to_text(err, errors='surrogate_or_strict'), rc=ret)
+            if isinstance(out, SpooledReply):
+                responses.append(out)
+                continue
+            out = to_text(out, errors='surrogate_or_strict')
+            if raw:
+                responses.append(out)
+            elif normalize and is_json_command(command):
+                responses.extend(decode_replies(module, [command], [out], schema, stats))
+            else:
+                responses.append(to_json(out))
+    except DeadlineExceeded as ex:
+        missing = missing or ex
+        responses.extend([None] * (len(commands) - len(responses)))
+    if missing is not None:
+        missing.responses = responses
+        raise missing
+    return responses
+
+def decode_replies(module, commands, replies, schema=None, stats=None):
+    """Decode text/SpooledReply replies of '| json' commands (as run_commands
+    normalize). Replies which can not be decoded are reported as warnings and
+    returned as text. Decode time of each reply is appended to stats (if given)."""
+    responses = []
+    for command, out in zip(commands, replies):
+        if not is_json_command(command):
+            responses.append(out)
+            continue
+        start = time.perf_counter()
+        try:
+            responses.append(decode_reply(out, schema))
+        except ReplyDecodeError as ex:
+            module.warn(f"Unable to decode JSON reply of '{command}': {ex}")
+            responses.append(out if isinstance(out, str) else '')
+        finally:
+            if isinstance(out, SpooledReply):
+                out.close()
+        if stats is not None:
+            stats.append({'command': command, 'decode': time.perf_counter() - start})
     return responses
 
+def perf_report(module, stats, slow=0):
+    """Merge stats records per command:
+    {command: {"calls", "retries", "elapsed", "max", "bytes", "decode"}}
+    (seconds; retries is calls after a transport error, see _run_command).
+    Commands with a call of at least slow seconds are reported as warnings
+    (slow 0 - never)."""
+    report = {}
+    for stat in stats:
+        perf = report.setdefault(stat['command'], {'calls': 0, 'retries': 0, 'elapsed': 0.0, 'max': 0.0, 'bytes': 0, 'decode': 0.0})
+        if 'elapsed' in stat:
+            perf['calls'] += 1
+            perf['retries'] += stat.get('retry', False)
+            perf['elapsed'] += stat['elapsed']
+            perf['max'] = max(perf['max'], stat['elapsed'])
+            perf['bytes'] += stat.get('size', 0)
+        perf['decode'] += stat.get('decode', 0.0)
+    for command, perf in report.items():
+        for key in ('elapsed', 'max', 'decode'):
+            perf[key] = round(perf[key], 6)
+        if slow and perf['max'] >= slow:
+            module.warn(f"Command '{command}' took {perf['max']:.2f}s (slow command threshold {slow}s)")
+    return report
+
 @functionwrapper
-def load_config(module, commands):
-    """Load config"""
-    ret, _out, err = exec_command(module, 'configure terminal')
+def load_config(module, commands, stats=None):
+    """Load config. Timing of each command is appended to stats (if given).
+    Config commands are not retried (a command may have been applied before
+    its transport error)"""
+    def run(command):
+        start = time.perf_counter()
+        ret, out, err = exec_command(module, command)
+        if stats is not None:
+            stats.append({'command': command, 'size': reply_size(out), 'elapsed': time.perf_counter() - start})
+        return ret, err
+
+    ret, err = run('configure terminal')
     if ret != 0:
         module.fail_json(msg='unable to enter configuration mode', err=to_text(err, errors='surrogate_or_strict'))
 
     for command in to_list(commands):
         if command == 'end':
             continue
-        ret, _out, err = exec_command(module, command)
+        ret, err = run(command)
         if ret != 0:
             module.fail_json(msg=to_text(err, errors='surrogate_or_strict'), command=command, rc=ret)
 
-    exec_command(module, 'end')
+    run('end')
 
 @functionwrapper
 def get_sublevel_config(running_config, module):
     """Get sublevel config"""
+    from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.config import NetworkConfig, ConfigLine  # pylint: disable=import-outside-toplevel
     contents = []
     current_config_contents = []
     running_config = NetworkConfig(contents=running_config, indent=1)
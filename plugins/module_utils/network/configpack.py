@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Compact storage of the running-config JSON (ansible_net_config).
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+show running-config | json repeats the same blocks for every port, which
+differ only in a few scalars (port name, description, ...). pack_config
+keeps each repeated block once in "blocks" (keys are short ids given in
+order; subtrees are matched by their full blake2b content hash):
+  - a dict/list subtree occurring more than once becomes {"$ref": hash}
+  - a dict whose keys and non scalar values repeat (its shape) becomes
+    {"$tpl": hash, "$v": [its scalar values]}; the template block has
+    null in place of the scalars
+    {"format": "dedup", "root": <tree>, "blocks": {hash: <tree>}}
+compress=True also zlib compresses that and stores it base64 encoded:
+    {"format": "dedup+zlib", "size": <json bytes>, "data": "<base64>"}
+Original dicts with any of the marker keys ($ref, $tpl, $v, $lit) are
+wrapped as {"$lit": dict}. unpack_config(packed) returns exactly the
+original (same key order too).
+Unpacked (plain) config is returned as is by unpack_config.
+"""
+import json
+import zlib
+import base64
+import hashlib
+
+FORMAT_DEDUP = "dedup"
+FORMAT_ZLIB = "dedup+zlib"
+REF = "$ref"
+TEMPLATE = "$tpl"
+VALUES = "$v"
+# Wraps original dicts that would look like one of the above
+LITERAL = "$lit"
+MARKERS = frozenset((REF, TEMPLATE, VALUES, LITERAL))
+# Smaller subtrees are cheaper inline than as a reference (JSON bytes)
+MIN_BLOCK = 48
+
+
+def _is_marker(node):
+    """Original dict that must be escaped so it is not decoded as marker"""
+    return not MARKERS.isdisjoint(node)
+
+
+def _hash(text):
+    """Content hash of subtree (full digest, block keys are assigned separately)"""
+    return hashlib.blake2b(text.encode("utf-8")).hexdigest()
+
+
+def _container(value):
+    """dict or list"""
+    return isinstance(value, (dict, list))
+
+
+class _Packer:
+    """Three passes: hash subtrees, count them, then emit with references"""
+
+    def __init__(self, min_block):
+        self.min_block = min_block
+        # id(node): (token, shape or None, size)
+        self.digests = {}
+        self.counts = {}
+        self.blocks = {}
+        # token/shape: block key
+        self.keys = {}
+
+    def digest(self, node):
+        """Return (token, size) of node. Containers are hashed from child tokens"""
+        if not _container(node):
+            token = json.dumps(node)
+            return token, len(token)
+        shape = None
+        if isinstance(node, dict):
+            children = [(json.dumps(key) + ":", self.digest(value)) for key, value in node.items()]
+            token = "{" + _hash("{" + ",".join(prefix + child for prefix, (child, _) in children))
+            if not all(_container(value) for value in node.values()):
+                shape = "<" + _hash(",".join(prefix + (child if _container(value) else "")
+                                             for (prefix, (child, _)), value in zip(children, node.values())))
+        else:
+            children = [("", self.digest(value)) for value in node]
+            token = "[" + _hash("[" + ",".join(child for _, (child, _) in children))
+        size = 1 + sum(len(prefix) + child + 1 for prefix, (_, child) in children)
+        self.digests[id(node)] = (token, shape, size)
+        return token, size
+
+    def seen(self, token):
+        """Count token, True if it was seen before"""
+        self.counts[token] = self.counts.get(token, 0) + 1
+        return self.counts[token] > 1
+
+    def count(self, node):
+        """Count occurrences of subtrees and shapes. Children of a repeated
+        subtree/shape are counted once, as they end up in one block"""
+        if not _container(node):
+            return
+        token, shape, _ = self.digests[id(node)]
+        if self.seen(token) or (shape and self.seen(shape)):
+            return
+        for value in (node.values() if isinstance(node, dict) else node):
+            self.count(value)
+
+    def key(self, token):
+        """Short block key of token"""
+        return self.keys.setdefault(token, format(len(self.keys), "x"))
+
+    def emit(self, node):
+        """Node with repeated subtrees/shapes replaced by references"""
+        if not _container(node):
+            return node
+        token, shape, size = self.digests[id(node)]
+        if size < self.min_block:
+            return self.inline(node)
+        if self.counts[token] > 1:
+            key = self.key(token)
+            if key not in self.blocks:
+                self.blocks[key] = self.inline(node)
+            return {REF: key}
+        if shape and self.counts[shape] > 1:
+            key = self.key(shape)
+            if key not in self.blocks:
+                self.blocks[key] = {name: self.emit(value) if _container(value) else None for name, value in node.items()}
+            return {TEMPLATE: key, VALUES: [value for value in node.values() if not _container(value)]}
+        return self.inline(node)
+
+    def inline(self, node):
+        """Emit children of node"""
+        if isinstance(node, list):
+            return [self.emit(value) for value in node]
+        out = {key: self.emit(value) for key, value in node.items()}
+        return {LITERAL: out} if _is_marker(node) else out
+
+
+def pack_config(config, compress=False, min_block=MIN_BLOCK):
+    """Pack running-config JSON, see module docstring"""
+    packer = _Packer(min_block)
+    packer.digest(config)
+    packer.count(config)
+    packed = {"format": FORMAT_DEDUP, "root": packer.emit(config), "blocks": packer.blocks}
+    if not compress:
+        return packed
+    data = json.dumps(packed, separators=(",", ":")).encode("utf-8")
+    return {"format": FORMAT_ZLIB, "size": len(data),
+            "data": base64.b64encode(zlib.compress(data, 9)).decode("ascii")}
+
+
+def _expand(node, blocks):
+    """Resolve references of node. Every occurrence is a new object"""
+    if isinstance(node, list):
+        return [_expand(value, blocks) for value in node]
+    if not isinstance(node, dict):
+        return node
+    if len(node) == 1 and LITERAL in node:
+        node = node[LITERAL]
+    elif len(node) == 1 and REF in node:
+        return _expand(blocks[node[REF]], blocks)
+    elif len(node) == 2 and TEMPLATE in node and VALUES in node:
+        values = iter(node[VALUES])
+        return {key: next(values) if value is None else _expand(value, blocks)
+                for key, value in blocks[node[TEMPLATE]].items()}
+    return {key: _expand(value, blocks) for key, value in node.items()}
+
+
+def is_packed(config):
+    """True if config is output of pack_config"""
+    return isinstance(config, dict) and config.get("format") in (FORMAT_DEDUP, FORMAT_ZLIB) and len(config) == 3
+
+
+def unpack_config(packed):
+    """Original running-config JSON of pack_config output"""
+    if not is_packed(packed):
+        return packed
+    if packed["format"] == FORMAT_ZLIB:
+        packed = json.loads(zlib.decompress(base64.b64decode(packed["data"])))
+    return _expand(packed["root"], packed["blocks"])
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""Range compressed config commands for bulk VLAN/interface changes.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Input is the config diff as (parents, text) items, parents being the texts
+of the parent lines (ConfigLine.parents), in push order. Blocks are a top
+level line and its children:
+  - switchport trunk allowed vlan add/remove lines of a block are folded
+    to one add and one remove line (same result in the same order). They
+    are deltas to the allowed VLANs of the running config, so no absolute
+    list is generated; blocks with an absolute line (vlan N, all, none,
+    except) keep their trunk lines as they are
+  - consecutive vlan N (or interface EthernetX/Y, or interface VlanN)
+    blocks with the same children are merged to one block with range
+    syntax, placed where the first of them was:
+        vlan 100-199,250
+        interface Ethernet1/1-4, Ethernet1/7
+Anything else (other top level lines, blocks with deeper nesting) is kept
+as is and ends a run of mergeable blocks. Result is checked with
+equivalent (commands replayed to per object state) and the original
+commands are used if they differ.
+"""
+import re
+
+VLAN_MAX = 4094
+ALL_VLANS = frozenset(range(1, VLAN_MAX + 1))
+# Longest generated header/vlan list line (NX-OS CLI line limit is higher)
+MAX_LINE = 400
+
+_VLAN_RE = re.compile(r"^vlan\s+([\d,\s-]+)$")
+_INTERFACE_RE = re.compile(r"^interface\s+(.+)$")
+_PORT_RE = re.compile(r"^((?:ethernet|eth)\s*(?:\d+/)+|vlan\s*)(\d+)(?:\s*-\s*(\d+))?$", re.I)
+_TRUNK_RE = re.compile(r"^switchport\s+trunk\s+allowed\s+vlan(?:\s+(add|remove|except))?\s+(\S+)$")
+
+
+def parse_vlans(text):
+    """Set of VLAN ids of 10,20,30-40 list"""
+    vlans = set()
+    for part in text.replace(" ", "").split(","):
+        start, _, end = part.partition("-")
+        vlans.update(range(int(start), int(end or start) + 1))
+    return vlans
+
+
+def to_ranges(values):
+    """Sorted ints to [(first, last), ...] runs"""
+    ranges = []
+    for value in sorted(values):
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return [tuple(item) for item in ranges]
+
+
+def format_range(first, last):
+    """N or N-M"""
+    return str(first) if first == last else f"{first}-{last}"
+
+
+def chunk(parts, prefix, sep, width=MAX_LINE):
+    """prefix + parts joined by sep, split to lines of at most width"""
+    lines, current = [], []
+    for part in parts:
+        if current and len(prefix) + len(sep.join(current + [part])) > width:
+            lines.append(prefix + sep.join(current))
+            current = []
+        current.append(part)
+    if current:
+        lines.append(prefix + sep.join(current))
+    return lines
+
+
+def vlan_lines(prefix, vlans):
+    """prefix + VLAN list lines of vlans"""
+    return chunk([format_range(*item) for item in to_ranges(vlans)], prefix, ",")
+
+
+def parse_header(text):
+    """Objects of a mergeable block header: (kind, [id, ...]) or None.
+    Interface ids are (name prefix, number)"""
+    match = _VLAN_RE.match(text)
+    if match:
+        try:
+            return "vlan", [("", vlan) for vlan in sorted(parse_vlans(match.group(1)))]
+        except ValueError:
+            return None
+    match = _INTERFACE_RE.match(text)
+    if not match:
+        return None
+    ids, kinds = [], set()
+    for part in match.group(1).split(","):
+        port = _PORT_RE.match(part.strip())
+        if not port:
+            return None
+        kinds.add(port.group(1).lower().startswith("vlan"))
+        ids.extend((port.group(1), number) for number in range(int(port.group(2)), int(port.group(3) or port.group(2)) + 1))
+    if len(kinds) != 1:
+        return None
+    return ("interface-vlan" if kinds.pop() else "interface"), ids
+
+
+def format_headers(kind, ids):
+    """Header lines of objects (parse_header output)"""
+    if kind == "vlan":
+        return vlan_lines("vlan ", [number for _, number in ids])
+    parts = []
+    prefixes = {}
+    for prefix, number in ids:
+        prefixes.setdefault(prefix, []).append(number)
+    for prefix, numbers in prefixes.items():
+        parts.extend(prefix + format_range(*item) for item in to_ranges(numbers))
+    return chunk(parts, "interface ", ", ")
+
+
+class TrunkVlans:
+    """Net effect of switchport trunk allowed vlan lines: the allowed set,
+    or VLANs added/removed to an unknown set"""
+
+    def __init__(self):
+        self.allowed = None
+        self.add = set()
+        self.remove = set()
+
+    def apply(self, text):
+        """Apply line, False if it is not a trunk allowed vlan line"""
+        match = _TRUNK_RE.match(text)
+        if not match:
+            return False
+        oper, value = match.groups()
+        if value in ("all", "none"):
+            if oper not in (None, "except") or (oper == "except" and value == "all"):
+                return False
+            vlans = set(ALL_VLANS) if value == "all" else set()
+        else:
+            try:
+                vlans = parse_vlans(value)
+            except ValueError:
+                return False
+        if oper is None:
+            self.allowed, self.add, self.remove = vlans, set(), set()
+        elif oper == "except":
+            self.allowed, self.add, self.remove = ALL_VLANS - vlans, set(), set()
+        elif self.allowed is not None:
+            self.allowed = self.allowed | vlans if oper == "add" else self.allowed - vlans
+        elif oper == "add":
+            self.add |= vlans
+            self.remove -= vlans
+        else:
+            self.remove |= vlans
+            self.add -= vlans
+        return True
+
+    def state(self):
+        """Comparable net effect"""
+        return (frozenset(self.allowed) if self.allowed is not None else None, frozenset(self.add), frozenset(self.remove))
+
+    def lines(self):
+        """Fewest add/remove lines with the same effect (only deltas, see
+        fold_children)"""
+        prefix = "switchport trunk allowed vlan "
+        return vlan_lines(prefix + "add ", self.add) + vlan_lines(prefix + "remove ", self.remove)
+
+
+def to_blocks(items):
+    """[(header, [children])] of (parents, text) items; None if children
+    are nested deeper or do not follow their header"""
+    blocks = []
+    for parents, text in items:
+        if not parents:
+            blocks.append((text, []))
+        elif len(parents) == 1 and blocks and blocks[-1][0] == parents[0]:
+            blocks[-1][1].append(text)
+        else:
+            return None
+    return blocks
+
+
+def fold_children(children):
+    """Children with trunk allowed vlan add/remove lines folded (at the
+    first one). Kept as they are if any other line, or an absolute one,
+    changes the allowed VLANs"""
+    trunk = TrunkVlans()
+    out, position = [], None
+    for text in children:
+        if trunk.apply(text):
+            if trunk.allowed is not None:
+                return list(children)
+            position = len(out) if position is None else position
+        elif "trunk allowed vlan" in text:
+            return list(children)
+        else:
+            out.append(text)
+    if position is not None:
+        out[position:position] = trunk.lines()
+    return out
+
+
+def optimize_blocks(blocks):
+    """Blocks with folded trunk lines and runs of mergeable blocks merged"""
+    out = []
+    # {children: ids} of the current run of one kind of blocks
+    run = {}
+    runkind = None
+
+    def flush():
+        for children, ids in run.items():
+            out.extend((header, list(children)) for header in format_headers(runkind, ids))
+        run.clear()
+
+    for header, children in blocks:
+        kind, ids = parse_header(header) or (None, None)
+        if kind != runkind:
+            flush()
+            runkind = kind
+        if kind is None:
+            out.append((header, children))
+            continue
+        run.setdefault(tuple(fold_children(children)), []).extend(ids)
+    flush()
+    return out
+
+
+def replay(blocks):
+    """Per object state of blocks: {object: (children without trunk lines,
+    trunk vlans)} and the list of other blocks"""
+    objects = {}
+    others = []
+    for header, children in blocks:
+        parsed = parse_header(header)
+        if parsed is None:
+            others.append((header, tuple(children)))
+            continue
+        kind, ids = parsed
+        for objid in ids:
+            key = (kind, objid[0].lower().replace(" ", ""), objid[1])
+            lines, trunk = objects.setdefault(key, ([], TrunkVlans()))
+            lines.extend(text for text in children if not trunk.apply(text))
+    return {key: (tuple(lines), trunk.state()) for key, (lines, trunk) in objects.items()}, others
+
+
+def equivalent(blocks, optimized):
+    """True if both [(header, [children])] lists configure the same"""
+    return replay(blocks) == replay(optimized)
+
+
+def flatten(blocks):
+    """Commands of blocks"""
+    return [line for header, children in blocks for line in [header] + children]
+
+
+def optimize_commands(items):
+    """Range compress (parents, text) items. Returns (commands, stats);
+    stats has commands in/out and whether the optimized commands were used"""
+    blocks = to_blocks(items)
+    commands = [text for _, text in items]
+    stats = {"commands_in": len(commands), "commands_out": len(commands), "optimized": False}
+    if blocks is None:
+        return commands, stats
+    optimized = optimize_blocks(blocks)
+    if not equivalent(blocks, optimized):
+        return commands, stats
+    commands = flatten(optimized)
+    stats.update({"commands_out": len(commands), "optimized": True})
+    return commands, stats
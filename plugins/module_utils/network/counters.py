@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Interface counter samples and rate computation.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+A sample is stored compactly (field names once, one int list per port):
+    {"mono": 1234.5, "boot": 1700000000.0, "fields": [...], "ports": {"Ethernet1/1": [...]}}
+mono is time.monotonic() of the sample and is used for the interval. boot
+(wall clock - monotonic) changes only if the controller rebooted, in which
+case monotonic values of two samples can not be compared.
+"""
+import time
+
+COUNTER32 = 2**32
+COUNTER64 = 2**64
+
+# Output counter name: device reply key (NX-OS reports them as 64 bit
+# counters, see counter_delta)
+COUNTER_FIELDS = (
+    ("in_octets", "eth_inbytes"),
+    ("out_octets", "eth_outbytes"),
+    ("in_pkts", "eth_inpkts"),
+    ("out_pkts", "eth_outpkts"),
+    ("in_errors", "eth_inerr"),
+    ("out_errors", "eth_outerr"),
+    ("in_discards", "eth_indiscard"),
+    ("out_discards", "eth_outdiscard"),
+)
+COUNTER_NAMES = tuple(name for name, _ in COUNTER_FIELDS)
+
+# Counter name: (rate name, multiplier). Other counters are reported as
+# per interval deltas (<name>_delta).
+RATES = {
+    "in_octets": ("in_bps", 8),
+    "out_octets": ("out_bps", 8),
+    "in_pkts": ("in_pps", 1),
+    "out_pkts": ("out_pps", 1),
+}
+
+# Allowed difference of boot time between samples (NTP adjustments)
+BOOT_DRIFT = 5.0
+
+
+def counter_delta(prev, cur, bits=64):
+    """Difference of two counter readings of a bits wide counter, handling
+    wrap. A counter which went backwards by more than half of its range was
+    cleared (or device rebooted), not wrapped - in that case current value
+    is the delta. A small value is no sign of a 32 bit counter, so only
+    counters known to be 32 bit wide wrap at COUNTER32."""
+    if cur >= prev:
+        return cur - prev
+    modulus = COUNTER32 if bits == 32 else COUNTER64
+    delta = cur + modulus - prev
+    if delta > modulus // 2:
+        return cur
+    return delta
+
+
+def make_sample(ports, mono=None, wall=None):
+    """Make sample from {port: [counters in COUNTER_NAMES order]}"""
+    mono = time.monotonic() if mono is None else mono
+    wall = time.time() if wall is None else wall
+    return {"mono": mono, "boot": wall - mono, "fields": list(COUNTER_NAMES), "ports": ports}
+
+
+def sample_interval(prev, cur):
+    """Seconds between two samples or None if they can not be compared"""
+    if not prev or prev.get("fields") != cur["fields"]:
+        return None
+    try:
+        if abs(prev["boot"] - cur["boot"]) > BOOT_DRIFT:
+            return None
+        interval = cur["mono"] - prev["mono"]
+    except (KeyError, TypeError):
+        return None
+    return interval if interval > 0 else None
+
+
+def compute_rates(prev, cur):
+    """Compute per port rates between two samples.
+    Returns (interval, {port: {rate/delta name: value}}); interval is None
+    and rates empty if there is no usable previous sample."""
+    interval = sample_interval(prev, cur)
+    if interval is None:
+        return None, {}
+    out = {}
+    prevports = prev.get("ports", {})
+    for port, values in cur["ports"].items():
+        prevvalues = prevports.get(port)
+        if not prevvalues or len(prevvalues) != len(values):
+            continue
+        portrates = {}
+        for name, prevval, curval in zip(COUNTER_NAMES, prevvalues, values):
+            delta = counter_delta(prevval, curval)
+            if name in RATES:
+                ratename, mult = RATES[name]
+                portrates[ratename] = round(delta * mult / interval, 3)
+            else:
+                portrates[f"{name}_delta"] = delta
+        out[port] = portrates
+    return round(interval, 3), out
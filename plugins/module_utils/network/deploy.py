@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""Concurrent config deployment to many NX9 devices.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+A connection is anything with exec_command(command) -> output that raises
+on errors, e.g. ansible.module_utils.connection.Connection(socket_path) of a
+persistent network_cli connection (see connection_for). Devices are pushed
+in waves (ascending), devices of one wave concurrently (max_workers at a
+time). With abort_on_failure, a failed device stops the rollout: devices
+not started yet in its wave are aborted and later waves skipped.
+Commands already in the running config are not sent (match, as in
+cisconx9_config; "none" sends all), so a device is changed only if
+something was pushed. plan() is the check mode result: nothing is sent.
+
+    result = deploy([DeployTarget("sw1", connection_for(sock1), ["vlan 10"]),
+                     DeployTarget("sw2", connection_for(sock2), ["vlan 10"], wave=1)],
+                    max_workers=8, save=True)
+    result["ok"], result["devices"]["sw1"]["elapsed"]
+"""
+import json
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ansible.module_utils.connection import Connection
+from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.config import NetworkConfig, dumps
+
+SAVE_COMMAND = {"command": "copy running-config startup-config",
+                "prompt": r"\[confirm yes/no\]:\s?$", "answer": "yes"}
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_ABORTED = "aborted"
+STATUS_SKIPPED = "skipped"
+STATUS_CHECK = "check_mode"
+
+
+class DeployError(Exception):
+    """Device rejected a command"""
+
+
+class DeployTarget:
+    """One device: name, connection, config commands and rollout wave"""
+
+    def __init__(self, name, connection, commands, wave=0):
+        self.name = name
+        self.connection = connection
+        self.commands = list(commands)
+        self.wave = wave
+
+
+def connection_for(socket_path):
+    """Connection of a persistent connection socket"""
+    return Connection(socket_path)
+
+
+def run_command(connection, command):
+    """Run one command (str or prompt/answer dict), raise DeployError if the
+    device rejected it"""
+    data = json.dumps(command) if isinstance(command, dict) else command
+    try:
+        out = connection.exec_command(data)
+    except Exception as ex:  # pylint: disable=broad-except
+        raise DeployError(f"{command}: {ex}") from ex
+    if isinstance(out, str) and out.lstrip().startswith("% "):
+        raise DeployError(f"{command}: {out.strip()}")
+    return out
+
+
+def running_updates(connection, commands, match="line"):
+    """Commands (config lines, children indented) missing from the running
+    config of the device"""
+    running = NetworkConfig(indent=1, contents=run_command(connection, "show running-config"))
+    candidate = NetworkConfig(indent=1, contents="\n".join(commands))
+    configobjs = candidate.difference(running, match=match)
+    return dumps(configobjs, "commands").split("\n") if configobjs else []
+
+
+def push_config(connection, commands, save=False):
+    """configure terminal, commands, end (and save). Leaves config mode on
+    failure, raising the error of the failed command. Returns per step timings"""
+    timings = {}
+    start = time.perf_counter()
+    run_command(connection, "configure terminal")
+    try:
+        for command in commands:
+            if command != "end":
+                run_command(connection, command)
+    except DeployError:
+        try:
+            run_command(connection, "end")
+        except DeployError:
+            pass
+        raise
+    run_command(connection, "end")
+    timings["load"] = round(time.perf_counter() - start, 6)
+    if save:
+        start = time.perf_counter()
+        run_command(connection, SAVE_COMMAND)
+        timings["save"] = round(time.perf_counter() - start, 6)
+    return timings
+
+
+def _deploy_one(target, save, abort, match):
+    """Push updates of one target unless rollout was aborted"""
+    out = {"wave": target.wave, "commands": len(target.commands), "changed": False}
+    if abort.is_set():
+        out["status"] = STATUS_ABORTED
+        return out
+    start = time.perf_counter()
+    try:
+        updates = target.commands if match == "none" else running_updates(target.connection, target.commands, match)
+        out["updates"] = updates
+        if updates:
+            out["timings"] = push_config(target.connection, updates, save)
+            out["changed"] = True
+        out["status"] = STATUS_OK
+    except DeployError as ex:
+        out["status"] = STATUS_FAILED
+        out["error"] = str(ex)
+    out["elapsed"] = round(time.perf_counter() - start, 6)
+    return out
+
+
+def check_names(targets):
+    """Raise ValueError if two targets have the same name"""
+    duplicates = sorted(str(name) for name, count in Counter(target.name for target in targets).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate deploy targets: {', '.join(duplicates)}")
+
+
+def plan(targets):
+    """deploy result of check mode: no connection is used, updates are all
+    commands of each target"""
+    check_names(targets)
+    return {"ok": True, "elapsed": 0.0,
+            "devices": {target.name: {"status": STATUS_CHECK, "wave": target.wave, "commands": len(target.commands),
+                                      "updates": list(target.commands), "changed": bool(target.commands)}
+                        for target in targets}}
+
+
+def deploy(targets, max_workers=8, save=False, abort_on_failure=True, match="line"):
+    """Deploy targets wave by wave. Returns
+    {"ok": bool, "elapsed": s, "devices": {name: {"status", "wave", "changed", "updates", "elapsed", "timings", "error"}}}.
+    Raises ValueError if two targets have the same name"""
+    check_names(targets)
+    start = time.perf_counter()
+    devices = {}
+    abort = threading.Event()
+    waves = sorted({target.wave for target in targets})
+
+    def stop_on_failure(future):
+        if future.result()["status"] == STATUS_FAILED:
+            abort.set()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for wave in waves:
+            batch = [target for target in targets if target.wave == wave]
+            if abort.is_set():
+                for target in batch:
+                    devices[target.name] = {"status": STATUS_SKIPPED, "wave": wave, "commands": len(target.commands), "changed": False}
+                continue
+            futures = {}
+            for target in batch:
+                future = pool.submit(_deploy_one, target, save, abort, match)
+                if abort_on_failure:
+                    future.add_done_callback(stop_on_failure)
+                futures[future] = target
+            wait(futures)
+            for future, target in futures.items():
+                devices[target.name] = future.result()
+    return {"ok": all(dev["status"] == STATUS_OK for dev in devices.values()),
+            "elapsed": round(time.perf_counter() - start, 6),
+            "devices": devices}
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""SQLite store of facts of many switches with indexed lookups.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Facts of a host (ansible_facts of cisconx9_facts, or its ansible_facts_file
+result) are split to sections, each owning its rows in the tables below:
+    interfaces  ansible_net_interfaces, ansible_net_info
+                -> interfaces, vlans (tagged ports of VlanN), macs (own)
+    mac_table   ansible_net_mac_table -> macs (learned)
+    lldp        ansible_net_lldp -> lldp
+    routes      ansible_net_ipv4, ansible_net_ipv6 -> routes
+A section is only written when the facts have one of its keys and its
+digest changed since the last update of the host, so partial gathers keep
+the other sections and unchanged hosts cost one digest per section.
+MACs are stored as aa:bb:cc:dd:ee:ff, prefixes as normalized addr/len with
+their first/last address as fixed width hex, so an address lookup is one
+indexed probe per prefix length.
+The store is a cache of facts: a store of another version is rebuilt.
+"""
+import json
+import sqlite3
+import hashlib
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.macaddr import format_mac, parse_mac
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.routes import FAMILY_BITS, format_prefix, parse_address, parse_prefix
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.topology import remote_port
+
+STORE_VERSION = 1
+# Seconds to wait for another writer (parallel forks update the same store)
+LOCK_TIMEOUT = 30
+
+# table: columns (besides host and section)
+TABLES = {
+    "interfaces": ("name", "operstatus", "description", "mac", "switchport"),
+    "vlans": ("vlan", "port"),
+    "macs": ("mac", "vlan", "port"),
+    "lldp": ("port", "remote_system", "remote_port", "remote_chassis"),
+    "routes": ("vrf", "prefix", "nexthop", "family", "first", "last"),
+}
+INDEXES = {
+    "interfaces": ("name", "mac"),
+    "vlans": ("vlan",),
+    "macs": ("mac",),
+    "lldp": ("remote_system", "remote_chassis"),
+    "routes": ("prefix", "family, first"),
+}
+# section: facts keys
+SECTIONS = {
+    "interfaces": ("ansible_net_interfaces", "ansible_net_info"),
+    "mac_table": ("ansible_net_mac_table",),
+    "lldp": ("ansible_net_lldp",),
+    "routes": ("ansible_net_ipv4", "ansible_net_ipv6"),
+}
+
+
+def load_facts(facts):
+    """ansible_facts of facts dict, module result or ansible_facts_file result"""
+    if "ansible_facts_file" in facts:
+        with open(facts["ansible_facts_file"]["file"], "r", encoding="utf-8") as fd:
+            return json.load(fd)
+    return facts.get("ansible_facts", facts)
+
+
+def to_mac(text):
+    """aa:bb:cc:dd:ee:ff of MAC text, None if it is not a MAC"""
+    value = parse_mac(text) if isinstance(text, str) else None
+    return None if value is None else format_mac(value)
+
+
+def to_int(value):
+    """int of VLAN id (100 or "100"), None otherwise"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def hex_address(value, family):
+    """Fixed width hex of address int (sorts as the address)"""
+    return f"{value:0{FAMILY_BITS[family] // 4}x}"
+
+
+def interface_rows(facts):
+    """(table, row) of interfaces section"""
+    macs = set()
+    for name, intf in (facts.get("ansible_net_interfaces") or {}).items():
+        mac = to_mac(intf.get("mac"))
+        yield "interfaces", (name, intf.get("operstatus"), intf.get("description"), mac, intf.get("switchport"))
+        if mac and mac not in macs:
+            macs.add(mac)
+            yield "macs", (mac, None, name)
+        vlan = to_int(name[4:]) if name.startswith("Vlan") else None
+        if vlan is None:
+            continue
+        for port in intf.get("tagged") or [None]:
+            yield "vlans", (vlan, port)
+    for mac in (facts.get("ansible_net_info") or {}).get("macs") or []:
+        mac = to_mac(mac)
+        if mac and mac not in macs:
+            macs.add(mac)
+            yield "macs", (mac, None, None)
+
+
+def mac_table_rows(facts):
+    """(table, row) of mac_table section"""
+    for port, vlans in (facts.get("ansible_net_mac_table") or {}).items():
+        for vlan, macs in vlans.items():
+            for mac in macs:
+                yield "macs", (to_mac(mac) or mac, to_int(vlan), port)
+
+
+def lldp_rows(facts):
+    """(table, row) of lldp section"""
+    for port, row in (facts.get("ansible_net_lldp") or {}).items():
+        name, mac = remote_port(row)
+        yield "lldp", (port, row.get("remote_system_name"), name, None if mac is None else format_mac(mac))
+
+
+def route_rows(facts):
+    """(table, row) of routes section; routes which do not parse are skipped"""
+    for route in (facts.get("ansible_net_ipv4") or []) + (facts.get("ansible_net_ipv6") or []):
+        try:
+            family, network, masklen = parse_prefix(route.get("to") or "")
+        except (ValueError, OSError):
+            continue
+        last = network | ((1 << (FAMILY_BITS[family] - masklen)) - 1)
+        yield "routes", (route.get("vrf"), format_prefix(family, network, masklen), route.get("from"), family,
+                         hex_address(network, family), hex_address(last, family))
+
+
+SECTION_ROWS = {"interfaces": interface_rows, "mac_table": mac_table_rows, "lldp": lldp_rows, "routes": route_rows}
+
+
+class FleetStore:
+    """Facts store, see module docstring. readonly opens an existing store
+    for queries only"""
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=LOCK_TIMEOUT, isolation_level=None)
+        else:
+            self.conn = sqlite3.connect(path, timeout=LOCK_TIMEOUT, isolation_level=None)
+            try:
+                self.create()
+            except Exception:
+                # e.g. database locked by another writer past LOCK_TIMEOUT
+                self.conn.close()
+                raise
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        """Close store"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def create(self):
+        """Create (or rebuild other version of) the schema"""
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != STORE_VERSION:
+                for table in ("hosts", "sections") + tuple(TABLES):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute("CREATE TABLE hosts (host TEXT PRIMARY KEY)")
+                self.conn.execute("CREATE TABLE sections (host TEXT, section TEXT, digest TEXT, PRIMARY KEY (host, section))")
+                for table, columns in TABLES.items():
+                    self.conn.execute(f"CREATE TABLE {table} (host TEXT NOT NULL, section TEXT NOT NULL, {', '.join(columns)})")
+                    self.conn.execute(f"CREATE INDEX {table}_host ON {table} (host, section)")
+                    for columns in INDEXES[table]:
+                        self.conn.execute(f"CREATE INDEX {table}_{columns.split(',')[0]} ON {table} ({columns})")
+                self.conn.execute(f"PRAGMA user_version = {STORE_VERSION}")
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def update_host(self, host, facts):
+        """Store facts of host (see load_facts). Returns names of the
+        sections which changed"""
+        facts = load_facts(facts)
+        changed = []
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("INSERT OR IGNORE INTO hosts VALUES (?)", (host,))
+            for section, keys in SECTIONS.items():
+                if not any(key in facts for key in keys):
+                    continue
+                digest = hashlib.sha1(json.dumps([facts.get(key) for key in keys], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+                row = self.conn.execute("SELECT digest FROM sections WHERE host = ? AND section = ?", (host, section)).fetchone()
+                if row is not None and row[0] == digest:
+                    continue
+                self.delete_section(host, section)
+                rows = {}
+                for table, values in SECTION_ROWS[section](facts):
+                    rows.setdefault(table, []).append((host, section) + values)
+                for table, values in rows.items():
+                    self.conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * (len(TABLES[table]) + 2))})", values)
+                self.conn.execute("INSERT OR REPLACE INTO sections VALUES (?, ?, ?)", (host, section, digest))
+                changed.append(section)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    def delete_section(self, host, section):
+        """Drop rows of section of host"""
+        for table in TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE host = ? AND section = ?", (host, section))
+        self.conn.execute("DELETE FROM sections WHERE host = ? AND section = ?", (host, section))
+
+    def remove_host(self, host):
+        """Drop everything stored of host"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for section in SECTIONS:
+                self.delete_section(host, section)
+            self.conn.execute("DELETE FROM hosts WHERE host = ?", (host,))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def hosts(self):
+        """Stored host names"""
+        return [row[0] for row in self.conn.execute("SELECT host FROM hosts ORDER BY host")]
+
+    def select(self, table, where, args, host=None, order="host"):
+        """Rows (dicts without section) of table matching where"""
+        if host is not None:
+            where += " AND host = ?"
+            args = tuple(args) + (host,)
+        columns = ", ".join(("host",) + TABLES[table])
+        return [dict(row) for row in self.conn.execute(f"SELECT {columns} FROM {table} WHERE {where} ORDER BY {order}", args)]
+
+    def find_mac(self, mac, host=None):
+        """Where MAC is: own (vlan and port of an interface MAC, or none) or learned on port/vlan"""
+        value = to_mac(mac)
+        if value is None:
+            raise ValueError(f"Not a MAC address: {mac}")
+        return self.select("macs", "mac = ?", (value,), host)
+
+    def find_vlan(self, vlan, host=None):
+        """Ports trunking VLAN (port is None on switches without tagged ports of it)"""
+        value = to_int(vlan)
+        if value is None:
+            raise ValueError(f"Not a VLAN id: {vlan}")
+        return self.select("vlans", "vlan = ?", (value,), host, order="host, port")
+
+    def find_interface(self, name, host=None):
+        """Interfaces called name"""
+        return self.select("interfaces", "name = ?", (name,), host)
+
+    def find_neighbor(self, name, host=None):
+        """LLDP rows of neighbor system name or chassis/port MAC"""
+        mac = to_mac(name)
+        if mac is not None:
+            return self.select("lldp", "remote_chassis = ?", (mac,), host, order="host, port")
+        return self.select("lldp", "remote_system = ?", (name,), host, order="host, port")
+
+    def find_prefix(self, prefix, host=None):
+        """Routes to exactly prefix"""
+        family, network, masklen = parse_prefix(prefix)
+        return self.select("routes", "prefix = ?", (format_prefix(family, network, masklen),), host, order="host, vrf")
+
+    def find_address(self, address, host=None, vrf=None):
+        """Routes containing address, most specific first (per host)"""
+        family, value = parse_address(address)
+        bits = FAMILY_BITS[family]
+        firsts = sorted({hex_address(value >> shift << shift, family) for shift in range(bits + 1)})
+        where = f"family = ? AND first IN ({', '.join('?' * len(firsts))}) AND last >= ?"
+        args = (family,) + tuple(firsts) + (hex_address(value, family),)
+        if vrf is not None:
+            where += " AND vrf = ?"
+            args += (vrf,)
+        return self.select("routes", where, args, host, order="host, first DESC, last")
+
+    def query(self, kind, value, host=None):
+        """find_<kind> of value: mac, vlan, interface, neighbor, prefix or address"""
+        finder = getattr(self, f"find_{kind}", None) if kind in ("mac", "vlan", "interface", "neighbor", "prefix", "address") else None
+        if finder is None:
+            raise ValueError(f"Unknown fleet query {kind}")
+        return finder(value, host=host)
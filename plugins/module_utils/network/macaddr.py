@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""MAC address normalization.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Device MACs (aabb.ccdd.eeff, aa:bb:cc:dd:ee:ff, aa-bb-...) are parsed to
+48-bit ints. Ints are cheap to keep, compare and deduplicate; they are
+formatted to aa:bb:cc:dd:ee:ff only when output is produced.
+normalize_mac gives the aa:bb:cc:dd:ee:ff format of interface and LLDP
+facts without going through an int, so it keeps the case the device
+reported (same output as the previous macSplitter). It is memoized
+(bounded) for repeated lookups of the same MACs; bulk tables should use
+parse_mac + format_mac, as most entries there are unique and would only
+churn the cache.
+"""
+from functools import lru_cache
+
+_SEPARATORS = str.maketrans("", "", ".:- ")
+_HEXDIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def parse_mac(text):
+    """Parse MAC address to 48-bit int. Returns None if text is not a MAC"""
+    digits = text.translate(_SEPARATORS)
+    if len(digits) != 12 or not _HEXDIGITS.issuperset(digits):
+        return None
+    return int(digits, 16)
+
+
+def format_mac(value):
+    """Format 48-bit int as aa:bb:cc:dd:ee:ff"""
+    return value.to_bytes(6, "big").hex(":")
+
+
+def _split_pairs(text):
+    """Legacy format for values which are not MACs (e.g. LLDP port ids)"""
+    text = text.strip().replace(".", "")
+    return ":".join(text[index : index + 2] for index in range(0, len(text), 2))
+
+
+@lru_cache(maxsize=8192)
+def normalize_mac(text):
+    """Return aa:bb:cc:dd:ee:ff format of MAC address (case as reported).
+    Values which are not MACs are split to 2 char groups as before."""
+    digits = text.translate(_SEPARATORS)
+    if len(digits) != 12 or not _HEXDIGITS.issuperset(digits):
+        return _split_pairs(text)
+    return f"{digits[0:2]}:{digits[2:4]}:{digits[4:6]}:{digits[6:8]}:{digits[8:10]}:{digits[10:12]}"
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Memory budget of a facts run, measured with tracemalloc.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Python allocations are traced while the budget is in use; track() records
+how much one phase (fetch, parse) of one subset added at its peak. Only Python heap is
+counted (not interpreter/library baseline), so the budget is what the
+facts run adds on top of an idle module process.
+Output is the last big allocation: module result JSON plus the copy
+exit_json makes of the facts cost roughly OUTPUT_FACTOR times the facts
+left in memory. spill() tells when that would go over the budget, and the
+facts are then streamed to a file instead. Once half of the budget is in
+use, the remaining replies are spooled to files (spool_threshold).
+"""
+import tracemalloc
+from contextlib import contextmanager
+
+OUTPUT_FACTOR = 3
+# spool_threshold (bytes) once half of the budget is in use
+SPILL_SPOOL = 65536
+
+
+def to_mb(value):
+    """Bytes to MB (2 decimals)"""
+    return round(value / 2**20, 2)
+
+
+class MemoryBudget:
+    """Traced allocations of a facts run against limit (bytes)"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+        # key: {phase: peak bytes}
+        self.phases = {}
+
+    def current(self):
+        """Bytes allocated since start"""
+        return max(tracemalloc.get_traced_memory()[0] - self.base, 0)
+
+    @contextmanager
+    def track(self, keys, phase):
+        """Record peak growth of phase for keys (objects fetched/parsed
+        together share it)"""
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak = max(self.peak, peak - self.base)
+            for key in keys:
+                self.phases.setdefault(key, {})[phase] = max(peak - start, 0)
+
+    def half_used(self):
+        """Half of the budget is in use"""
+        return self.current() * 2 > self.limit
+
+    def spool_threshold(self, threshold):
+        """spool_threshold for the next replies (SPILL_SPOOL or lower once
+        half of the budget is in use)"""
+        if self.half_used() and not 0 < (threshold or 0) <= SPILL_SPOOL:
+            return SPILL_SPOOL
+        return threshold
+
+    def spill(self):
+        """Output would exceed the budget (or it was exceeded already)"""
+        return self.peak > self.limit or self.current() * OUTPUT_FACTOR > self.limit
+
+    def report(self, names):
+        """Per subset peaks ({key: name}) and totals, MB"""
+        return {"budget_mb": to_mb(self.limit), "peak_mb": to_mb(self.peak), "current_mb": to_mb(self.current()),
+                "spill": self.spill(),
+                "subsets": {names[key]: {f"{phase}_mb": to_mb(value) for phase, value in phases.items()}
+                            for key, phases in self.phases.items() if key in names}}
+
+    def stop(self):
+        """Stop tracing (if started here)"""
+        if self.started:
+            tracemalloc.stop()
+            self.started = False
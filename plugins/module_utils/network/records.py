@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Compact records used while parsing interface facts.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+A high density chassis has thousands of interfaces, SVIs and synthetic
+VlanN entries (one per VLAN allowed on any trunk), each of them a dict
+while parsing. InterfaceRecord keeps the same fields in __slots__ and is
+converted to the public dict format (to_dict) once, at output. Interface
+names are interned, so the name in ansible_net_interfaces, tagged lists and
+LLDP rows is one string object. port_key is a sortable key of an interface
+name (Ethernet1/2 before Ethernet1/10), parsed once per name. Tagged ports
+of a VLAN are checked against an int with one bit per port (port_bit): a
+set per VLAN was the largest allocation of the whole parse.
+"""
+import re
+import sys
+
+_UNSET = object()
+_DIGITS_RE = re.compile(r"(\d+)")
+_PORT_KEYS = {}
+
+intern_name = sys.intern
+
+
+def port_key(name):
+    """(type, (numbers...), name) of interface name: Ethernet1/1/2 is
+    ("ethernet", (1, 1, 2), "Ethernet1/1/2")"""
+    key = _PORT_KEYS.get(name)
+    if key is None:
+        parts = _DIGITS_RE.split(name)
+        key = _PORT_KEYS[name] = (parts[0].lower(), tuple(int(part) for part in parts[1::2]), name)
+    return key
+
+
+def port_bit(name, portbits):
+    """Bit of port name in portbits ({name: bit}, shared by the records of
+    one parse), added if missing"""
+    bit = portbits.get(name)
+    if bit is None:
+        bit = portbits[name] = 1 << len(portbits)
+    return bit
+
+
+class InterfaceRecord:
+    """One entry of ansible_net_interfaces. Fields not set are left out of
+    to_dict; tagged keeps the port bits (see port_bit) next to the list for
+    membership checks"""
+
+    # (slot, output key)
+    FIELDS = (("operstatus", "operstatus"), ("mac", "mac"), ("duplex", "duplex"), ("description", "description"),
+              ("bandwidth", "bandwidth"), ("mtu", "mtu"), ("switchport", "switchport"), ("lineprotocol", "lineprotocol"),
+              ("macaddress", "macaddress"), ("channel_member", "channel-member"), ("ipv4", "ipv4"), ("ipv6", "ipv6"),
+              ("tagged", "tagged"))
+    __slots__ = tuple(slot for slot, _ in FIELDS) + ("tagbits",)
+
+    def __init__(self, **fields):
+        for slot, _ in self.FIELDS:
+            setattr(self, slot, fields.get(slot, _UNSET))
+        self.tagbits = None
+
+    @classmethod
+    def placeholder(cls):
+        """Synthetic VlanN entry of a VLAN only seen on trunks"""
+        return cls(bandwidth=None, duplex=None, lineprotocol=None, macaddress=None, description=None, mtu=None,
+                   operstatus=None, channel_member=None)
+
+    def get(self, slot, default=None):
+        """Field value or default"""
+        value = getattr(self, slot)
+        return default if value is _UNSET else value
+
+    def update(self, row):
+        """Set fields of an extracted row"""
+        for slot, value in row.items():
+            setattr(self, slot, value)
+
+    def append(self, slot, value):
+        """Append to list field"""
+        values = getattr(self, slot)
+        if values is _UNSET:
+            values = []
+            setattr(self, slot, values)
+        values.append(value)
+
+    def add_tagged(self, name, portbits):
+        """Add port to tagged (once), portbits see port_bit"""
+        if self.tagged is _UNSET:
+            self.tagged = []
+        if self.tagbits is None:
+            self.tagbits = 0
+            for port in self.tagged:
+                self.tagbits |= port_bit(port, portbits)
+        bit = port_bit(name, portbits)
+        if not self.tagbits & bit:
+            self.tagbits |= bit
+            self.tagged.append(name)
+
+    def to_dict(self):
+        """Public (facts) format"""
+        out = {}
+        for slot, key in self.FIELDS:
+            value = getattr(self, slot)
+            if value is not _UNSET:
+                out[key] = value
+        return out
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Recorded NX9 session replay (offline device simulator).
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+ReplayShell behaves like the paramiko channel network_cli reads from
+(sendall/recv/settimeout/close): it echoes commands, serves recorded
+outputs followed by the device prompt and tracks configure mode prompts.
+Used by the cisconx9_replay connection plugin and tests/perf/bench_stack.py.
+
+Session file (JSON):
+    {"hostname": "sw1",
+     "commands": {"show version | json": {...} or "raw text output", ...}}
+A session can also be a directory of unit test fixtures
+(tests/unit/modules/fixtures), where file name is derived from the command.
+"""
+import os
+import copy
+import json
+import time
+import socket
+
+INVALID_COMMAND = "% Invalid command at '^' marker."
+# Built in (unless recorded): accounting log index grows with config commands
+ACCOUNTING_INDEX = "show accounting log last-index"
+CONFIG_BANNER = "Enter configuration commands, one per line. End with CNTL/Z."
+# Config mode commands which enter a sub mode: prompt suffix
+SUBMODES = {
+    "interface": "config-if",
+    "vlan": "config-vlan",
+    "router": "config-router",
+    "vrf": "config-vrf",
+}
+
+
+def fixture_name(command):
+    """Fixture file name of command (same as unit tests)"""
+    return command.replace("|", "").replace(" ", "_").replace("/", "7")
+
+
+def scale_rows(data, scale):
+    """Multiply outermost ROW_* lists in reply by scale (output grows
+    linearly with scale, nested rows are copied along)"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key.startswith("ROW_"):
+                value = value if isinstance(value, list) else [value]
+                data[key] = [copy.deepcopy(item) for _ in range(scale) for item in value]
+            else:
+                scale_rows(value, scale)
+    elif isinstance(data, list):
+        for item in data:
+            scale_rows(item, scale)
+    return data
+
+
+class ReplaySession:
+    """Recorded command outputs of one device"""
+
+    def __init__(self, commands=None, hostname="replay", fixtures=None, scale=1):
+        self.commands = commands or {}
+        self.hostname = hostname
+        self.fixtures = fixtures
+        self.scale = scale
+        self._cache = {}
+
+    @classmethod
+    def load(cls, path, scale=1):
+        """Load session file or fixtures directory"""
+        if os.path.isdir(path):
+            return cls(fixtures=path, scale=scale)
+        with open(path, "r", encoding="utf-8") as fd:
+            data = json.load(fd)
+        return cls(commands=data.get("commands", {}), hostname=data.get("hostname", "replay"), scale=scale)
+
+    def save(self, path):
+        """Save session file"""
+        with open(path, "w", encoding="utf-8") as fd:
+            json.dump({"hostname": self.hostname, "commands": self.commands}, fd)
+
+    def _recorded(self, command):
+        if command in self.commands:
+            return self.commands[command]
+        if self.fixtures:
+            path = os.path.join(self.fixtures, fixture_name(command))
+            if os.path.isfile(path):
+                with open(path, "r", encoding="utf-8") as fd:
+                    data = fd.read()
+                try:
+                    return json.loads(data)
+                except ValueError:
+                    return data
+        return None
+
+    def output(self, command):
+        """Return output text of exec mode command or None if not recorded"""
+        if command not in self._cache:
+            data = self._recorded(command)
+            if isinstance(data, (dict, list)):
+                if self.scale > 1:
+                    data = scale_rows(copy.deepcopy(data), self.scale)
+                data = json.dumps(data)
+            self._cache[command] = data
+        return self._cache[command]
+
+
+class ReplayShell:
+    """Paramiko channel like object serving a ReplaySession.
+    latency   - seconds before output of each command becomes available;
+    bandwidth - output bytes per second (0 - unlimited)."""
+
+    def __init__(self, session, latency=0.0, bandwidth=0):
+        self.session = session
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.timeout = None
+        self.modes = []
+        self.config_log = []
+        # device_time - simulated latency/bandwidth delays; idle_time - time
+        # network_cli waited on recv for more output after the prompt was sent
+        self.stats = {"commands": 0, "bytes": 0, "device_time": 0.0, "idle_time": 0.0}
+        self._buffer = b""
+        self._pos = 0
+        self._ready_at = 0.0
+        self._closed = False
+        self._queue(f"\r\n{self.prompt()}")
+
+    def prompt(self):
+        """Current device prompt"""
+        if not self.modes:
+            return f"{self.session.hostname}# "
+        return f"{self.session.hostname}({self.modes[-1]})# "
+
+    def _queue(self, text, delay=0.0):
+        self._buffer = text.encode("utf-8")
+        self._pos = 0
+        if self.bandwidth:
+            delay += len(self._buffer) / self.bandwidth
+        self._ready_at = time.monotonic() + delay
+        self.stats["device_time"] += delay
+        self.stats["bytes"] += len(self._buffer)
+
+    def execute(self, command):
+        """Execute one command and return its output"""
+        words = command.split()
+        if not words:
+            return ""
+        if words[0] in ("configure", "conf"):
+            self.modes = ["config"]
+            return CONFIG_BANNER
+        if self.modes:
+            if command == "end":
+                self.modes = []
+            elif command == "exit":
+                self.modes.pop()
+            else:
+                self.config_log.append(command)
+                if words[0] in SUBMODES:
+                    self.modes[1:] = [SUBMODES[words[0]]]
+            return ""
+        if words[0] == "terminal":
+            return ""
+        if command == "copy running-config startup-config":
+            return "[########################################] 100%\r\nCopy complete."
+        output = self.session.output(command)
+        if output is None and command == ACCOUNTING_INDEX:
+            return f"accounting-log last-index : {len(self.config_log)}"
+        return INVALID_COMMAND if output is None else output
+
+    def sendall(self, data):
+        """Receive command from network_cli"""
+        if self._closed:
+            raise socket.error("Replay shell is closed")
+        command = data.decode("utf-8").strip()
+        self.stats["commands"] += 1
+        output = self.execute(command)
+        output = output.replace("\n", "\r\n") if output else ""
+        text = f"{command}\r\n{output}\r\n{self.prompt()}" if output else f"{command}\r\n{self.prompt()}"
+        self._queue(text, self.latency)
+
+    def recv(self, size):
+        """Return next chunk of output. Blocks (like a real channel) when
+        there is nothing to read, until timeout or signal interrupts it."""
+        start = time.monotonic()
+        try:
+            while self._pos >= len(self._buffer) or time.monotonic() < self._ready_at:
+                if self._closed:
+                    return b""
+                if self.timeout is not None and time.monotonic() - start > self.timeout:
+                    raise socket.timeout("timed out")
+                time.sleep(min(0.005, max(self._ready_at - time.monotonic(), 0.0005)))
+        finally:
+            if self._pos >= len(self._buffer):
+                self.stats["idle_time"] += time.monotonic() - start
+        chunk = self._buffer[self._pos : self._pos + size]
+        self._pos += size
+        return chunk
+
+    def settimeout(self, timeout):
+        """Set recv timeout"""
+        self.timeout = timeout
+
+    def gettimeout(self):
+        """Get recv timeout"""
+        return self.timeout
+
+    def close(self):
+        """Close shell"""
+        self._closed = True
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Per VRF route index with longest prefix match lookup.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Index is a plain dict (JSON serializable) and lookups work directly on it,
+so it round-trips through facts/files without rebuilding:
+    {"version": 1,
+     "vrfs": {"default": {"4": {"lengths": [32, 24, 0],
+                                "prefixes": {"24": {"<network >> (32-24) in hex>": ["10.0.0.0/24", ["10.1.1.1"]]}}},
+                          "6": {...}}}}
+A lookup hashes the address once per distinct prefix length present in the
+VRF (at most 33 for IPv4, 129 for IPv6), longest first.
+
+aggregate_routes collapses routes of the same VRF and next hop to the
+fewest covering prefixes (overlapping and adjacent prefixes are merged on
+integer ranges). Result answers "which next hop reaches this address", not
+longest prefix match between next hops: a more specific route of another
+next hop inside an aggregate is kept, but is not excluded from it.
+
+route_commands builds show ip/ipv6 route commands limited to some VRFs,
+prefixes (and more specific routes) and route sources, so the device does
+not serialize the whole routing table of every VRF.
+"""
+import re
+import socket
+
+INDEX_VERSION = 1
+FAMILY_BITS = {4: 32, 6: 128}
+FAMILY_AF = {4: socket.AF_INET, 6: socket.AF_INET6}
+# VRF names and route sources (static, direct, bgp-65000, ospf-1, ...)
+_NAME_RE = re.compile(r"^[\w.:-]+$")
+
+
+def parse_address(address):
+    """Return (family, int) of IPv4/IPv6 address"""
+    if ":" in address:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+    return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), "big")
+
+
+def parse_prefix(prefix):
+    """Return (family, network int, prefix length) of addr/len prefix"""
+    address, _, masklen = prefix.partition("/")
+    family, value = parse_address(address)
+    bits = FAMILY_BITS[family]
+    masklen = int(masklen) if masklen else bits
+    if not 0 <= masklen <= bits:
+        raise ValueError(f"Wrong prefix length in {prefix}")
+    return family, value >> (bits - masklen) << (bits - masklen), masklen
+
+
+def route_commands(vrfs=None, prefixes=None, sources=None):
+    """[(family, command)] of routes in vrfs (default all), within prefixes
+    (default any, families of prefixes only) and from sources (default any).
+    Raises ValueError on a wrong prefix, VRF or source name"""
+    filters = {4: [], 6: []} if prefixes else {4: [""], 6: [""]}
+    for prefix in prefixes or []:
+        try:
+            family, value, masklen = parse_prefix(prefix)
+        except OSError as ex:
+            raise ValueError(f"Wrong prefix {prefix}") from ex
+        filters[family].append(f"{format_prefix(family, value, masklen)} longer-prefixes")
+    for name in list(vrfs or []) + list(sources or []):
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Wrong VRF or route source name {name}")
+    commands = []
+    for family, cmdfilters in filters.items():
+        for cmdfilter in cmdfilters:
+            for source in sources or [""]:
+                for vrf in vrfs or ["all"]:
+                    parts = ("show", "ip" if family == 4 else "ipv6", "route", cmdfilter, source, "vrf", vrf, "| json")
+                    commands.append((family, " ".join(part for part in parts if part)))
+    return commands
+
+
+def format_prefix(family, value, masklen):
+    """addr/len of network int"""
+    return f"{socket.inet_ntop(FAMILY_AF[family], value.to_bytes(FAMILY_BITS[family] // 8, 'big'))}/{masklen}"
+
+
+def range_to_prefixes(start, end, bits):
+    """Fewest (network, masklen) covering integer range [start, end)"""
+    out = []
+    while start < end:
+        # Biggest block aligned at start which fits in the range
+        size = start & -start if start else 1 << bits
+        while size > end - start:
+            size >>= 1
+        out.append((start, bits - size.bit_length() + 1))
+        start += size
+    return out
+
+
+def collapse_prefixes(networks, bits):
+    """Merge (network, masklen) list to the fewest covering prefixes"""
+    out = []
+    start = end = None
+    for value, masklen in sorted(networks):
+        last = value + (1 << (bits - masklen))
+        if start is not None and value <= end:
+            end = max(end, last)
+            continue
+        if start is not None:
+            out.extend(range_to_prefixes(start, end, bits))
+        start, end = value, last
+    if start is not None:
+        out.extend(range_to_prefixes(start, end, bits))
+    return out
+
+
+def aggregate_routes(routes):
+    """Aggregate routing facts ([{"vrf", "to", "from"}, ...]) per VRF and
+    next hop. Returns (routes, {"routes": in, "aggregated": out, "ratio": in/out}).
+    Routes with a wrong or missing prefix are kept as they are."""
+    groups = {}
+    kept = []
+    for route in routes:
+        try:
+            family, value, masklen = parse_prefix(route["to"])
+        except (KeyError, ValueError, OSError):
+            kept.append(route)
+            continue
+        groups.setdefault((route.get("vrf", "default"), route.get("from"), family), []).append((value, masklen))
+    out = []
+    for (vrf, nexthop, family), networks in sorted(groups.items(), key=lambda item: (item[0][0], item[0][1] or "", item[0][2])):
+        for value, masklen in collapse_prefixes(networks, FAMILY_BITS[family]):
+            route = {"vrf": vrf, "to": format_prefix(family, value, masklen)}
+            if nexthop is not None:
+                route["from"] = nexthop
+            out.append(route)
+    out.extend(kept)
+    return out, {"routes": len(routes), "aggregated": len(out), "ratio": round(len(routes) / len(out), 2) if out else 1.0}
+
+
+def prefix_key(value, masklen, bits):
+    """Hash key of network value in prefixes[masklen] table"""
+    return format(value >> (bits - masklen), "x")
+
+
+def build_route_index(routes):
+    """Build index from routing facts ([{"vrf", "to", "from"}, ...]).
+    Routes with a wrong or missing prefix are skipped."""
+    vrfs = {}
+    for route in routes:
+        try:
+            family, value, masklen = parse_prefix(route["to"])
+        except (KeyError, ValueError, OSError):
+            continue
+        table = vrfs.setdefault(route.get("vrf", "default"), {}).setdefault(str(family), {"lengths": [], "prefixes": {}})
+        entries = table["prefixes"].setdefault(str(masklen), {})
+        entry = entries.setdefault(prefix_key(value, masklen, FAMILY_BITS[family]), [route["to"], []])
+        if route.get("from") and route["from"] not in entry[1]:
+            entry[1].append(route["from"])
+    for families in vrfs.values():
+        for table in families.values():
+            table["lengths"] = sorted((int(masklen) for masklen in table["prefixes"]), reverse=True)
+    return {"version": INDEX_VERSION, "vrfs": vrfs}
+
+
+def lookup_route(index, address, vrf="default"):
+    """Longest prefix match of address in vrf.
+    Returns {"prefix": ..., "nexthops": [...]} or None if there is no route."""
+    family, value = parse_address(address)
+    table = index.get("vrfs", {}).get(vrf, {}).get(str(family))
+    if not table:
+        return None
+    bits = FAMILY_BITS[family]
+    prefixes = table["prefixes"]
+    for masklen in table["lengths"]:
+        entry = prefixes[str(masklen)].get(format(value >> (bits - masklen), "x"))
+        if entry:
+            return {"prefix": entry[0], "nexthops": entry[1]}
+    return None
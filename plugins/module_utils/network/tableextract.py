@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Declarative extraction of NX-OS TABLE_*/ROW_* JSON replies.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+A reply parser is a spec: which TABLE_x/ROW_x levels to walk and which
+fields to take from each row. One walker (TableSpec.rows) serves all of
+them, so the table/row/field mapping of every reply is in one place:
+
+    LLDP_TABLE = TableSpec([Level("TABLE_nbor_detail", "ROW_nbor_detail", [
+        Field("local_port_id", "l_port_id", eth_to_ethernet),
+        Field("remote_system_name", "sys_name", skip=("null",)),
+    ])], required=("local_port_id",))
+    for row in LLDP_TABLE.rows(reply):
+        ...
+"""
+from itertools import islice
+
+_MISSING = object()
+# Output values of required keys which drop the row
+_EMPTY = (None, "")
+
+
+class Field:
+    """Output field definition.
+    out       - output key (a later field of the same key overwrites it);
+    src       - reply key, or tuple of reply keys (all must be present);
+    transform - callable applied to the value(s);
+    default   - value used if src is missing (must be immutable);
+    skip      - reply values treated as missing (e.g. "null")."""
+
+    __slots__ = ("out", "src", "transform", "default", "skip")
+
+    def __init__(self, out, src, transform=None, default=_MISSING, skip=()):
+        self.out = out
+        self.src = src if isinstance(src, tuple) else (src,)
+        self.transform = transform
+        self.default = default
+        self.skip = tuple(skip)
+
+
+class Level:
+    """One TABLE_x/ROW_x level of a reply.
+    table/row are None for a reply which is a single flat row (show version).
+    If outer is set (innermost level only), parent row is still returned
+    when this level is empty."""
+
+    __slots__ = ("table", "row", "fields", "outer")
+
+    def __init__(self, table, row, fields=(), outer=False):
+        self.table = table
+        self.row = row
+        self.fields = tuple(fields)
+        self.outer = outer
+
+
+def table_rows(data, table, row):
+    """ROW_x list of TABLE_x of data. Tolerates missing or wrongly typed
+    tables and not normalized (single dict) rows; callers skip rows which
+    are not dicts."""
+    if table is None:
+        return [data] if isinstance(data, dict) else []
+    tbl = data.get(table) if isinstance(data, dict) else None
+    rows = tbl.get(row) if isinstance(tbl, dict) else None
+    if isinstance(rows, list):
+        return rows
+    if isinstance(rows, dict):
+        return [rows]
+    return []
+
+
+def field_plan(fields):
+    """Fields as tuples for fill_row: (out, src, transform, default, skip),
+    src is a key, or a tuple of keys for fields of several reply keys"""
+    return tuple((field.out, field.src[0] if len(field.src) == 1 else field.src, field.transform, field.default, field.skip)
+                 for field in fields)
+
+
+def fill_row(out, row, plan):
+    """Set fields (field_plan) of one reply row in out"""
+    for key, src, transform, default, skip in plan:
+        if src.__class__ is tuple:
+            values = [row.get(name, _MISSING) for name in src]
+            if all(value is not _MISSING and value not in skip for value in values):
+                out[key] = transform(*values) if transform else values[0]
+                continue
+        else:
+            value = row.get(src, _MISSING)
+            if value is not _MISSING and not (skip and value in skip):
+                out[key] = transform(value) if transform else value
+                continue
+        if default is not _MISSING:
+            out[key] = default
+
+
+class TableSpec:
+    """Declarative table extractor. Yields one output dict per innermost row,
+    with fields of all outer levels included. Rows whose required output
+    keys are missing, None or empty are dropped."""
+
+    def __init__(self, levels, required=()):
+        self.levels = tuple(levels)
+        self.required = tuple(required)
+        self.plans = tuple(field_plan(level.fields) for level in self.levels)
+
+    def complete(self, out):
+        """All required keys are set"""
+        for key in self.required:
+            if out.get(key) in _EMPTY:
+                return False
+        return True
+
+    def rows(self, data, release=False):
+        """Yield extracted rows. release drops each ROW_x from data once its
+        output rows are out, so the decoded reply shrinks while the rows grow"""
+        level = self.levels[-1]
+        plan = self.plans[-1]
+        required = self.required
+        # Innermost level (most of the rows) is walked here, outer levels
+        # by parents
+        for data, parent in self.parents(data, len(self.levels) - 1, release):
+            # table_rows fast path: a list of rows
+            rows = data.get(level.table) if data.__class__ is dict else None
+            rows = rows.get(level.row) if rows.__class__ is dict else None
+            if rows.__class__ is not list:
+                rows = table_rows(data, level.table, level.row)
+            found = False
+            for index, row in enumerate(rows):
+                if release:
+                    rows[index] = None
+                if row.__class__ is not dict:
+                    continue
+                found = True
+                out = {} if parent is None else parent.copy()
+                # fill_row inlined, it runs once per output row
+                for key, src, transform, default, skip in plan:
+                    if src.__class__ is tuple:
+                        values = [row.get(name, _MISSING) for name in src]
+                        if all(value is not _MISSING and value not in skip for value in values):
+                            out[key] = transform(*values) if transform else values[0]
+                            continue
+                    else:
+                        value = row.get(src, _MISSING)
+                        if value is not _MISSING and not (skip and value in skip):
+                            out[key] = transform(value) if transform else value
+                            continue
+                    if default is not _MISSING:
+                        out[key] = default
+                for key in required:
+                    if out.get(key) in _EMPTY:
+                        break
+                else:
+                    yield out
+            if level.outer and not found and parent is not None and self.complete(parent):
+                yield parent
+
+    def stream(self, rows, batch=1000):
+        """Yield extracted rows of an iterable of innermost ROW_x (a reply
+        decoded a row at a time, see reply_rows) of a single level spec.
+        rows() walks them a batch at a time"""
+        level = self.levels[-1]
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, batch))
+            if not chunk:
+                return
+            yield from self.rows({level.table: {level.row: chunk}}, release=True)
+
+    def parents(self, data, depth, release):
+        """(row, output of its and outer levels) of rows of level depth - 1"""
+        if depth == 0:
+            yield data, None
+            return
+        level = self.levels[depth - 1]
+        plan = self.plans[depth - 1]
+        for data, parent in self.parents(data, depth - 1, release):
+            rows = table_rows(data, level.table, level.row)
+            for index, row in enumerate(rows):
+                if release:
+                    rows[index] = None
+                if row.__class__ is not dict:
+                    continue
+                if parent is None:
+                    out = {}
+                elif plan:
+                    out = parent.copy()
+                else:
+                    # Nothing to add on this level, no need to copy parent
+                    out = parent
+                fill_row(out, row, plan)
+                yield row, out
+
+    def first(self, data):
+        """First extracted row or empty dict"""
+        for out in self.rows(data):
+            return out
+        return {}
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""LLDP adjacency graph of many switches, updated incrementally.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Node and port names are interned to ints; an edge is a tuple of 4 ints
+(node, port, node, port) with the end of smaller names first, so a link
+reported by both of its ends is one edge. Each host keeps the set of edges its LLDP
+facts (ansible_net_lldp) reported and a digest of those facts, so
+update_host of an unchanged host is a no-op and a changed host only
+touches its own edges. Serialized form (dump/load):
+    {"version": 1, "names": [...], "edges": [[n1, p1, n2, p2], ...],
+     "hosts": {host: [digest, [edge index, ...]]}, "macs": {mac: host}}
+Remote node of an LLDP neighbor is its system name, or the host owning the
+neighbor port MAC (ansible_net_info macs), or the MAC itself.
+"""
+import json
+import hashlib
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.macaddr import format_mac, parse_mac
+
+TOPOLOGY_VERSION = 1
+
+
+def remote_port(row):
+    """Neighbor port of LLDP fact row: (name, mac int or None).
+    remote_chassis_id holds the LLDP port id, split to 2 char groups when
+    it is not a MAC (Et:he:rn:et:1/:21)"""
+    portid = row.get("remote_chassis_id") or ""
+    mac = parse_mac(portid)
+    if mac is not None:
+        return format_mac(mac), mac
+    portid = portid.replace(":", "")
+    if portid.startswith("Eth") and not portid.startswith("Ethernet"):
+        portid = "Ethernet" + portid[3:]
+    return portid or None, None
+
+
+def short_name(name):
+    """Host name without domain"""
+    return name.split(".", 1)[0]
+
+
+class Topology:
+    """Adjacency graph, see module docstring"""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        # edge: set of reporting host ids
+        self.edges = {}
+        # host id: (digest, frozenset of edges)
+        self.hosts = {}
+        # mac int: host id
+        self.macs = {}
+
+    def intern(self, name):
+        """Id of name"""
+        nameid = self.ids.get(name)
+        if nameid is None:
+            nameid = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return nameid
+
+    def edge_names(self, edge):
+        """Edge tuple with names"""
+        return tuple(self.names[nameid] for nameid in edge)
+
+    def node(self, row, mac):
+        """Remote node id of LLDP fact row"""
+        sysname = row.get("remote_system_name")
+        if sysname:
+            return self.intern(short_name(sysname))
+        if mac is None:
+            return None
+        if mac in self.macs:
+            return self.macs[mac]
+        return self.intern(format_mac(mac))
+
+    def add_macs(self, host, macs):
+        """Register MACs owned by host"""
+        hostid = self.intern(short_name(host))
+        for mac in macs or []:
+            value = parse_mac(mac)
+            if value is not None:
+                self.macs[value] = hostid
+
+    def update_host(self, host, lldp, macs=None):
+        """Replace edges reported by host. Returns (added, removed) edges
+        (graph edges, not ones only reported again by the other end)"""
+        digest = hashlib.sha1(json.dumps([lldp, macs or []], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        hostid = self.intern(short_name(host))
+        olddigest, oldedges = self.hosts.get(hostid, (None, frozenset()))
+        if digest == olddigest:
+            return set(), set()
+        self.add_macs(host, macs)
+        newedges = set()
+        for localport, row in (lldp or {}).items():
+            portname, mac = remote_port(row)
+            nodeid = self.node(row, mac)
+            if nodeid is None or portname is None:
+                continue
+            ends = sorted(((hostid, self.intern(localport)), (nodeid, self.intern(portname))), key=self.edge_names)
+            newedges.add(ends[0] + ends[1])
+        added, removed = set(), set()
+        for edge in oldedges - newedges:
+            reporters = self.edges[edge]
+            reporters.discard(hostid)
+            if not reporters:
+                del self.edges[edge]
+                removed.add(edge)
+        for edge in newedges - oldedges:
+            if edge not in self.edges:
+                self.edges[edge] = set()
+                added.add(edge)
+            self.edges[edge].add(hostid)
+        self.hosts[hostid] = (digest, frozenset(newedges))
+        return added, removed
+
+    def remove_host(self, host):
+        """Drop edges reported by host"""
+        hostid = self.ids.get(short_name(host))
+        if hostid is None or hostid not in self.hosts:
+            return set()
+        removed = set()
+        for edge in self.hosts.pop(hostid)[1]:
+            self.edges[edge].discard(hostid)
+            if not self.edges[edge]:
+                del self.edges[edge]
+                removed.add(edge)
+        return removed
+
+    def dump(self):
+        """Serialized form; names not used anymore are dropped"""
+        names, ids = [], {}
+
+        def remap(nameid):
+            if nameid not in ids:
+                ids[nameid] = len(names)
+                names.append(self.names[nameid])
+            return ids[nameid]
+
+        edges = sorted(self.edges, key=self.edge_names)
+        index = {edge: idx for idx, edge in enumerate(edges)}
+        out = {"version": TOPOLOGY_VERSION, "names": names,
+               "edges": [[remap(nameid) for nameid in edge] for edge in edges]}
+        out["hosts"] = {self.names[hostid]: [digest, sorted(index[edge] for edge in hostedges)]
+                        for hostid, (digest, hostedges) in self.hosts.items()}
+        out["macs"] = {format_mac(mac): self.names[hostid] for mac, hostid in self.macs.items()}
+        return out
+
+    @classmethod
+    def load(cls, data):
+        """Topology of serialized form. Unknown versions start empty"""
+        topo = cls()
+        if not isinstance(data, dict) or data.get("version") != TOPOLOGY_VERSION:
+            return topo
+        edges = [tuple(topo.intern(data["names"][nameid]) for nameid in edge) for edge in data["edges"]]
+        for host, (digest, edgeidx) in data["hosts"].items():
+            hostid = topo.intern(host)
+            hostedges = frozenset(edges[idx] for idx in edgeidx)
+            topo.hosts[hostid] = (digest, hostedges)
+            for edge in hostedges:
+                topo.edges.setdefault(edge, set()).add(hostid)
+        for mac, host in data["macs"].items():
+            topo.macs[parse_mac(mac)] = topo.intern(host)
+        return topo
+
+    def neighbors(self, host):
+        """{local port: (remote node, remote port)} of host"""
+        hostid = self.ids.get(short_name(host))
+        out = {}
+        for edge in self.edges:
+            if edge[0] == hostid:
+                out[self.names[edge[1]]] = (self.names[edge[2]], self.names[edge[3]])
+            elif edge[2] == hostid:
+                out[self.names[edge[3]]] = (self.names[edge[0]], self.names[edge[1]])
+        return out
@@ -9,18 +9,31 @@ Email                   : juztas (at) gmail.com
 @Copyright              : General Public License v3.0+
 Date                    : 2023/11/05
 """
-import inspect
+import sys
 import time
+import types
 
-from ansible.utils.display import Display
+_DISPLAY = []
 
-display = Display()
+
+def get_display():
+    """Controller Display, or None inside modules.
+    ansible.utils.display (and ansible.constants behind it) is a large
+    controller import; it is only used if the process already loaded it
+    (action/cliconf/terminal plugins), never imported by modules."""
+    if not _DISPLAY:
+        module = sys.modules.get("ansible.utils.display")
+        if module is None:
+            return None
+        _DISPLAY.append(module.Display())
+    return _DISPLAY[0]
 
 
 def functionwrapper(func):
     """Function wrapper to print start/runtime/end"""
     def wrapper(*args, **kwargs):
-        if display.verbosity > 5:
+        display = get_display()
+        if display is not None and display.verbosity > 5:
             display.vvvvvv(
                 f"[WRAPPER][{time.time()}] Enter {func.__qualname__}, {func.__code__.co_filename}"
             )
@@ -41,14 +54,9 @@ def functionwrapper(func):
 
 def classwrapper(cls):
     """Class wrapper to print all functions start/runtime/end"""
-    for name, method in cls.__dict__.items():
-        if callable(method) and name != "__init__":
-            if inspect.isfunction(method):
-                if inspect.signature(method).parameters.get('self'):
-                    setattr(cls, name, functionwrapper(method))
-            elif inspect.ismethod(method):
-                if inspect.signature(method).parameters:
-                    firstParam = next(iter(inspect.signature(method).parameters))
-                    if firstParam == 'self':
-                        setattr(cls, name, functionwrapper(method))
+    for name, method in list(cls.__dict__.items()):
+        if name != "__init__" and isinstance(method, types.FunctionType):
+            code = method.__code__
+            if "self" in code.co_varnames[:code.co_argcount + code.co_kwonlyargcount]:
+                setattr(cls, name, functionwrapper(method))
     return cls
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Small per-host state persisted between module runs.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Network modules run on the controller, so state is kept in local files:
+    <state_dir>/<state_key>-<name>.json
+state_dir defaults to <tmpdir>/cisconx9_state. state_key defaults to the
+persistent connection socket name, which is unique and stable per
+host/port/user.
+"""
+import os
+import re
+import json
+import tempfile
+
+STATE_DIR = os.path.join(tempfile.gettempdir(), "cisconx9_state")
+
+state_argument_spec = {
+    "state_dir": {"type": "path"},
+    "state_key": {"type": "str"},
+}
+
+
+def state_key(module):
+    """Return file-safe key which identifies device"""
+    key = module.params.get("state_key")
+    if not key:
+        socket_path = getattr(module, "_socket_path", None)
+        key = os.path.basename(socket_path) if socket_path else "default"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", key)
+
+
+class StateStore:
+    """JSON state file of one kind (name) for one device"""
+
+    def __init__(self, module, name):
+        statedir = module.params.get("state_dir") or STATE_DIR
+        self.path = os.path.join(statedir, f"{state_key(module)}-{name}.json")
+
+    def load(self):
+        """Load state. Missing or broken state is returned as empty dict"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def save(self, data):
+        """Save state atomically (write temp file and rename)"""
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        fd, tmppath = tempfile.mkstemp(prefix=".state_", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fobj:
+                json.dump(data, fobj, separators=(",", ":"))
+            os.replace(tmppath, self.path)
+        except BaseException:
+            os.unlink(tmppath)
+            raise
+
+    def remove(self):
+        """Remove state file"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
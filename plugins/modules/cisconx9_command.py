@@ -17,15 +17,10 @@ __metaclass__ = type
 import time
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.six import string_types
-from ansible.utils.display import Display
-from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import run_commands
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import perf_report, run_commands, to_commands
 from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import cisconx9_argument_spec, check_args
-from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.utils import ComplexList
-from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.parsing import Conditional
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import functionwrapper
 
-display = Display()
-
 @functionwrapper
 def toLines(stdout):
     """stdout to list lines, split by \n character"""
@@ -37,16 +32,15 @@ def toLines(stdout):
 @functionwrapper
 def parse_commands(module, _warnings):
     """Parse commands"""
-    command = ComplexList({'command': {'key': True}, 'prompt': {}, 'answer': {}}, module)
     if module.params.get("src", ""):
         # Load src file
         with open(module.params["src"], encoding="utf-8") as fd:
             cmds = fd.readlines()
             # if cmd starts with comment, ignore:
             cmds = [cmd for cmd in cmds if not cmd.startswith("#")]
-            commands = command(cmds)
+            commands = to_commands(module, cmds)
     elif module.params["commands"]:
-        commands = command(module.params["commands"])
+        commands = to_commands(module, module.params["commands"])
 
     for _index, item in enumerate(commands):
         if item['command'].startswith('conf'):
@@ -63,7 +57,12 @@ def main():
         'wait_for': {'type': 'list', 'elements': 'str'},
         'match': {'default': 'all', 'choices': ['all', 'any']},
         'retries': {'default': 10, 'type': 'int'},
-        'interval': {'default': 1, 'type': 'int'}}
+        'interval': {'default': 1, 'type': 'int'},
+        # Parallel CLI sessions, the action plugin opens them (sessions)
+        'session_count': {'default': 1, 'type': 'int'},
+        'sessions': {'type': 'list', 'elements': 'path'},
+        'perf': {'default': False, 'type': 'bool'},
+        'perf_slow_command': {'default': 0, 'type': 'float'}}
 
     argument_spec.update(cisconx9_argument_spec)
 
@@ -81,14 +80,20 @@ def main():
     result['warnings'] = warnings
 
     wait_for = module.params['wait_for'] or []
-    conditionals = [Conditional(c) for c in wait_for]
+    conditionals = []
+    if wait_for:
+        # netcommon parsing imports netcommon utils (jinja2, yaml)
+        from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.parsing import Conditional  # pylint: disable=import-outside-toplevel
+        conditionals = [Conditional(c) for c in wait_for]
 
     retries = module.params['retries']
     interval = module.params['interval']
     match = module.params['match']
     responses = None
+    # Every wait_for retry runs the commands again (perf calls)
+    stats = []
     while retries > 0:
-        responses = run_commands(module, commands)
+        responses = run_commands(module, commands, sessions=module.params['sessions'], stats=stats)
 
         for item in conditionals:
             if item(responses):
@@ -113,6 +118,10 @@ def main():
         'stdout': responses,
         'stdout_lines': list(toLines(responses))
     })
+    if module.params['perf'] or module.params['perf_slow_command']:
+        perf = perf_report(module, stats, module.params['perf_slow_command'])
+        if module.params['perf']:
+            result['perf'] = perf
 
     module.exit_json(**result)
 
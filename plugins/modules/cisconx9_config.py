@@ -14,15 +14,20 @@ ANSIBLE_METADATA = {'metadata_version': '1.1',
 DOCUMENTATION = ""
 EXAMPLES = ""
 RETURN = ""
+import json
+import hashlib
+
 from ansible.module_utils.basic import AnsibleModule
-from ansible.utils.display import Display
-from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import get_config
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import get_cached_config, get_config
 from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import cisconx9_argument_spec, check_args
-from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import load_config, run_commands
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import load_config, perf_report, run_commands
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.configrange import optimize_commands
 from ansible_collections.ansible.netcommon.plugins.module_utils.network.common.config import NetworkConfig, dumps
+from ansible_collections.sense.cisconx9.plugins.module_utils.statestore import StateStore, state_argument_spec
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import functionwrapper
 
-display = Display()
+# Applied candidates remembered per device (all valid for one marker only)
+MAX_APPLIED_BLOCKS = 256
 
 @functionwrapper
 def get_candidate(module):
@@ -45,10 +50,39 @@ def get_candidate(module):
 def get_running_config(module):
     contents = module.params['config']
     if not contents:
-        contents = get_config(module)
+        contents = get_cached_config(module) if module.params['config_cache'] else get_config(module)
     return contents
 
 
+@functionwrapper
+def candidate_hash(module, candidate):
+    """Hash of everything which decides what a run pushes"""
+    keys = ('parents', 'before', 'after', 'match', 'replace')
+    data = json.dumps([str(candidate)] + [module.params[key] for key in keys], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+@functionwrapper
+def get_marker(module):
+    """Device side config change marker (idempotence_marker output).
+    Returns None if it can not be read"""
+    out = run_commands(module, [module.params['idempotence_marker']], check_rc=False)[0]
+    if not isinstance(out, str) or not out.strip() or out.lstrip().startswith('%'):
+        return None
+    return out.strip()
+
+
+@functionwrapper
+def record_applied(store, marker, blockhash, keep):
+    """Remember blockhash as applied at marker. Previous blocks are kept
+    only if keep is set (nothing was pushed since they were recorded)"""
+    state = store.load()
+    blocks = state.get('blocks', []) if keep and state.get('marker') == marker else []
+    if blockhash not in blocks:
+        blocks.append(blockhash)
+    store.save({'marker': marker, 'blocks': blocks[-MAX_APPLIED_BLOCKS:]})
+
+
 @functionwrapper
 def main():
     backup_spec = dict(
@@ -72,9 +106,17 @@ def main():
         save=dict(type='bool', default=False),
         config=dict(),
         backup=dict(type='bool', default=False),
-        backup_options=dict(type='dict', options=backup_spec)
+        backup_options=dict(type='dict', options=backup_spec),
+        idempotence=dict(type='bool', default=False),
+        idempotence_marker=dict(default='show accounting log last-index'),
+        config_cache=dict(type='bool', default=False),
+        # Merge vlan/interface blocks to ranges, fold trunk allowed vlan lines
+        optimize=dict(type='bool', default=False),
+        perf=dict(type='bool', default=False),
+        perf_slow_command=dict(type='float', default=0)
     )
 
+    argument_spec.update(state_argument_spec)
     argument_spec.update(cisconx9_argument_spec)
 
     mutually_exclusive = [('lines', 'src'),
@@ -92,15 +134,30 @@ def main():
     check_args(module, warnings)
 
     result = dict(changed=False, saved=False, warnings=warnings)
+    # Timings of config push and save (perf)
+    stats = []
 
     candidate = get_candidate(module)
 
     if module.params['backup']:
         if not module.check_mode:
-            result['__backup__'] = get_config(module)
+            result['__backup__'] = get_cached_config(module) if module.params['config_cache'] else get_config(module)
     commands = list()
 
-    if any((module.params['lines'], module.params['src'])):
+    # Idempotence fast path: candidate already applied (or verified) while
+    # the device config change marker stayed the same - no config download
+    store = marker = blockhash = None
+    applied = False
+    if (module.params['idempotence'] and any((module.params['lines'], module.params['src']))
+            and match != 'none' and not module.params['backup']):
+        store = StateStore(module, 'config')
+        blockhash = candidate_hash(module, candidate)
+        marker = get_marker(module)
+        state = store.load()
+        applied = marker is not None and state.get('marker') == marker and blockhash in state.get('blocks', [])
+        result['idempotence_hit'] = applied
+
+    if not applied and any((module.params['lines'], module.params['src'])):
         if match != 'none':
             config = get_running_config(module)
             config = NetworkConfig(contents=config, indent=1)
@@ -118,6 +175,8 @@ def main():
                        'prompt': module.params['lines'][0]['prompt'],
                        'answer': module.params['lines'][0]['answer']}
                 commands = [module.jsonify(cmd)]
+            elif module.params['optimize']:
+                commands, result['optimizer'] = optimize_commands([(tuple(obj.parents), obj.text) for obj in configobjs])
             else:
                 commands = commands.split('\n')
 
@@ -128,24 +187,35 @@ def main():
                 commands.extend(module.params['after'])
 
             if not module.check_mode and module.params['update'] == 'merge':
-                load_config(module, commands)
+                load_config(module, commands, stats)
+                if store is not None:
+                    newmarker = get_marker(module)
+                    if newmarker is not None:
+                        record_applied(store, newmarker, blockhash, keep=False)
 
             result['changed'] = True
             result['commands'] = commands
             result['updates'] = commands
+        elif store is not None and marker is not None:
+            # Nothing to push: device has the candidate at this marker
+            record_applied(store, marker, blockhash, keep=True)
 
     if module.params['save']:
         result['changed'] = True
         if not module.check_mode:
             cmd = {'command': 'copy running-config startup-config',
                    'prompt': r'\[confirm yes/no\]:\s?$', 'answer': 'yes'}
-            run_commands(module, [cmd])
+            run_commands(module, [cmd], stats=stats)
             result['saved'] = True
         else:
             module.warn('Skipping command `copy running-config startup-config`'
                         'due to check_mode.  Configuration not copied to '
                         'non-volatile storage')
 
+    if module.params['perf'] or module.params['perf_slow_command']:
+        perf = perf_report(module, stats, module.params['perf_slow_command'])
+        if module.params['perf']:
+            result['perf'] = perf
     module.exit_json(**result)
 
 
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cisco NX9 config deployment to many devices
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Runs in the action plugin (see module_utils/network/deploy.py): one task
+pushes lines to every target host over its persistent connection, hosts of
+one wave concurrently. Only lines missing from the running config of a
+host are sent. In check mode nothing is sent, the planned lines are
+returned. Run it once (run_once or a localhost play):
+
+    - sense.cisconx9.cisconx9_deploy:
+        targets:
+          - {host: sw1, lines: ["vlan 10", "  name data"]}
+          - {host: sw2, lines: ["vlan 10"], wave: 1}
+        max_workers: 8
+        save: true
+      run_once: true
+"""
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+def deploy_argument_spec():
+    """Argument spec of the action plugin"""
+    return {
+        'targets': {'type': 'list', 'elements': 'dict', 'required': True, 'options': {
+            # Inventory host, its connection vars are used
+            'host': {'type': 'str', 'required': True},
+            # Config lines, children indented as in the running config
+            'lines': {'type': 'list', 'elements': 'str', 'required': True, 'aliases': ['commands']},
+            # Waves are pushed in ascending order
+            'wave': {'type': 'int', 'default': 0}}},
+        'max_workers': {'type': 'int', 'default': 8},
+        'save': {'type': 'bool', 'default': False},
+        'abort_on_failure': {'type': 'bool', 'default': True},
+        # Only lines missing from the running config are sent (none: all)
+        'match': {'default': 'line', 'choices': ['line', 'strict', 'exact', 'none']},
+    }
+
+
+def main():
+    """main entry point for module execution"""
+    module = AnsibleModule(argument_spec=deploy_argument_spec())
+    module.fail_json(msg='cisconx9_deploy runs in its action plugin, call it as sense.cisconx9.cisconx9_deploy')
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,28 @@
 # Copyright: Contributors to the Ansible project
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 import os
+import sys
 import json
+import time
+import hashlib
 import tempfile
 import traceback
+from contextlib import nullcontext
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.six import iteritems
-from ansible.utils.display import Display
-from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import (check_args, cisconx9_argument_spec, run_commands)
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import (SPOOL_THRESHOLD, Deadline, DeadlineExceeded, SpooledReply, check_args,
+                                                                                        cisconx9_argument_spec, config_fingerprint, decode_replies, get_cached_config,
+                                                                                        perf_report, reply_rows, run_commands)
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.macaddr import format_mac, normalize_mac, parse_mac
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.configpack import pack_config
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.counters import COUNTER_FIELDS, COUNTER_NAMES, compute_rates, make_sample
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.records import InterfaceRecord, intern_name, port_key
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.routes import aggregate_routes, build_route_index, route_commands
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.tableextract import Field, Level, TableSpec
+from ansible_collections.sense.cisconx9.plugins.module_utils.statestore import StateStore, state_argument_spec, state_key
 from ansible_collections.sense.cisconx9.plugins.module_utils.runwrapper import classwrapper, functionwrapper
 
-display = Display()
-
 @functionwrapper
 def dumpFactsToTmp(ansible_facts):
     """
@@ -65,20 +75,209 @@ def findvlanranges(vlanstr):
     return out
 
 
+# Split mac address (by .) into separated format and rejoin to :.
+macSplitter = normalize_mac
+
+
+def eth_to_ethernet(intf):
+    """Expand short Eth interface name (LLDP) to Ethernet"""
+    if intf.startswith("Ethernet"):
+        return intf
+    return intf.replace("Eth", "Ethernet")
+
+
+def kbps_to_mbps(bandwidth):
+    """Device reports bandwidth in Kbit"""
+    return int(bandwidth) // 1000
+
+
+def ip_with_mask(address, masklen):
+    """IP address and mask length to output format"""
+    return {"address": address, "masklen": masklen}
+
+
+def ip_prefix(prefix):
+    """IP prefix (addr/len) to output format"""
+    addrspl = prefix.split("/")
+    return {"address": addrspl[0], "masklen": addrspl[1]}
+
+
+def safe_int(value):
+    """Counter value to int (0 if device returned garbage)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def safe_float(value):
+    """Optics reading to float (None if not available, e.g. N/A)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Declarative field mappings of all table replies,
+# see module_utils/network/tableextract.py
+VERSION_TABLE = TableSpec([Level(None, None, [
+    Field("hwid", "chassis_id", skip=("", None)),
+    Field("hostname", "host_name", skip=("", None)),
+    Field("version", "rr_sys_ver", skip=("", None)),
+])])
+
+INTERFACE_TABLE = TableSpec([Level("TABLE_interface", "ROW_interface", [
+    Field("interface", "interface", intern_name, skip=("", None)),
+    Field("operstatus", "state"),
+    Field("operstatus", "svi_line_proto"),
+    Field("mac", "eth_hw_addr", macSplitter),
+    Field("mac", "svi_mac", macSplitter),
+    Field("duplex", "eth_duplex"),
+    Field("description", "desc"),
+    Field("ipv4", ("eth_ip_addr", "eth_ip_mask"), ip_with_mask),
+    Field("ipv4", ("svi_ip_addr", "svi_ip_mask"), ip_with_mask),
+    Field("bandwidth", "eth_bw", kbps_to_mbps),
+    Field("bandwidth", "svi_bw", kbps_to_mbps),
+    Field("mtu", "eth_mtu"),
+    Field("mtu", "svi_mtu"),
+    Field("eth_mode", "eth_mode"),
+])], required=("interface",))
+
+VLAN_TABLE = TableSpec([Level("TABLE_vlanbrief", "ROW_vlanbrief", [
+    Field("interface", "vlanshowbr-vlanid", lambda vlanid: intern_name(f"Vlan{vlanid}")),
+    Field("description", "vlanshowbr-vlanname"),
+    Field("operstatus", "vlanshowbr-vlanstate"),
+    Field("tagged", "vlanshowplist-ifidx", lambda ports: [intern_name(port) for port in ports.split(",")]),
+])], required=("interface",))
+
+# Interfaces without addresses give one row without ipv6
+IPV6_TABLE = TableSpec([
+    Level("TABLE_intf", "ROW_intf", [Field("interface", "intf-name", intern_name, skip=("", None))]),
+    Level("TABLE_addr", "ROW_addr", [Field("ipv6", "addr", ip_prefix, skip=("", None))], outer=True),
+], required=("interface",))
+
+LLDP_TABLE = TableSpec([Level("TABLE_nbor_detail", "ROW_nbor_detail", [
+    Field("local_port_id", "l_port_id", lambda port: intern_name(eth_to_ethernet(port)), skip=("", None)),
+    Field("remote_chassis_id", "port_id", macSplitter),
+    Field("remote_port_id", "port_desc", skip=("null",)),
+    Field("remote_system_name", "sys_name", intern_name, skip=("null",)),
+])], required=("local_port_id",))
+
+SWITCHPORT_TABLE = TableSpec([Level("TABLE_interface", "ROW_interface", [
+    Field("interface", "interface", intern_name),
+    Field("trunk_vlans", "trunk_vlans", default="none"),
+])])
+
+# Counters not reported are 0
+COUNTERS_TABLE = TableSpec([Level("TABLE_interface", "ROW_interface", [
+    Field("interface", "interface"),
+] + [Field(name, key, safe_int, default=0) for name, key in COUNTER_FIELDS])], required=("interface",))
+
+OPTICS_TABLE = TableSpec([
+    Level("TABLE_interface", "ROW_interface", [Field("interface", "interface")]),
+    Level("TABLE_lane", "ROW_lane", [
+        Field("lane", "lane_number", safe_int),
+        Field("temperature", "temperature", safe_float),
+        Field("voltage", "voltage", safe_float),
+        Field("current", "current", safe_float),
+        Field("tx_pwr", "tx_pwr", safe_float),
+        Field("rx_pwr", "rx_pwr", safe_float),
+    ]),
+], required=("interface",))
+
+# MACs as ints, entries without port or valid MAC are left out
+MAC_TABLE = TableSpec([Level("TABLE_mac_address", "ROW_mac_address", [
+    Field("mac", "disp_mac_addr", parse_mac),
+    Field("vlan", "disp_vlan", default="0"),
+    Field("port", "disp_port"),
+])], required=("port", "mac"))
+
+ROUTE_TABLE = TableSpec([
+    Level("TABLE_vrf", "ROW_vrf", [Field("vrf", "vrf-name-out", intern_name)]),
+    Level("TABLE_addrf", "ROW_addrf"),
+    Level("TABLE_prefix", "ROW_prefix", [Field("to", "ipprefix")]),
+    # Many routes share few next hops
+    Level("TABLE_path", "ROW_path", [Field("from", "ipnexthop", intern_name, skip=("", None))]),
+], required=("from",))
+
+
 @classwrapper
 class FactsBase:
     """Base class for Facts"""
 
     COMMANDS = []
+    # Reply fields converted to native types while decoding (key: type)
+    SCHEMA = {}
+    # parse() is CPU bound and uses only replies and module params/warn/debug,
+    # so it can run in a worker process (see parse_subsets)
+    PARALLEL = False
+    # schedule: facts younger than this (seconds) are taken from the state
+    # store instead of the device (0 - always gathered)
+    MAX_AGE = 0
+    # Module params shaping the facts of the subset: facts saved with other
+    # values are not used (schedule, deadline_fallback stale)
+    PARAMS = ()
 
     def __init__(self, module):
         self.module = module
         self.facts = {}
+        self.replies = None
         self.responses = None
+        # Size/timing/decode time of commands (see perf_report)
+        self.stats = []
+        # {"status": ok/timeout/stale, "elapsed": s} (see fetch_subsets)
+        self.status = None
+
+    def fetch(self, deadline=None):
+        """Run commands, keep replies undecoded (big ones spooled to files)"""
+        self.replies = run_commands(self.module, self.COMMANDS, check_rc=False, raw=True,
+                                    spool=self.module.params.get("spool_threshold"), stats=self.stats, deadline=deadline)
+
+    def parse(self):
+        """Decode replies to self.responses (subclasses extract facts)"""
+        responses = decode_replies(self.module, self.COMMANDS, self.replies, self.SCHEMA, self.stats)
+        # Undecodable replies are already reported by decode_replies
+        self.responses = [resp if isinstance(resp, dict) else {} for resp in responses]
+        self.replies = None
+
+    def decode(self, index):
+        """Decode only reply index to self.responses[index] and release the
+        reply. Subsets with big replies decode and parse one at a time, so
+        one decoded reply is in memory with the facts (see Interfaces.parse)"""
+        if self.responses is None:
+            self.responses = [None] * len(self.COMMANDS)
+            self.replies = list(self.replies)
+        reply, self.replies[index] = self.replies[index], None
+        resp = decode_replies(self.module, self.COMMANDS[index:index + 1], [reply], self.SCHEMA, self.stats)[0]
+        self.responses[index] = resp if isinstance(resp, dict) else {}
 
     def populate(self):
-        """Populate responses"""
-        self.responses = run_commands(self.module, self.COMMANDS, check_rc=False)
+        """Fetch and parse"""
+        self.fetch()
+        self.parse()
+
+    def params_digest(self):
+        """Digest of PARAMS values"""
+        values = json.dumps({name: self.module.params.get(name) for name in self.PARAMS}, sort_keys=True)
+        return hashlib.sha1(values.encode("utf-8")).hexdigest()[:16]
+
+    def saved_facts(self, name):
+        """State saved by save_facts if it was gathered with the same PARAMS"""
+        state = StateStore(self.module, f"facts-{name}").load()
+        if "facts" in state and state.get("params") == self.params_digest():
+            return state
+        return {}
+
+    def reply_bytes(self):
+        """Size of fetched replies"""
+        return sum(len(reply) for reply in self.replies or [])
+
+    def close_replies(self):
+        """Close spooled replies. decode closes the ones it reads, replies
+        parsed by a worker process are never decoded here"""
+        for reply in self.replies or []:
+            if isinstance(reply, SpooledReply):
+                reply.close()
 
     def run(self, cmd):
         """Run commands"""
@@ -92,17 +291,22 @@ class Default(FactsBase):
     COMMANDS = [
         "show version | json",
     ]
+    MAX_AGE = 3600
 
-    def populate(self):
-        super(Default, self).populate()
-        data = self.responses[0]
-        for key, outkey in {
-            "chassis_id": "hwid",
-            "host_name": "hostname",
-            "rr_sys_ver": "version",
-        }.items():
-            if key in data and data[key]:
-                self.facts[outkey] = data[key]
+    def parse(self):
+        super(Default, self).parse()
+        self.facts.update(VERSION_TABLE.first(self.responses[0]))
+
+
+@classwrapper
+class Fingerprint(FactsBase):
+    """Running config fingerprint (changes whenever config changes)"""
+
+    def fetch(self, deadline=None):
+        self.facts["config_fingerprint"] = config_fingerprint(self.module, deadline=deadline)
+
+    def parse(self):
+        pass
 
 
 @classwrapper
@@ -112,10 +316,24 @@ class Config(FactsBase):
     COMMANDS = [
         "show running-config | json",
     ]
+    MAX_AGE = 3600
+    PARAMS = ("config_format",)
 
-    def populate(self):
-        super(Config, self).populate()
-        self.facts["config"] = self.responses[0]
+    def fetch(self, deadline=None):
+        """With config_cache, download config only if its fingerprint changed"""
+        if self.module.params.get("config_cache"):
+            self.replies = [get_cached_config(self.module, ["| json"], deadline=deadline)]
+        else:
+            super(Config, self).fetch(deadline)
+
+    def parse(self):
+        super(Config, self).parse()
+        # dedup/compressed: restore with configpack.unpack_config or cisconx9_config_unpack filter
+        configformat = self.module.params.get("config_format", "json")
+        if configformat == "json" or not self.responses[0]:
+            self.facts["config"] = self.responses[0]
+        else:
+            self.facts["config"] = pack_config(self.responses[0], compress=configformat == "compressed")
 
 
 @classwrapper
@@ -123,165 +341,106 @@ class Interfaces(FactsBase):
     """All Interfaces Class"""
 
     COMMANDS = ["show interface | json", "show vlan | json", "show ipv6 interface vrf all | json", "show lldp neighbors detail | json", "show interface switchport | json"]
+    MAX_AGE = 60
+    SCHEMA = {"eth_bw": int, "svi_bw": int}
+    PARALLEL = True
 
-    @staticmethod
-    def macSplitter(inputmac):
-        """Split mac address (by .) into separated format and rejoin to :."""
-        macaddr = inputmac.strip().replace(".", "")
-        split_mac = [macaddr[index : index + 2] for index in range(0, len(macaddr), 2)]
-        return ":".join(split_mac)
-
-    @staticmethod
-    def _validate(indata, keys):
-        """Validate response and preset default values"""
-        if not isinstance(indata, dict):
-            display.vvv(f"Data is not a dictionary: {indata}. Rewrite as dict")
-            indata = {}
-        tmpval = indata
-        for key, keytype, default in keys:
-            if key not in tmpval:
-                display.vvv(f"Key not found: {key} in {indata}")
-                tmpval[key] = default
-            if not isinstance(tmpval[key], keytype):
-                display.vvv(f"Key {key} is not of type {keytype} in {indata}")
-                tmpval[key] = default
-            tmpval = tmpval[key]
-        return indata
-
-    def populate_vlan(self, intdict, intout):
-        """Populate vlan output information"""
-        if "svi_line_proto" in intdict:
-            intout["operstatus"] = intdict["svi_line_proto"]
-        if "svi_bw" in intdict:
-            intout["bandwidth"] = int(int(intdict["svi_bw"]) / 1000)
-        if "svi_ip_addr" in intdict and "svi_ip_mask" in intdict:
-            intout.setdefault("ipv4", [])
-            intout["ipv4"].append({"address": intdict["svi_ip_addr"], "masklen": intdict["svi_ip_mask"]})
-        if "svi_mac" in intdict:
-            newmac = self.macSplitter(intdict["svi_mac"])
-            intout["mac"] = newmac
-            if newmac not in self.facts["info"]["macs"]:
-                self.facts["info"]["macs"].append(newmac)
-        if "svi_mtu" in intdict:
-            intout["mtu"] = intdict["svi_mtu"]
-
-    def populate_eth(self, intdict, intout):
-        """Populate eth output information"""
-        if "state" in intdict:
-            intout["operstatus"] = intdict["state"]
-        if "eth_hw_addr" in intdict:
-            newmac = self.macSplitter(intdict["eth_hw_addr"])
-            intout["mac"] = newmac
-            if newmac not in self.facts["info"]["macs"]:
-                self.facts["info"]["macs"].append(newmac)
-        if "eth_duplex" in intdict:
-            intout["duplex"] = intdict["eth_duplex"]
-        if "desc" in intdict:
-            intout["description"] = intdict["desc"]
-        if "eth_ip_addr" in intdict and "eth_ip_mask" in intdict:
-            intout.setdefault("ipv4", [])
-            intout["ipv4"].append({"address": intdict["eth_ip_addr"], "masklen": intdict["eth_ip_mask"]})
-        if "eth_bw" in intdict:
-            intout["bandwidth"] = int(int(intdict["eth_bw"]) / 1000)
-        if "eth_mtu" in intdict:
-            intout["mtu"] = intdict["eth_mtu"]
-        if "eth_mode" in intdict and intdict["eth_mode"] == "trunk":
-            intout["switchport"] = "yes"
-        else:
-            intout["switchport"] = "no"
+    macSplitter = staticmethod(macSplitter)
+
+    def __init__(self, module):
+        super(Interfaces, self).__init__(module)
+        # {name: InterfaceRecord} while parsing, facts at the end of parse
+        self.records = {}
+        self.macset = set()
+        # {port: bit} of tagged ports (see InterfaceRecord.add_tagged)
+        self.portbits = {}
+
+    def record(self, name):
+        """Record of interface, created if missing"""
+        rec = self.records.get(name)
+        if rec is None:
+            rec = self.records[name] = InterfaceRecord()
+        return rec
+
+    def addMac(self, newmac):
+        """Record mac address in info"""
+        if newmac not in self.macset:
+            self.macset.add(newmac)
+            self.facts["info"]["macs"].append(newmac)
+
+    def populate_interfaces(self):
+        """Populate interface (show interface) information"""
+        for row in INTERFACE_TABLE.rows(self.responses[0]):
+            intf = row.pop("interface")
+            intout = self.record(intf)
+            ipv4 = row.pop("ipv4", None)
+            if ipv4:
+                intout.append("ipv4", ipv4)
+            if "mac" in row:
+                self.addMac(row["mac"])
+            ethmode = row.pop("eth_mode", None)
+            if not intf.startswith("Vlan"):
+                intout.switchport = "yes" if ethmode == "trunk" else "no"
+            intout.update(row)
+
+    def populate_vlans(self):
+        """Populate vlan (show vlan) information"""
+        for row in VLAN_TABLE.rows(self.responses[1]):
+            vlanout = self.record(row["interface"])
+            for key in ["description", "operstatus"]:
+                if key in row:
+                    setattr(vlanout, key, row[key])
+            if "tagged" in row and vlanout.get("tagged") is None:
+                vlanout.tagged = row["tagged"]
+
+    def populate_ipv6(self):
+        """Populate IPv6 addresses (for IPv4 it is available from interfaces output)"""
+        for row in IPV6_TABLE.rows(self.responses[2]):
+            intout = self.record(row["interface"])
+            if "ipv6" in row:
+                intout.append("ipv6", row["ipv6"])
 
     def populate_lldp(self):
         """Populate lldp information"""
         lldpdict = self.facts.setdefault("lldp", {})
-        self.responses[3] = self._validate(self.responses[3], [["TABLE_nbor_detail", dict, {}], ["ROW_nbor_detail", list, []]])
-        for intdict in self.responses[3].get("TABLE_nbor_detail", {}).get("ROW_nbor_detail", []):
-            tmpdict = {}
-            if "l_port_id" in intdict:
-                tmpdict["local_port_id"] = intdict["l_port_id"].replace("Eth", "Ethernet")
-            if "port_id" in intdict:
-                newmac = self.macSplitter(intdict["port_id"])
-                tmpdict["remote_chassis_id"] = newmac
-            if "port_desc" in intdict and intdict["port_desc"] != "null":
-                tmpdict["remote_port_id"] = intdict["port_desc"]
-            if "sys_name" in intdict and intdict["sys_name"] != "null":
-                tmpdict["remote_system_name"] = intdict["sys_name"]
-            if tmpdict["local_port_id"]:
-                lldpdict[tmpdict["local_port_id"]] = tmpdict
+        for row in LLDP_TABLE.rows(self.responses[3]):
+            lldpdict[row["local_port_id"]] = row
 
     def recordSwitchPortVlans(self):
         """Record switchport vlans"""
-        for item in self.responses[4].get("TABLE_interface", {}).get("ROW_interface", []):
+        for item in SWITCHPORT_TABLE.rows(self.responses[4]):
             if "interface" not in item:
-                display.vvv(f"Interface key not found in {item}. Skipping")
+                self.module.warn(f"Interface key not found in {item}. Skipping")
                 continue
+            intout = self.records.get(item["interface"])
             # If not switchport, skip
-            if self.facts["interfaces"].get(item["interface"], {}).get("switchport", "no") != "yes":
-                display.vvv(f"Interface {item['interface']} is not switchport. Skipping")
+            if intout is None or intout.get("switchport", "no") != "yes":
+                self.module.debug(f"Interface {item['interface']} is not switchport. Skipping")
                 continue
             # If operstatus != up, skip
-            if self.facts["interfaces"].get(item["interface"], {}).get("operstatus", "down") != "up":
-                display.vvv(f"Interface {item['interface']} is not up. Skipping")
+            if intout.get("operstatus", "down") != "up":
+                self.module.debug(f"Interface {item['interface']} is not up. Skipping")
                 continue
-            vlanrange = findvlanranges(item.get("trunk_vlans", "none"))
-            for vlan in vlanrange:
-                vlanName = f"Vlan{vlan}"
-                if vlanName not in self.facts["interfaces"]:
-                    self.facts["interfaces"].setdefault(
-                        vlanName, {"bandwidth": None, "duplex": None, "lineprotocol": None, "macaddress": None, "description": None, "mtu": None, "operstatus": None, "channel-member": None}
-                    )
-                self.facts["interfaces"][vlanName].setdefault("tagged", [])
-                if item["interface"] not in self.facts["interfaces"][vlanName]["tagged"]:
-                    self.facts["interfaces"][vlanName]["tagged"].append(item["interface"])
-
-    def populate(self):
-        super(Interfaces, self).populate()
-
+            for vlan in findvlanranges(item["trunk_vlans"]):
+                vlanName = intern_name(f"Vlan{vlan}")
+                vlanout = self.records.get(vlanName)
+                if vlanout is None:
+                    vlanout = self.records[vlanName] = InterfaceRecord.placeholder()
+                vlanout.add_tagged(item["interface"], self.portbits)
+
+    def parse(self):
         self.facts.setdefault("interfaces", {})
         self.facts.setdefault("info", {"macs": []})
-        self.responses[0] = self._validate(self.responses[0], [["TABLE_interface", dict, {}], ["ROW_interface", list, []]])
-        for intdict in self.responses[0].get("TABLE_interface", {}).get("ROW_interface", []):
-            # interface name
-            if "interface" not in intdict:
-                continue
-            intout = self.facts["interfaces"].setdefault(intdict["interface"], {})
-            if intdict["interface"].startswith("Vlan"):
-                self.populate_vlan(intdict, intout)
-            else:
-                self.populate_eth(intdict, intout)
-
-        self.responses[1] = self._validate(self.responses[1], [["TABLE_vlanbrief", dict, {}], ["ROW_vlanbrief", list, []]])
-        for intdict in self.responses[1].get("TABLE_vlanbrief", {}).get("ROW_vlanbrief", []):
-            intf = f"Vlan{intdict['vlanshowbr-vlanid']}"
-            vlanout = self.facts["interfaces"].setdefault(intf, {})
-            vlanout["description"] = intdict["vlanshowbr-vlanname"]
-            if "vlanshowbr-vlanname" in intdict:
-                vlanout["description"] = intdict["vlanshowbr-vlanname"]
-            if "vlanshowbr-vlanstate" in intdict:
-                vlanout["operstatus"] = intdict["vlanshowbr-vlanstate"]
-            if "vlanshowplist-ifidx" in intdict:
-                vlanout.setdefault("tagged", intdict["vlanshowplist-ifidx"].split(","))
-        # IPv6s (for IPv4 it is available from interfaces output)
-        # show ipv6 interface vrf all | json,
-        self.responses[2] = self._validate(self.responses[2], [["TABLE_intf", dict, {}], ["ROW_intf", list, []]])
-        for intdict in self.responses[2].get("TABLE_intf", {}).get("ROW_intf", []):
-            intout = self.facts["interfaces"].setdefault(intdict["intf-name"], {})
-            tmpips = intdict.get("TABLE_addr", {}).get("ROW_addr", [])
-            if isinstance(tmpips, list):
-                for addr in intdict.get("TABLE_addr", {}).get("ROW_addr", []):
-                    ipv6spl = addr["addr"].split("/")
-                    intout.setdefault("ipv6", [])
-                    intout["ipv6"].append({"address": ipv6spl[0], "masklen": ipv6spl[1]})
-            else:
-                tmpipv6 = intdict.get("TABLE_addr", {}).get("ROW_addr", []).get("addr", None)
-                if tmpipv6:
-                    ipv6spl = tmpipv6.split("/")
-                    intout.setdefault("ipv6", [])
-                    intout["ipv6"].append({"address": ipv6spl[0], "masklen": ipv6spl[1]})
-        # Populate lldp information
-        self.populate_lldp()
-        # Populate switchport information and vlans
-        self.responses[4] = self._validate(self.responses[4], [["TABLE_interface", dict, {}], ["ROW_interface", list, []]])
-        self.recordSwitchPortVlans()
+        # interfaces, vlans, ipv6, lldp, switchport vlans: each reply is
+        # released once its rows are recorded
+        steps = (self.populate_interfaces, self.populate_vlans, self.populate_ipv6, self.populate_lldp, self.recordSwitchPortVlans)
+        for index, populate in enumerate(steps):
+            self.decode(index)
+            populate()
+            self.responses[index] = None
+        self.replies = self.responses = None
+        for name in sorted(self.records, key=port_key):
+            self.facts["interfaces"][name] = self.records.pop(name).to_dict()
 
 
 @classwrapper
@@ -289,37 +448,114 @@ class Routing(FactsBase):
     """Routing Information Class"""
 
     COMMANDS = ["show ip route vrf all | json", "show ipv6 route vrf all | json"]
+    PARALLEL = True
+    MAX_AGE = 900
+    PARAMS = ("routing_vrfs", "routing_prefixes", "routing_sources", "routing_aggregate", "routing_index")
+
+    def __init__(self, module):
+        super(Routing, self).__init__(module)
+        # routing_vrfs/prefixes/sources limit what the device has to dump
+        try:
+            commands = route_commands(module.params.get("routing_vrfs"), module.params.get("routing_prefixes"),
+                                      module.params.get("routing_sources"))
+        except ValueError as ex:
+            module.fail_json(msg=str(ex))
+        self.COMMANDS = [command for _, command in commands]
+        self.families = [f"ipv{family}" for family, _ in commands]
 
     def populate_ip46(self, respid, resptype):
         """Populate IP routing information"""
-        self.facts.setdefault(resptype, [])
-        for intdict in self.responses[respid].get("TABLE_vrf", {}).get("ROW_vrf", []):
-            for routeEntry in intdict.get("TABLE_addrf", {}).get("ROW_addrf").get("TABLE_prefix", {}).get("ROW_prefix", []):
-                if not isinstance(routeEntry, dict):
-                    continue
-                tmpdict = {"vrf": intdict["vrf-name-out"]}
-                if "ipprefix" in routeEntry:
-                    tmpdict["to"] = routeEntry["ipprefix"]
-                rfrom = routeEntry.get("TABLE_path", {}).get("ROW_path", {})
-                if isinstance(rfrom, list):
-                    for entry in rfrom:
-                        if entry.get("ipnexthop", None):
-                            tmpdict["from"] = entry.get("ipnexthop")
-                        self.facts[resptype].append(tmpdict)
-                elif rfrom.get("ipnexthop", None):
-                    tmpdict["from"] = rfrom.get("ipnexthop")
-                    self.facts[resptype].append(tmpdict)
+        self.facts.setdefault(resptype, []).extend(ROUTE_TABLE.rows(self.responses[respid], release=True))
+
+    def parse(self):
+        for respid, resptype in enumerate(self.families):
+            self.decode(respid)
+            try:
+                self.populate_ip46(respid, resptype)
+            except Exception:
+                pass
+            # Rows only reference interned vrf/next hop strings of the reply
+            self.responses[respid] = None
+        self.replies = self.responses = None
+        for resptype in ("ipv4", "ipv6"):
+            # Overlapping prefix/source filters return some routes twice
+            if self.families.count(resptype) > 1:
+                self.facts[resptype] = list({tuple(row.items()): row for row in self.facts.get(resptype, [])}.values())
+        if self.module.params.get("routing_index"):
+            # Before aggregation: a merged supernet would hide the more
+            # specific route of another next hop from longest prefix match
+            self.facts["route_index"] = build_route_index(self.facts.get("ipv4", []) + self.facts.get("ipv6", []))
+        if self.module.params.get("routing_aggregate"):
+            self.facts["route_aggregation"] = {}
+            for resptype in ("ipv4", "ipv6"):
+                if resptype in self.facts:
+                    self.facts[resptype], self.facts["route_aggregation"][resptype] = aggregate_routes(self.facts[resptype])
 
-    def populate(self):
-        super(Routing, self).populate()
-        try:
-            self.populate_ip46(0, "ipv4")
-        except Exception:
-            pass
-        try:
-            self.populate_ip46(1, "ipv6")
-        except Exception:
-            pass
+
+@classwrapper
+class Counters(FactsBase):
+    """Interface counters with rates since previous run and optics readings"""
+
+    COMMANDS = ["show interface counters detailed | json", "show interface transceiver details | json"]
+
+    def populate_counters(self, sampletime):
+        """Populate counters and rates (previous sample is kept in state file)"""
+        ports = {}
+        for row in COUNTERS_TABLE.rows(self.responses[0]):
+            ports[row["interface"]] = [row[name] for name in COUNTER_NAMES]
+        store = StateStore(self.module, "counters")
+        sample = make_sample(ports, mono=sampletime)
+        interval, rates = compute_rates(store.load(), sample)
+        store.save(sample)
+        counters = self.facts.setdefault("counters", {})
+        for port, values in ports.items():
+            counters[port] = dict(zip(COUNTER_NAMES, values))
+            counters[port].update(rates.get(port, {}))
+        self.facts["counters_interval"] = interval
+
+    def populate_optics(self):
+        """Populate per lane optics readings"""
+        optics = self.facts.setdefault("optics", {})
+        for lane in OPTICS_TABLE.rows(self.responses[1]):
+            optics.setdefault(lane.pop("interface"), []).append(lane)
+
+    def parse(self):
+        super(Counters, self).parse()
+        self.populate_counters(time.monotonic())
+        self.populate_optics()
+
+
+@classwrapper
+class MacTable(FactsBase):
+    """MAC address table. MACs are kept as ints while parsing and
+    formatted once per unique entry at the end."""
+
+    COMMANDS = ["show mac address-table | json"]
+    PARALLEL = True
+    MAX_AGE = 300
+    PARAMS = ("mac_table_limit",)
+
+    def parse(self):
+        limit = self.module.params.get("mac_table_limit") or 0
+        table = {}
+        count = 0
+        # Rows are decoded from the reply text a batch at a time, so the
+        # decoded reply is never in memory; the table stops at limit entries
+        rows = reply_rows(self.module, self.COMMANDS[0], self.replies[0], "ROW_mac_address", self.stats)
+        self.replies = None
+        for row in MAC_TABLE.stream(rows):
+            vlans = table.get(row["port"])
+            if vlans is not None and row["mac"] in vlans.get(row["vlan"], ()):
+                continue
+            if limit and count >= limit:
+                self.facts["mac_table_truncated"] = True
+                self.module.warn(f"mac_table: more than {limit} entries, only the first {limit} are returned (mac_table_limit)")
+                break
+            table.setdefault(sys.intern(row["port"]), {}).setdefault(row["vlan"], set()).add(row["mac"])
+            count += 1
+        rows.close()
+        self.facts["mac_table"] = {port: {vlan: [format_mac(mac) for mac in sorted(macs)] for vlan, macs in vlans.items()} for port, vlans in table.items()}
+        self.facts["mac_table_count"] = count
 
 
 FACT_SUBSETS = {
@@ -327,24 +563,274 @@ FACT_SUBSETS = {
     "interfaces": Interfaces,
     "routing": Routing,
     "config": Config,
+    "fingerprint": Fingerprint,
+    "counters": Counters,
+    "mac_table": MacTable,
 }
 
 VALID_SUBSETS = frozenset(FACT_SUBSETS.keys())
+# Gathered only if named in gather_subset (all and exclusions leave them out):
+# they cost extra device commands or keep state between runs
+OPT_IN_SUBSETS = frozenset(("fingerprint", "counters", "mac_table"))
+
+# parse_mode auto uses worker processes only if PARALLEL subsets fetched at
+# least this much output (fork + returning facts costs ~10-20 ms)
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+# Subsets being parsed by workers; forked workers inherit it, so replies
+# are not pickled to them (only facts are sent back)
+_PARSE_JOBS = []
+
+
+class DetachedModule:
+    """AnsibleModule stand-in for parse workers: params only, warnings and
+    debug messages are collected and replayed by the parent"""
+
+    def __init__(self, params):
+        self.params = params
+        self.messages = []
+
+    def warn(self, msg):
+        """Collect warning"""
+        self.messages.append(("warn", msg))
+
+    def debug(self, msg):
+        """Collect debug message"""
+        self.messages.append(("debug", msg))
+
+
+def parse_job(index):
+    """Worker: parse inherited _PARSE_JOBS[index], return (facts, messages, stats)"""
+    inst = _PARSE_JOBS[index]
+    inst.module = DetachedModule(inst.module.params)
+    inst.parse()
+    return inst.facts, inst.module.messages, inst.stats
+
+
+def tracked(budget, keys, phase):
+    """MemoryBudget.track of keys, or no-op without memory_budget"""
+    return budget.track(keys, phase) if budget is not None else nullcontext()
 
 
 @functionwrapper
-def main():
-    """main entry point for module execution"""
-    argument_spec = {"gather_subset": {"default": ["!config"], "type": "list"}}
+def fetch_subsets(module, instances, deadline=None, budget=None):
+    """Fetch subsets and set their status. With sessions, commands of all
+    subsets using the default fetch are run in one dispatch over all
+    sessions, so slow commands of one subset overlap with commands of the
+    others. Subsets not fetched before deadline get status timeout and no
+    replies. With budget, replies of the remaining subsets are spooled
+    once half of it is in use"""
+    batch = [inst for inst in instances if type(inst).fetch is FactsBase.fetch]
+    if not module.params.get("sessions") or len(batch) < 2:
+        batch = []
+    for inst in instances:
+        if inst in batch:
+            continue
+        start = time.monotonic()
+        try:
+            with tracked(budget, [inst], "fetch"):
+                inst.fetch(deadline)
+            inst.status = {"status": "ok"}
+        except DeadlineExceeded as ex:
+            inst.replies = None
+            inst.status = {"status": "timeout", "msg": str(ex)}
+        inst.status["elapsed"] = round(time.monotonic() - start, 3)
+        threshold = budget.spool_threshold(module.params["spool_threshold"]) if budget is not None else None
+        if threshold is not None and threshold != module.params["spool_threshold"]:
+            module.debug(f"Half of memory_budget in use, spooling replies over {threshold} bytes")
+            module.params["spool_threshold"] = threshold
+    if not batch:
+        return
+    stats = []
+    start = time.monotonic()
+    try:
+        with tracked(budget, batch, "fetch"):
+            replies = run_commands(module, [cmd for inst in batch for cmd in inst.COMMANDS], check_rc=False, raw=True,
+                                   spool=module.params.get("spool_threshold"), stats=stats, sessions=module.params["sessions"], deadline=deadline)
+    except DeadlineExceeded as ex:
+        replies = ex.responses
+    elapsed = round(time.monotonic() - start, 3)
+    for inst in batch:
+        inst.replies, replies = replies[:len(inst.COMMANDS)], replies[len(inst.COMMANDS):]
+        inst.stats.extend(stat for stat in stats if stat["command"] in inst.COMMANDS)
+        missing = [cmd for cmd, reply in zip(inst.COMMANDS, inst.replies) if reply is None]
+        inst.status = {"status": "ok", "elapsed": elapsed}
+        if missing:
+            inst.replies = None
+            inst.status.update({"status": "timeout", "msg": f"Deadline exceeded running '{missing[0]}'"})
+
+
+@functionwrapper
+def cached_facts(module, subsets):
+    """schedule: take facts saved less than max age (max_age option or
+    MAX_AGE of the subset) ago from the state store (status cached, age in
+    seconds), so only expired subsets are gathered"""
+    max_age = module.params.get("max_age") or {}
+    for name, inst in subsets.items():
+        age = max_age.get(name, inst.MAX_AGE)
+        if not age:
+            continue
+        state = inst.saved_facts(name)
+        if state and 0 <= time.time() - state["time"] < age:
+            inst.facts = state["facts"]
+            inst.status = {"status": "cached", "elapsed": 0.0, "age": round(time.time() - state["time"], 3)}
+
+
+@functionwrapper
+def save_facts(module, subsets):
+    """Save facts of subsets gathered in this run (schedule, deadline_fallback stale)"""
+    for name, inst in subsets.items():
+        if inst.status["status"] == "ok":
+            StateStore(module, f"facts-{name}").save({"time": time.time(), "facts": inst.facts, "params": inst.params_digest()})
+
+
+@functionwrapper
+def stale_facts(module, subsets):
+    """deadline_fallback stale: return last saved facts of timed out subsets
+    (status stale, age in seconds)"""
+    for name, inst in subsets.items():
+        if inst.status["status"] != "timeout":
+            continue
+        state = inst.saved_facts(name)
+        if state:
+            inst.facts = state["facts"]
+            inst.status.update({"status": "stale", "age": round(time.time() - state["time"], 3)})
+
+
+@functionwrapper
+def store_fleet_facts(module, ansible_facts):
+    """Update fleet_db with ansible_facts. Host is fleet_host, hostname fact
+    or state key; store errors are warnings"""
+    # pylint: disable=import-outside-toplevel
+    import sqlite3
+    from ansible_collections.sense.cisconx9.plugins.module_utils.network.fleetstore import FleetStore
+
+    host = module.params["fleet_host"] or ansible_facts.get("ansible_net_hostname") or state_key(module)
+    try:
+        with FleetStore(module.params["fleet_db"]) as store:
+            changed = store.update_host(host, ansible_facts)
+    except (sqlite3.Error, OSError) as ex:
+        module.warn(f"Fleet store {module.params['fleet_db']} not updated: {ex}")
+        return
+    module.debug(f"Fleet store {module.params['fleet_db']} host {host} sections updated: {changed}")
+
+
+def parse_serial(instances, budget=None):
+    """Parse subsets here, releasing decoded replies of each one right after"""
+    for inst in instances:
+        with tracked(budget, [inst], "parse"):
+            inst.parse()
+            inst.replies = inst.responses = None
+
+
+def parse_subsets(module, instances, budget=None):
+    """Parse fetched subsets. PARALLEL subsets are parsed in worker processes
+    (parse_mode parallel, or auto with at least two of them and
+    PARALLEL_MIN_BYTES of output) while the rest is parsed here. Falls back
+    to serial parsing if workers can not be used. With budget, parsing is
+    serial (every worker would hold its own copy of the replies)"""
+    jobs = [inst for inst in instances if inst.PARALLEL]
+    mode = "serial" if budget is not None else module.params["parse_mode"]
+    if mode == "auto" and (len(jobs) < 2 or (os.cpu_count() or 1) < 2 or sum(inst.reply_bytes() for inst in jobs) < PARALLEL_MIN_BYTES):
+        mode = "serial"
+    if mode == "serial" or not jobs:
+        parse_serial(instances, budget)
+        return
+    # pylint: disable=import-outside-toplevel
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    _PARSE_JOBS[:] = jobs
+    pool = None
+    futures = []
+    try:
+        try:
+            pool = ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1), mp_context=multiprocessing.get_context("fork"))
+            for index in range(len(jobs)):
+                futures.append(pool.submit(parse_job, index))
+        except (BrokenProcessPool, OSError, ValueError) as ex:
+            module.debug(f"Parse workers could not be started ({ex}), parsing serially")
+        # Errors of subsets parsed here are not worker failures
+        parse_serial([inst for inst in instances if not inst.PARALLEL])
+        for inst, future in zip(jobs, futures):
+            try:
+                inst.facts, messages, inst.stats = future.result()
+            except (BrokenProcessPool, OSError, ValueError) as ex:
+                module.debug(f"Parse worker of {type(inst).__name__} failed ({ex}), parsing serially")
+                continue
+            inst.close_replies()
+            inst.replies = None
+            for level, msg in messages:
+                getattr(module, level)(msg)
+        parse_serial([inst for inst in jobs if inst.replies is not None])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _PARSE_JOBS[:] = []
+        for inst in jobs:
+            inst.close_replies()
+
+
+def facts_argument_spec():
+    """Argument spec of the module (also used by the action plugin, see parse_on_controller)"""
+    argument_spec = {
+        # Subsets to gather or !exclude; fingerprint, counters and mac_table
+        # are gathered only if named (see OPT_IN_SUBSETS)
+        "gather_subset": {"default": ["!config"], "type": "list"},
+        "routing_index": {"default": False, "type": "bool"},
+        # Most mac_table entries returned (0 - all), bounds the memory of big tables
+        "mac_table_limit": {"default": 100000, "type": "int"},
+        # Report ipv4/ipv6 routes aggregated per VRF and next hop
+        "routing_aggregate": {"default": False, "type": "bool"},
+        # Routes of these VRFs (default all), within prefixes, from sources (static, bgp-65000, ...)
+        "routing_vrfs": {"type": "list", "elements": "str"},
+        "routing_prefixes": {"type": "list", "elements": "str"},
+        "routing_sources": {"type": "list", "elements": "str"},
+        "parse_mode": {"default": "auto", "choices": ["auto", "serial", "parallel"]},
+        "spool_threshold": {"default": SPOOL_THRESHOLD, "type": "int"},
+        "config_format": {"default": "json", "choices": ["json", "dedup", "compressed"]},
+        "config_cache": {"default": False, "type": "bool"},
+        # CLI sessions to use in parallel; the action plugin opens the extra
+        # ones and passes their sockets in sessions
+        "session_count": {"default": 1, "type": "int"},
+        "sessions": {"type": "list", "elements": "path"},
+        # Seconds for the whole run / each command (0 - unlimited)
+        "time_budget": {"default": 0, "type": "float"},
+        "command_timeout": {"default": 0, "type": "float"},
+        "deadline_fallback": {"default": "missing", "choices": ["missing", "stale"]},
+        # Gather only subsets older than their max age, others from state store
+        "schedule": {"default": False, "type": "bool"},
+        # {subset: seconds} overriding MAX_AGE of subsets
+        "max_age": {"type": "dict"},
+        # Per command timings in ansible_net_perf, warn about commands slower than perf_slow_command s
+        "perf": {"default": False, "type": "bool"},
+        "perf_slow_command": {"default": 0, "type": "float"},
+        # Action plugin runs the parsers on the controller (no module process),
+        # serially; runs with time_budget, command_timeout or memory_budget
+        # still run as a module
+        "parse_on_controller": {"default": False, "type": "bool"},
+        # SQLite fleet store updated with the gathered facts (see fleetstore.py), host name in it
+        "fleet_db": {"type": "path"},
+        "fleet_host": {"type": "str"},
+        # MB of Python allocations the run may use (0 - unlimited), see membudget.py
+        "memory_budget": {"default": 0, "type": "int"},
+    }
+    argument_spec.update(state_argument_spec)
     argument_spec.update(cisconx9_argument_spec)
-    module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True)
+    return argument_spec
+
+
+@functionwrapper
+def gather_facts(module):
+    """Gather facts, return ansible_facts. module is AnsibleModule or
+    anything with the same params/_socket_path/warn/debug/fail_json/jsonify"""
     gather_subset = module.params["gather_subset"]
     runable_subsets = set()
     exclude_subsets = set()
 
     for subset in gather_subset:
         if subset == "all":
-            runable_subsets.update(VALID_SUBSETS)
+            runable_subsets.update(VALID_SUBSETS - OPT_IN_SUBSETS)
             continue
         if subset.startswith("!"):
             subset = subset[1:]
@@ -361,39 +847,93 @@ def main():
         else:
             runable_subsets.add(subset)
     if not runable_subsets:
-        runable_subsets.update(VALID_SUBSETS)
+        runable_subsets.update(VALID_SUBSETS - OPT_IN_SUBSETS)
+
+    if set(module.params["max_age"] or {}).difference(VALID_SUBSETS):
+        module.fail_json(msg="Bad subset in max_age")
 
     runable_subsets.difference_update(exclude_subsets)
     runable_subsets.add("default")
 
-    facts = {"gather_subset": [runable_subsets]}
-
-    instances = []
-    for key in runable_subsets:
-        instances.append(FACT_SUBSETS[key](module))
-
-    for inst in instances:
-        if inst:
-            try:
-                inst.populate()
-                facts.update(inst.facts)
-            except Exception as ex:
-                display.vvv(traceback.format_exc())
-                raise Exception(traceback.format_exc()) from ex
+    facts = {"gather_subset": [sorted(runable_subsets)]}
+
+    # FACT_SUBSETS order, so facts are merged the same way in every mode
+    subsets = {key: FACT_SUBSETS[key](module) for key in FACT_SUBSETS if key in runable_subsets}
+    deadline = None
+    if module.params["time_budget"] or module.params["command_timeout"]:
+        deadline = Deadline(module.params["time_budget"], module.params["command_timeout"])
+    schedule = module.params["schedule"]
+    if schedule:
+        cached_facts(module, subsets)
+    gather = [inst for inst in subsets.values() if inst.status is None]
+    budget = None
+    if module.params["memory_budget"]:
+        from ansible_collections.sense.cisconx9.plugins.module_utils.network.membudget import MemoryBudget  # pylint: disable=import-outside-toplevel
+        budget = MemoryBudget(module.params["memory_budget"] * 2**20)
+    try:
+        fetch_subsets(module, gather, deadline, budget)
+        parse_subsets(module, [inst for inst in gather if inst.status["status"] == "ok"], budget)
+    except Exception as ex:
+        if budget is not None:
+            budget.stop()
+        raise Exception(traceback.format_exc()) from ex
+    stale = deadline is not None and module.params["deadline_fallback"] == "stale"
+    if schedule or stale:
+        save_facts(module, subsets)
+    if stale:
+        stale_facts(module, subsets)
+    if deadline is not None:
+        for name, inst in subsets.items():
+            if inst.status["status"] in ("timeout", "stale"):
+                module.warn(f"Subset {name} not gathered in time ({inst.status['msg']}), facts are {'stale' if inst.status['status'] == 'stale' else 'missing'}")
+    if deadline is not None or schedule:
+        facts["gather_status"] = {name: inst.status for name, inst in subsets.items()}
+    if module.params["perf"] or module.params["perf_slow_command"]:
+        perf = {name: {"elapsed": inst.status["elapsed"], "commands": perf_report(module, inst.stats, module.params["perf_slow_command"])}
+                for name, inst in subsets.items()}
+        if module.params["perf"]:
+            facts["perf"] = perf
+    for inst in subsets.values():
+        facts.update(inst.facts)
+    if budget is not None:
+        facts["memory"] = budget.report({inst: name for name, inst in subsets.items()})
+        budget.stop()
+        if facts["memory"]["peak_mb"] > facts["memory"]["budget_mb"]:
+            module.warn(f"Facts gathering used {facts['memory']['peak_mb']} MB, over memory_budget of {facts['memory']['budget_mb']} MB")
 
     ansible_facts = {}
     for key, value in iteritems(facts):
         key = f"ansible_net_{key}"
         ansible_facts[key] = value
+    if module.params["fleet_db"]:
+        store_fleet_facts(module, ansible_facts)
+    return ansible_facts
 
+
+@functionwrapper
+def facts_result(module, ansible_facts):
+    """Module result of ansible_facts (big facts are written to a file).
+    With memory_budget, facts are written to a file without the size check
+    when output would not fit the budget; the memory report is returned
+    either way"""
     warnings = []
     check_args(module, warnings)
-    if len(str(ansible_facts)) > 100000:
+    memory = ansible_facts.get("ansible_net_memory")
+    if (memory and memory["spill"]) or len(str(ansible_facts)) > 100000:
         facts_path = dumpFactsToTmp(ansible_facts)
-        display.vvv(facts_path)
-        module.exit_json(ansible_facts_file={"file": facts_path}, warnings=warnings)
-    else:
-        module.exit_json(ansible_facts=ansible_facts, warnings=warnings)
+        module.debug(f"Facts written to {facts_path}")
+        result = {"ansible_facts_file": {"file": facts_path}, "warnings": warnings}
+        if memory:
+            result["ansible_facts"] = {"ansible_net_memory": memory}
+        return result
+    return {"ansible_facts": ansible_facts, "warnings": warnings}
+
+
+@functionwrapper
+def main():
+    """main entry point for module execution"""
+    module = AnsibleModule(argument_spec=facts_argument_spec(), supports_check_mode=True)
+    module.exit_json(**facts_result(module, gather_facts(module)))
 
 
 if __name__ == "__main__":
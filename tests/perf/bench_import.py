@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Module import time budget check (python -X importtime).
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Modules are started once per task per host, so import time adds to every
+short task. Each module is imported in a fresh interpreter (best of --runs)
+and fails the check if its cumulative import time is over the budget or it
+pulls in a controller-only/heavy package. The budget is relative: AnsibleModule
+(every module pays it) is imported first in the same interpreter, and
+the import time of the module on top of it is checked as a share of it, so
+a slower or busier machine does not fail the check.
+
+Run from a collections path (same as unit tests):
+    python tests/perf/bench_import.py [--budget 50] [--runs 5]
+Exit code is 1 if any module is over budget.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+MODULES = ("cisconx9_facts", "cisconx9_command", "cisconx9_config")
+PACKAGE = "ansible_collections.sense.cisconx9.plugins.modules"
+# Imported by a module means controller code or optional heavy deps leaked in
+FORBIDDEN = ("ansible.utils.display", "ansible.constants", "jinja2", "yaml")
+# Imported first, every module pays its import time
+BASELINE = "ansible.module_utils.basic"
+# Import time of a module on top of BASELINE (% of BASELINE import time)
+BUDGET_PCT = 50
+
+
+def importtime(*modules):
+    """Return ({module: cumulative us}) of importing modules (in order) in a
+    fresh interpreter"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+                          capture_output=True, text=True, check=True, env=dict(os.environ))
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--budget", type=float, default=BUDGET_PCT, help="Budget per module (%% over AnsibleModule import)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per module (best is used)")
+    args = parser.parse_args()
+    failed = False
+    print(f"{'module':24}{'best ms':>10}{'basic ms':>10}{'over %':>10}  result")
+    for name in MODULES:
+        module = f"{PACKAGE}.{name}"
+        runs = [importtime(BASELINE, module) for _ in range(args.runs)]
+        best = min(runs, key=lambda times: times.get(module, 0) / max(times.get(BASELINE, 0), 1))
+        leaked = sorted(mod for mod in FORBIDDEN if mod in best)
+        own, baseline = best.get(module, 0) / 1000, best.get(BASELINE, 0) / 1000
+        over = own / baseline * 100 if baseline else 0
+        result = "ok"
+        if leaked:
+            result = f"FAIL imports {', '.join(leaked)}"
+        elif over > args.budget:
+            result = f"FAIL over budget +{args.budget:.0f}%"
+        failed = failed or result != "ok"
+        print(f"{name:24}{baseline + own:10.1f}{baseline:10.1f}{over:10.1f}  {result}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Memory and allocations of interface/route parsing on a dense chassis.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Interfaces (InterfaceRecord, interned names, one reply decoded at a time)
+is compared with the dict based populate it replaced, Routing with and
+without interned next hops. "before" rows are the previous parse: all
+replies decoded up front (orjson for any size, if installed), kept until
+the end and no interning. Reports peak traced memory while parsing, memory
+still held by the facts (and the subset) afterwards and allocated blocks,
+so the numbers are comparable between runs and machines (time is
+informative only).
+
+Run from a collections path (same as unit tests):
+    python tests/perf/bench_records.py [--ports 512] [--vlans 3000] [--routes 100000]
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from contextlib import contextmanager
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network import cisconx9
+from ansible_collections.sense.cisconx9.plugins.modules import cisconx9_facts
+from ansible_collections.sense.cisconx9.plugins.modules.cisconx9_facts import (INTERFACE_TABLE, IPV6_TABLE, LLDP_TABLE, ROUTE_TABLE, SWITCHPORT_TABLE,
+                                                                                VLAN_TABLE, DetachedModule, FactsBase, Interfaces, Routing, findvlanranges)
+
+
+def make_replies(ports, vlans):
+    """Synthetic show interface/vlan/ipv6 interface/lldp/switchport replies.
+    Half of the ports are up trunks allowing 1-vlans, show vlan lists the
+    first third of the VLANs (the rest become synthetic VlanN entries)"""
+    names = [f"Ethernet{1 + idx // 64}/{1 + idx % 64}" for idx in range(ports)]
+    trunks = names[::2]
+    interfaces = [{"interface": name, "state": "up", "eth_hw_addr": f"a411.bb40.{idx:04x}", "eth_duplex": "full",
+                   "desc": f"port {idx}", "eth_bw": "100000000", "eth_mtu": "9216", "eth_mode": "trunk" if idx % 2 == 0 else "access"}
+                  for idx, name in enumerate(names)]
+    interfaces += [{"interface": f"Vlan{vlan}", "svi_line_proto": "up", "svi_mac": "a411.bb40.ffff", "svi_ip_addr": f"10.{vlan // 256}.{vlan % 256}.1",
+                    "svi_ip_mask": "24", "svi_bw": "1000000", "svi_mtu": "9216"} for vlan in range(2, 66)]
+    vlanbrief = [{"vlanshowbr-vlanid": str(vlan), "vlanshowbr-vlanname": f"VLAN{vlan:04d}", "vlanshowbr-vlanstate": "active",
+                  "vlanshowplist-ifidx": ",".join(trunks)} for vlan in range(1, vlans // 3)]
+    ipv6 = [{"intf-name": f"Vlan{vlan}", "TABLE_addr": {"ROW_addr": [{"addr": f"2001:db8:{vlan:x}::1/64"}]}} for vlan in range(2, 66)]
+    lldp = [{"l_port_id": name.replace("Ethernet", "Eth"), "port_id": f"000e.1e05.{idx:04x}", "port_desc": f"Ethernet1/{idx % 64}",
+             "sys_name": f"leaf{idx % 16}"} for idx, name in enumerate(names)]
+    switchport = [{"interface": name, "trunk_vlans": f"1-{vlans}" if name in trunks else "1"} for name in names]
+    return [{"TABLE_interface": {"ROW_interface": interfaces}}, {"TABLE_vlanbrief": {"ROW_vlanbrief": vlanbrief}},
+            {"TABLE_intf": {"ROW_intf": ipv6}}, {"TABLE_nbor_detail": {"ROW_nbor_detail": lldp}},
+            {"TABLE_interface": {"ROW_interface": switchport}}]
+
+
+def make_routes(routes):
+    """Synthetic show ip route vrf all reply, 8 next hops"""
+    prefixes = [{"ipprefix": f"10.{idx // 65536 % 256}.{idx // 256 % 256}.{idx % 256}/32",
+                 "TABLE_path": {"ROW_path": [{"ipnexthop": f"192.168.0.{idx % 8}"}]}} for idx in range(routes)]
+    return [{"TABLE_vrf": {"ROW_vrf": [{"vrf-name-out": "default", "TABLE_addrf": {"ROW_addrf": [{"TABLE_prefix": {"ROW_prefix": prefixes}}]}}]}},
+            {"TABLE_vrf": {"ROW_vrf": []}}]
+
+
+class DictInterfaces(Interfaces):
+    """Interfaces as parsed before InterfaceRecord: nested dicts, list
+    membership checks, replies kept after parse"""
+
+    def addMac(self, newmac):
+        if newmac not in self.facts["info"]["macs"]:
+            self.facts["info"]["macs"].append(newmac)
+
+    def parse(self):
+        FactsBase.parse(self)
+        interfaces = self.facts.setdefault("interfaces", {})
+        self.facts.setdefault("info", {"macs": []})
+        for row in INTERFACE_TABLE.rows(self.responses[0]):
+            intf = row.pop("interface")
+            intout = interfaces.setdefault(intf, {})
+            ipv4 = row.pop("ipv4", None)
+            if ipv4:
+                intout.setdefault("ipv4", []).append(ipv4)
+            if "mac" in row:
+                self.addMac(row["mac"])
+            ethmode = row.pop("eth_mode", None)
+            if not intf.startswith("Vlan"):
+                intout["switchport"] = "yes" if ethmode == "trunk" else "no"
+            intout.update(row)
+        for row in VLAN_TABLE.rows(self.responses[1]):
+            vlanout = interfaces.setdefault(row["interface"], {})
+            for key in ["description", "operstatus"]:
+                if key in row:
+                    vlanout[key] = row[key]
+            if "tagged" in row:
+                vlanout.setdefault("tagged", row["tagged"])
+        for row in IPV6_TABLE.rows(self.responses[2]):
+            intout = interfaces.setdefault(row["interface"], {})
+            if "ipv6" in row:
+                intout.setdefault("ipv6", []).append(row["ipv6"])
+        self.facts["lldp"] = {row["local_port_id"]: row for row in LLDP_TABLE.rows(self.responses[3])}
+        for item in SWITCHPORT_TABLE.rows(self.responses[4]):
+            if interfaces.get(item["interface"], {}).get("switchport", "no") != "yes":
+                continue
+            if interfaces.get(item["interface"], {}).get("operstatus", "down") != "up":
+                continue
+            for vlan in findvlanranges(item["trunk_vlans"]):
+                vlanName = f"Vlan{vlan}"
+                if vlanName not in interfaces:
+                    interfaces[vlanName] = {"bandwidth": None, "duplex": None, "lineprotocol": None, "macaddress": None,
+                                            "description": None, "mtu": None, "operstatus": None, "channel-member": None}
+                interfaces[vlanName].setdefault("tagged", [])
+                if item["interface"] not in interfaces[vlanName]["tagged"]:
+                    interfaces[vlanName]["tagged"].append(item["interface"])
+
+
+class DecodedRouting(Routing):
+    """Routing with all replies decoded up front and kept after parse"""
+
+    def parse(self):
+        FactsBase.parse(self)
+        for respid, resptype in enumerate(self.families):
+            self.facts.setdefault(resptype, []).extend(ROUTE_TABLE.rows(self.responses[respid]))
+
+
+@contextmanager
+def patched(module, **values):
+    """Set module attributes while measuring"""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def before(cls, replies):
+    """measure of the previous parse: cls decoding all replies up front,
+    orjson for any reply size, no interning"""
+    with patched(cisconx9, ORJSON_MAX_SIZE=sys.maxsize), patched(cisconx9_facts, intern_name=str):
+        return measure(cls, replies)
+
+
+def measure(cls, replies):
+    """Parse replies with a fresh subset instance under tracemalloc.
+    Returns (facts, peak, held, blocks, seconds)"""
+    inst = cls(DetachedModule({}))
+    inst.replies = [json.dumps(reply) for reply in replies]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    inst.parse()
+    elapsed = time.perf_counter() - start
+    snapshot = tracemalloc.take_snapshot()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    return inst.facts, peak - before, held - before, blocks, elapsed
+
+
+def report(name, result):
+    """Print one measurement"""
+    _, peak, held, blocks, elapsed = result
+    print(f"{name:28}{peak / 2**20:10.1f}{held / 2**20:10.1f}{blocks:12d}{elapsed * 1000:10.0f}")
+
+
+def main():
+    """Run benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--ports", type=int, default=512, help="Ethernet ports")
+    parser.add_argument("--vlans", type=int, default=3000, help="VLANs allowed on trunks")
+    parser.add_argument("--routes", type=int, default=100000, help="IPv4 routes")
+    args = parser.parse_args()
+    print(f"{'':28}{'peak MB':>10}{'held MB':>10}{'blocks':>12}{'ms':>10}")
+    replies = make_replies(args.ports, args.vlans)
+    results = {"interfaces (before)": before(DictInterfaces, replies), "interfaces (dicts)": measure(DictInterfaces, replies),
+               "interfaces (records)": measure(Interfaces, replies)}
+    replies = make_routes(args.routes)
+    results["routing (before)"] = before(DecodedRouting, replies)
+    with patched(cisconx9_facts, intern_name=str):
+        results["routing (plain strings)"] = measure(Routing, replies)
+    results["routing (interned)"] = measure(Routing, replies)
+    for name, result in results.items():
+        assert result[0] == results[f"{name.split()[0]} (before)"][0], f"{name}: facts differ"
+        report(name, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark table specs (tableextract.py) against the loops they replaced.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+The specs also intern interface names and next hops (see records.py),
+which the previous loops did not.
+
+Run from a collections path (same as unit tests):
+    python tests/perf/bench_rows.py [rows]
+"""
+import sys
+import timeit
+
+from ansible_collections.sense.cisconx9.plugins.modules.cisconx9_facts import LLDP_TABLE, ROUTE_TABLE, macSplitter
+
+
+def make_lldp(rows):
+    """Synthetic show lldp neighbors detail | json reply"""
+    return {"TABLE_nbor_detail": {"ROW_nbor_detail": [
+        {"l_port_id": f"Eth1/{idx}", "port_id": f"000e.1e05.{idx:04x}", "port_desc": "null" if idx % 3 else f"port{idx}", "sys_name": f"sw{idx}"}
+        for idx in range(rows)]}}
+
+
+def make_routes(rows):
+    """Synthetic show ip route vrf all | json reply (normalized)"""
+    prefixes = []
+    for idx in range(rows):
+        paths = [{"ipnexthop": f"10.{idx % 250}.0.{hop}"} for hop in range(1 + idx % 2)]
+        prefixes.append({"ipprefix": f"10.{idx // 65536 % 256}.{idx // 256 % 256}.{idx % 256}/32", "TABLE_path": {"ROW_path": paths}})
+    return {"TABLE_vrf": {"ROW_vrf": [{"vrf-name-out": "default", "TABLE_addrf": {"ROW_addrf": [{"TABLE_prefix": {"ROW_prefix": prefixes}}]}}]}}
+
+
+def hand_lldp(reply):
+    """populate_lldp loop before the table specs"""
+    lldpdict = {}
+    for intdict in reply.get("TABLE_nbor_detail", {}).get("ROW_nbor_detail", []):
+        tmpdict = {}
+        if "l_port_id" in intdict:
+            tmpdict["local_port_id"] = intdict["l_port_id"].replace("Eth", "Ethernet")
+        if "port_id" in intdict:
+            tmpdict["remote_chassis_id"] = macSplitter(intdict["port_id"])
+        if "port_desc" in intdict and intdict["port_desc"] != "null":
+            tmpdict["remote_port_id"] = intdict["port_desc"]
+        if "sys_name" in intdict and intdict["sys_name"] != "null":
+            tmpdict["remote_system_name"] = intdict["sys_name"]
+        if tmpdict["local_port_id"]:
+            lldpdict[tmpdict["local_port_id"]] = tmpdict
+    return lldpdict
+
+
+def rows_lldp(reply):
+    """populate_lldp with LLDP_TABLE"""
+    return {row["local_port_id"]: row for row in LLDP_TABLE.rows(reply)}
+
+
+def hand_routes(reply):
+    """populate_ip46 loop before the table specs"""
+    routes = []
+    for intdict in reply.get("TABLE_vrf", {}).get("ROW_vrf", []):
+        for addrf in intdict.get("TABLE_addrf", {}).get("ROW_addrf", []):
+            for routeEntry in addrf.get("TABLE_prefix", {}).get("ROW_prefix", []):
+                for entry in routeEntry.get("TABLE_path", {}).get("ROW_path", []):
+                    if not entry.get("ipnexthop"):
+                        continue
+                    tmpdict = {"vrf": intdict["vrf-name-out"]}
+                    if "ipprefix" in routeEntry:
+                        tmpdict["to"] = routeEntry["ipprefix"]
+                    tmpdict["from"] = entry["ipnexthop"]
+                    routes.append(tmpdict)
+    return routes
+
+
+def rows_routes(reply):
+    """populate_ip46 with ROUTE_TABLE"""
+    return list(ROUTE_TABLE.rows(reply))
+
+
+def bench(name, hand, rows, reply, number):
+    """Time both implementations and check they agree"""
+    assert hand(reply) == rows(reply), f"{name}: outputs differ"
+    thand = min(timeit.repeat(lambda: hand(reply), number=number, repeat=5)) / number
+    trows = min(timeit.repeat(lambda: rows(reply), number=number, repeat=5)) / number
+    print(f"{name:8s} previous {thand * 1000:9.3f} ms  table spec {trows * 1000:9.3f} ms  ratio {trows / thand:5.2f}")
+
+
+def main():
+    """Run benchmark"""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bench("lldp", hand_lldp, rows_lldp, make_lldp(rows // 100), 50)
+    bench("routes", hand_routes, rows_routes, make_routes(rows), 3)
+
+
+if __name__ == "__main__":
+    main()
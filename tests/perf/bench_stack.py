@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""End to end benchmark of cisconx9_facts over a replayed NX9 session.
+Copyright: Contributors to the SENSE Project
+GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+Runs the same stack as ansible-connection + a module run, offline:
+  cisconx9_replay connection (network_cli + TerminalModule + Cliconf) served
+  over the JSON-RPC unix socket, module forked as a separate process talking
+  to it through _ansible_socket, and the action plugin prompt check.
+Reports time per layer. Session is a recorded session JSON file or a
+fixtures directory (see module_utils/network/replay.py).
+
+Run from a collections path (same as unit tests):
+    python tests/perf/bench_stack.py SESSION [--latency 0.02] [--scale 10] [--subset interfaces ...]
+
+Full playbook runs can use the same session with
+    ansible_connection=sense.cisconx9.cisconx9_replay ansible_cisconx9_replay_session=SESSION
+"""
+import os
+import io
+import sys
+import json
+import time
+import socket
+import resource
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from collections import defaultdict
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.connection import Connection, recv_data, send_data
+from ansible.playbook.play_context import PlayContext
+from ansible.plugins.loader import connection_loader
+from ansible.utils.jsonrpc import JsonRpcServer
+
+# JSON-RPC methods the module runs commands with (get_spooled: Cliconf)
+MODULE_METHODS = ("exec_command", "get_spooled")
+COLLECTIONS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", ".."))
+
+
+def init_loader():
+    """Make collection plugins loadable outside of ansible CLI"""
+    try:
+        from ansible.plugins.loader import init_plugin_loader  # pylint: disable=import-outside-toplevel
+        init_plugin_loader([COLLECTIONS_ROOT])
+    except ImportError:
+        from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder  # pylint: disable=import-outside-toplevel
+        _AnsibleCollectionFinder(paths=[COLLECTIONS_ROOT])._install()  # pylint: disable=protected-access
+
+
+def timed(func, counters, name):
+    """Wrap func to accumulate its wall time in counters[name]"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            counters[name] += time.perf_counter() - start
+    return wrapper
+
+
+def open_connection(args, counters):
+    """Replay connection with server side timer on send"""
+    plc = PlayContext()
+    plc.network_os = "sense.cisconx9.cisconx9"
+    plc.remote_addr = "replay"
+    plc.connection = "sense.cisconx9.cisconx9_replay"
+    conn = connection_loader.get("sense.cisconx9.cisconx9_replay", plc, "/dev/null")
+    conn.set_options(direct={"replay_session": args.session, "replay_latency": args.latency,
+                             "replay_bandwidth": args.bandwidth, "replay_scale": args.scale,
+                             "persistent_command_timeout": 300})
+    conn.send = timed(conn.send, counters, "send")
+    return conn
+
+
+def shell_times(conn):
+    """(device_time, idle_time) of replay shell so far"""
+    shell = conn._ssh_shell  # pylint: disable=protected-access
+    if shell is None:
+        return 0.0, 0.0
+    return shell.stats["device_time"], shell.stats["idle_time"]
+
+
+def serve(conn, sockpath, child, counters):
+    """Serve JSON-RPC requests (like ansible-connection) until child exits"""
+    server = JsonRpcServer()
+    server.register(conn)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(sockpath)
+    listener.listen(1)
+    listener.settimeout(0.1)
+    child.start()
+    while child.is_alive():
+        try:
+            client, _ = listener.accept()
+        except socket.timeout:
+            continue
+        with client:
+            client.settimeout(None)
+            data = recv_data(client)
+            method = json.loads(to_text(data)).get("method")
+            before = (counters["send"],) + shell_times(conn)
+            start = time.perf_counter()
+            response = server.handle_request(data)
+            counters[f"handle:{method}"] += time.perf_counter() - start
+            for name, prev, cur in zip(("send", "device", "idle"), before, (counters["send"],) + shell_times(conn)):
+                counters[f"{name}:{method}"] += cur - prev
+            counters[f"calls:{method}"] += 1
+            try:
+                send_data(client, to_bytes(response))
+            except BrokenPipeError:
+                # Module gave up waiting (time_budget/command_timeout)
+                pass
+    listener.close()
+
+
+def current_rss():
+    """Current RSS (kB)"""
+    with open("/proc/self/status", "r", encoding="utf-8") as fd:
+        for line in fd:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def client(sockpath, subsets, modargs, pipe):
+    """Forked process: action prompt check, module run and cliconf pass"""
+    counters = defaultdict(float)
+    Connection._exec_jsonrpc = timed(Connection._exec_jsonrpc, counters, "rpc")  # pylint: disable=protected-access
+    conn = Connection(sockpath)
+    start = time.perf_counter()
+    out = conn.get_prompt()
+    while to_text(out, errors="surrogate_then_replace").strip().endswith(")#"):
+        conn.send_command("exit")
+        out = conn.get_prompt()
+    counters["action"] = time.perf_counter() - start
+    counters["rpc"] = 0.0
+
+    from ansible.module_utils import basic  # pylint: disable=import-outside-toplevel
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({"ANSIBLE_MODULE_ARGS": {  # pylint: disable=protected-access
+        "gather_subset": subsets, "_ansible_socket": sockpath, **modargs}}))
+    stdout = io.StringIO()
+    counters["rss"] = current_rss()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout):
+        try:
+            from ansible_collections.sense.cisconx9.plugins.modules import cisconx9_facts  # pylint: disable=import-outside-toplevel
+            cisconx9_facts.main()
+        except SystemExit:
+            pass
+    counters["module"] = time.perf_counter() - start
+    counters["module_rpc"] = counters["rpc"]
+    counters["maxrss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - counters["rss"]
+    result = json.loads(stdout.getvalue() or "{}")
+    pipe.send((dict(counters), result))
+    pipe.close()
+
+
+def cliconf_pass(sockpath, commands, pipe):
+    """Forked process: same commands through Cliconf.get"""
+    conn = Connection(sockpath)
+    start = time.perf_counter()
+    for command in commands:
+        conn.get(command=command)
+    pipe.send(time.perf_counter() - start)
+    pipe.close()
+
+
+def run_child(conn, sockpath, target, args, counters):
+    """Fork target, serve its requests and return what it sent back"""
+    ctx = multiprocessing.get_context("fork")
+    recv_pipe, send_pipe = ctx.Pipe(duplex=False)
+    child = ctx.Process(target=target, args=(sockpath,) + args + (send_pipe,))
+    serve(conn, sockpath, child, counters)
+    os.unlink(sockpath)
+    child.join()
+    return recv_pipe.recv()
+
+
+def report(counters, client_counters, cliconf_time, shell, result):
+    """Print per layer time breakdown"""
+    def module_calls(name):
+        return sum(counters[f"{name}:{method}"] for method in MODULE_METHODS)
+
+    commands = int(module_calls("calls")) or 1
+    device = module_calls("device")
+    idle = module_calls("idle")
+    send_exec = module_calls("send")
+    handle = module_calls("handle")
+    rows = [
+        ("device (replay latency)", device),
+        ("buffer read timeout wait", idle),
+        ("terminal/network_cli", send_exec - device - idle),
+        ("json-rpc server/cliconf", handle - send_exec),
+        ("json-rpc transport+client", client_counters["module_rpc"] - handle),
+        ("module (import/parse/output)", client_counters["module"] - client_counters["module_rpc"]),
+        ("action prompt check+connect", client_counters["action"]),
+    ]
+    print(f"commands: {commands}, bytes from device: {shell.stats['bytes']}")
+    print(f"{'layer':32}{'total ms':>12}{'per cmd ms':>12}")
+    for name, value in rows:
+        print(f"{name:32}{value * 1000:12.2f}{value * 1000 / commands:12.3f}")
+    total = client_counters["module"] + client_counters["action"]
+    print(f"{'end to end':32}{total * 1000:12.2f}{total * 1000 / commands:12.3f}")
+    print(f"{'module peak RSS growth (MB)':32}{client_counters['maxrss'] / 1024:12.1f}")
+    if cliconf_time is not None:
+        overhead = cliconf_time - counters["handle:get"]
+        print(f"{'cliconf get (same commands)':32}{cliconf_time * 1000:12.2f}{cliconf_time * 1000 / commands:12.3f}")
+        print(f"{'  of which cliconf+rpc overhead':32}{(counters['handle:get'] - counters['send:get']) * 1000:12.2f}"
+              f"{(counters['handle:get'] - counters['send:get']) * 1000 / commands:12.3f}")
+        print(f"{'  of which transport':32}{overhead * 1000:12.2f}{overhead * 1000 / commands:12.3f}")
+    facts = result.get("ansible_facts", {})
+    if result.get("failed") or not (facts or result.get("ansible_facts_file")):
+        print(f"module failed: {result.get('msg', result)}")
+    elif facts:
+        print(f"facts: {len(facts)} keys, {len(json.dumps(facts))} bytes")
+        for name, status in facts.get("ansible_net_gather_status", {}).items():
+            print(f"  {name:14}{status['status']:10}{status['elapsed'] * 1000:10.0f} ms")
+    else:
+        print(f"facts: written to {result['ansible_facts_file']['file']}")
+
+
+def main():
+    """Main"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("session", help="Session JSON file or fixtures directory")
+    parser.add_argument("--latency", type=float, default=0.0, help="Per command device latency (s)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="Device output bytes/s (0 - unlimited)")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply ROW_ lists of replies")
+    parser.add_argument("--subset", action="append", help="gather_subset (repeatable)")
+    parser.add_argument("--arg", action="append", default=[], help="Extra module argument key=value (repeatable)")
+    args = parser.parse_args()
+    init_loader()
+
+    counters = defaultdict(float)
+    conn = open_connection(args, counters)
+    sockpath = os.path.join(tempfile.mkdtemp(), "replay.sock")
+    client_counters, result = run_child(conn, sockpath, client, (args.subset or ["all", "!config"], dict(arg.split("=", 1) for arg in args.arg)), counters)
+    shell = conn._ssh_shell  # pylint: disable=protected-access
+    if shell is None:
+        print(f"module failed: {result.get('msg', result)}")
+        return 1
+    # Cliconf pass over the commands the module sent (device stats cover the module run only)
+    commands = [cmd for cmd in shell.session._cache if shell.session._cache[cmd] is not None]  # pylint: disable=protected-access
+    stats = dict(shell.stats)
+    cliconf_time = run_child(conn, sockpath, cliconf_pass, (commands,), counters) if commands else None
+    shell.stats = stats
+    conn.close()
+    report(counters, client_counters, cliconf_time, shell, result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
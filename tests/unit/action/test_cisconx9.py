@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""cisconx9 action plugin unit tests."""
+__metaclass__ = type
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import socketserver
+from unittest.mock import MagicMock, patch
+
+from ansible.errors import AnsibleError
+from ansible.module_utils.connection import recv_data, send_data
+from ansible_collections.sense.cisconx9.plugins.action.cisconx9 import ActionModule, SessionPool
+
+ACTION = 'ansible_collections.sense.cisconx9.plugins.action.cisconx9'
+FACTS = 'ansible_collections.sense.cisconx9.plugins.modules.cisconx9_facts'
+
+
+class PromptHandler(socketserver.BaseRequestHandler):
+    """JSON-RPC get_prompt of a logged in session"""
+
+    def handle(self):
+        request = json.loads(recv_data(self.request))
+        send_data(self.request, json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': 'sw1#'}).encode())
+
+
+class BusyHandler(socketserver.BaseRequestHandler):
+    """Session running a command of another task"""
+
+    def handle(self):
+        recv_data(self.request)
+        time.sleep(1)
+
+
+class TestSessionPool(unittest.TestCase):
+    """Unit tests for session_count sessions."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.servers = {}
+
+    def tearDown(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def start_session(self, play_context, options, task_uuid, index):
+        """Socket of host and index, served while the test runs"""
+        path = os.path.join(self.tmpdir, f"{play_context.remote_addr}-{index}")
+        if path not in self.servers:
+            handler = BusyHandler if index in options.get('busy', ()) else PromptHandler
+            self.servers[path] = socketserver.ThreadingUnixStreamServer(path, handler)
+            threading.Thread(target=self.servers[path].serve_forever, daemon=True).start()
+        return path
+
+    def pool(self, options):
+        """SessionPool of 2 extra sessions to sw1"""
+        return SessionPool(MagicMock(remote_addr='sw1'), dict(options, persistent_connect_timeout=0.2), 'uuid', 2)
+
+    def test_sessions(self):
+        """Sessions are keyed by host and index, later tasks reuse them"""
+        with patch(f'{ACTION}.start_session', side_effect=self.start_session):
+            paths = self.pool({}).start()
+            self.assertEqual([os.path.join(self.tmpdir, 'sw1-2'), os.path.join(self.tmpdir, 'sw1-3')], paths)
+            self.assertEqual(paths, self.pool({}).start())
+        self.assertEqual(2, len(self.servers))
+
+    def test_skipped(self):
+        """Sessions which are busy or do not start are left out and reported"""
+        with patch(f'{ACTION}.start_session', side_effect=self.start_session):
+            pool = self.pool({'busy': (3,)})
+            self.assertEqual([os.path.join(self.tmpdir, 'sw1-2')], pool.start())
+        self.assertEqual(["session 3: busy"], pool.errors)
+        with patch(f'{ACTION}.start_session', side_effect=AnsibleError("login failed")):
+            pool = self.pool({})
+            self.assertEqual([], pool.start())
+        self.assertEqual(["session 2: login failed", "session 3: login failed"], pool.errors)
+
+
+def action_module(args):
+    """ActionModule of a cisconx9_facts task with args on network_cli"""
+    task = MagicMock()
+    task.action = task.resolved_action = 'sense.cisconx9.cisconx9_facts'
+    task.args = args
+    play_context = MagicMock()
+    play_context.connection = 'ansible.netcommon.network_cli'
+    connection = MagicMock()
+    connection.socket_path = '/nonexistent/socket'
+    return ActionModule(task, connection, play_context, MagicMock(), MagicMock(), MagicMock())
+
+
+class TestParseOnController(unittest.TestCase):
+    """Unit tests for parse_on_controller."""
+
+    def setUp(self):
+        self.patches = [patch('ansible_collections.sense.cisconx9.plugins.action.cisconx9.Connection'),
+                        patch('ansible_collections.sense.cisconx9.plugins.action.cisconx9.get_action_args_with_defaults',
+                              side_effect=lambda action, args, *rest, **kwargs: dict(args)),
+                        patch('ansible_collections.ansible.netcommon.plugins.action.network.ActionModule.run',
+                              return_value={'module': True})]
+        connection, _, self.module_run = [item.start() for item in self.patches]
+        connection.return_value.get_prompt.return_value = 'sw1#'
+
+    def tearDown(self):
+        for item in self.patches:
+            item.stop()
+
+    def test_result(self):
+        """Facts and module warnings are returned, parsing is serial"""
+        params = {}
+
+        def gather_facts(module):
+            params.update(module.params)
+            module.warn('slow subset')
+            return {'ansible_net_hostname': 'sw1'}
+
+        with patch(f'{FACTS}.gather_facts', side_effect=gather_facts):
+            result = action_module({'parse_on_controller': True, 'parse_mode': 'parallel'}).run(task_vars={})
+        self.assertEqual({'ansible_facts': {'ansible_net_hostname': 'sw1'}, 'warnings': ['slow subset'], 'changed': False}, result)
+        self.assertEqual('serial', params['parse_mode'])
+        self.module_run.assert_not_called()
+
+    def test_failed(self):
+        """fail_json and invalid options are the failed result"""
+        def gather_facts(module):
+            module.fail_json(msg='no reply', command='show version')
+
+        with patch(f'{FACTS}.gather_facts', side_effect=gather_facts):
+            result = action_module({'parse_on_controller': True}).run(task_vars={})
+        self.assertEqual({'failed': True, 'msg': 'no reply', 'command': 'show version'}, result)
+        result = action_module({'parse_on_controller': True, 'deadline_fallback': 'never'}).run(task_vars={})
+        self.assertTrue(result['failed'])
+        self.assertIn('deadline_fallback', result['msg'])
+
+    def test_failed_command(self):
+        """fail_json and errors of commands run by gather_facts are the failed result"""
+        def fail_command(module, commands, **kwargs):
+            module.fail_json(msg='show version failed', rc=1)
+
+        with patch(f'{FACTS}.run_commands', side_effect=fail_command):
+            result = action_module({'parse_on_controller': True, 'gather_subset': ['!all']}).run(task_vars={})
+        self.assertEqual({'failed': True, 'msg': 'show version failed', 'rc': 1}, result)
+        with patch(f'{FACTS}.run_commands', side_effect=ConnectionError('socket closed')):
+            result = action_module({'parse_on_controller': True, 'gather_subset': ['!all']}).run(task_vars={})
+        self.assertTrue(result['failed'])
+        self.assertIn('ConnectionError: socket closed', result['msg'])
+
+    def test_fallback(self):
+        """Without parse_on_controller, or with deadline/memory options, the module runs"""
+        with patch(f'{FACTS}.gather_facts') as gather_facts:
+            for args in ({}, {'parse_on_controller': True, 'time_budget': 5},
+                         {'parse_on_controller': True, 'command_timeout': 2},
+                         {'parse_on_controller': True, 'memory_budget': 64}):
+                self.assertEqual({'module': True}, action_module(args).run(task_vars={}))
+            gather_facts.assert_not_called()
+        self.assertEqual(4, self.module_run.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
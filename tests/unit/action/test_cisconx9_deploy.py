@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""cisconx9_deploy action plugin unit tests."""
+__metaclass__ = type
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from ansible import constants as C
+from ansible.playbook.play_context import PlayContext
+from ansible.playbook.task import Task
+from ansible.template import Templar
+from ansible.parsing.dataloader import DataLoader
+from ansible_collections.sense.cisconx9.plugins.action.cisconx9_deploy import ActionModule
+from ansible_collections.sense.cisconx9.tests.unit.module_utils.test_deploy import FakeConnection
+
+ACTION = 'ansible_collections.sense.cisconx9.plugins.action.cisconx9_deploy'
+HOSTVARS = {'sw1': {'ansible_connection': 'ansible.netcommon.network_cli', 'inventory_hostname': 'sw1'},
+            'sw2': {'ansible_connection': 'ansible.netcommon.network_cli', 'inventory_hostname': 'sw2',
+                    'ansible_host': '10.0.0.2', 'ansible_cisconx9_replay_latency': 0.5}}
+
+
+class FakePlugin:
+    """Persistent connection plugin recording its options"""
+
+    _load_name = 'network_cli'
+    supports_persistence = False
+    force_persistence = True
+
+    def __init__(self, *args):
+        self.options = {'persistent_command_timeout': 30}
+
+    def set_options(self, var_options=None):
+        """Options of host vars"""
+        self.options.update(var_options)
+
+    def get_option(self, name):
+        """Option value"""
+        return self.options[name]
+
+    def get_options(self):
+        """All options"""
+        return dict(self.options)
+
+
+def action_module(args):
+    """ActionModule of a cisconx9_deploy task with args, running for localhost"""
+    task = Task()
+    task.args = args
+    play_context = PlayContext()
+    play_context.remote_addr = 'localhost'
+    loader = MagicMock()
+    loader.connection_loader.get.side_effect = lambda name, *args, **kwargs: FakePlugin if kwargs.get('class_only') else FakePlugin()
+    return ActionModule(task, MagicMock(), play_context, DataLoader(), Templar(loader=DataLoader()), loader)
+
+
+class TestDeployAction(unittest.TestCase):
+    """Unit tests for cisconx9_deploy action."""
+
+    def setUp(self):
+        self.conns = {}
+        self.patches = [patch(f'{ACTION}.start_connection', side_effect=lambda plc, options, uuid: f"/sock/{plc.remote_addr}"),
+                        patch(f'{ACTION}.connection_for', side_effect=lambda path: self.conns.setdefault(path, FakeConnection())),
+                        patch.object(C.config, 'get_plugin_vars', return_value=['ansible_cisconx9_replay_latency'])]
+        self.start_connection = self.patches[0].start()
+        for item in self.patches[1:]:
+            item.start()
+
+    def tearDown(self):
+        for item in self.patches:
+            item.stop()
+
+    def test_deploy(self):
+        """Each host is pushed over its own connection, started from its host vars"""
+        result = action_module({'targets': [{'host': 'sw1', 'lines': ['vlan 10']},
+                                            {'host': 'sw2', 'lines': ['vlan 10'], 'wave': 1}]}).run(task_vars={'hostvars': HOSTVARS})
+        self.assertTrue(result['ok'])
+        self.assertTrue(result['changed'])
+        self.assertEqual(['/sock/sw1', '/sock/10.0.0.2'], sorted(self.conns, reverse=True))
+        self.assertEqual(['configure terminal', 'vlan 10', 'end'], self.conns['/sock/10.0.0.2'].commands)
+        options = [call.args[1] for call in self.start_connection.call_args_list]
+        self.assertEqual([None, 0.5], [opts.get('ansible_cisconx9_replay_latency') for opts in options])
+
+    def test_check_mode(self):
+        """Check mode returns the planned lines, no connection is started and nothing is pushed"""
+        action = action_module({'targets': [{'host': 'sw1', 'lines': ['vlan 10']}, {'host': 'sw2', 'lines': ['vlan 20'], 'wave': 1}]})
+        action._task.check_mode = True  # pylint: disable=protected-access
+        result = action.run(task_vars={'hostvars': HOSTVARS})
+        self.assertTrue(result['changed'])
+        self.assertEqual(['vlan 20'], result['devices']['sw2']['updates'])
+        self.start_connection.assert_not_called()
+        self.assertEqual({}, self.conns)
+
+    def test_failed(self):
+        """Unknown hosts, duplicate hosts and failed pushes fail the task"""
+        result = action_module({'targets': [{'host': 'sw3', 'lines': ['vlan 10']}]}).run(task_vars={'hostvars': HOSTVARS})
+        self.assertEqual('cisconx9_deploy: unknown host sw3', result['msg'])
+        result = action_module({'targets': [{'host': 'sw1', 'lines': ['vlan 10']},
+                                            {'host': 'sw1', 'lines': ['vlan 20']}]}).run(task_vars={'hostvars': HOSTVARS})
+        self.assertTrue(result['failed'])
+        self.assertIn('Duplicate deploy targets: sw1', result['msg'])
+        self.conns['/sock/sw1'] = FakeConnection(fail='vlan 10')
+        result = action_module({'targets': [{'host': 'sw1', 'lines': ['vlan 10']}]}).run(task_vars={'hostvars': HOSTVARS})
+        self.assertTrue(result['failed'])
+        self.assertEqual('cisconx9_deploy failed on: sw1', result['msg'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""cisconx9 module_utils reply decoding unit tests."""
+__metaclass__ = type
+
+import os
+import json
+import tempfile
+import time
+import shutil
+import unittest
+from unittest.mock import patch
+
+from ansible_collections.sense.cisconx9.plugins.cliconf.cisconx9 import SPOOL_EXPIRY, Cliconf
+from ansible_collections.sense.cisconx9.plugins.module_utils.network import cisconx9
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import (Deadline, DeadlineExceeded, SpooledReply, decode_reply, get_cached_config,
+                                                                                        perf_report, reply_rows, run_commands)
+
+
+class TestSpooledReply(unittest.TestCase):
+    """Unit tests for spooled replies."""
+
+    def test_decode_spooled(self):
+        """Spooled reply is decoded from file, which is unlinked once opened"""
+        data = json.dumps({"TABLE_vlan": {"ROW_vlan": {"vlan": "10"}}}).encode()
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        reply = SpooledReply(path, len(data), 0.1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(len(data), len(reply))
+        self.assertEqual({"TABLE_vlan": {"ROW_vlan": [{"vlan": 10}]}}, decode_reply(reply, {"vlan": int}))
+        reply.close()
+
+    def test_decode_spooled_text(self):
+        """Replies over ORJSON_MAX_SIZE are decoded from text of the map"""
+        data = json.dumps({"TABLE_vlan": {"ROW_vlan": {"vlan": "10", "name": "caf\u00e9"}}}, ensure_ascii=False).encode()
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        reply = SpooledReply(path, len(data), 0.1)
+        self.addCleanup(reply.close)
+        with patch.object(cisconx9, "ORJSON_MAX_SIZE", 0):
+            self.assertEqual({"TABLE_vlan": {"ROW_vlan": [{"vlan": 10, "name": "caf\u00e9"}]}}, decode_reply(reply, {"vlan": int}))
+
+    def test_spool_chunks(self):
+        """Replies are written to the spool file a chunk at a time"""
+        cliconf = Cliconf(None)
+        reply = "\u00e9" + "x" * 100
+        with patch.object(cliconf, "send_command", return_value=reply), patch("ansible_collections.sense.cisconx9.plugins.cliconf.cisconx9.SPOOL_CHUNK", 7):
+            meta = cliconf.get_spooled("show vlan | json", threshold=10)
+        self.addCleanup(shutil.rmtree, os.path.dirname(meta["path"]))
+        with open(meta["path"], "rb") as fobj:
+            self.assertEqual(reply.encode(), fobj.read())
+        self.assertEqual(len(reply.encode()), meta["size"])
+
+    def test_reply_rows(self):
+        """Rows are decoded one at a time, the spooled reply is closed, bad replies are warnings"""
+        rows = [{"disp_mac_addr": "a411.bb40.%04x" % num, "disp_port": "Ethernet1/1"} for num in range(3)]
+        data = json.dumps({"TABLE_mac_address": {"ROW_mac_address": rows}}, indent=1).encode()
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        reply = SpooledReply(path, len(data), 0.1)
+        module, stats = FakeModule(), []
+        self.assertEqual(rows, list(reply_rows(module, "show mac address-table | json", reply, "ROW_mac_address", stats)))
+        self.assertTrue(reply.fobj.closed)
+        self.assertEqual(["show mac address-table | json"], [stat["command"] for stat in stats])
+        single = json.dumps({"TABLE_mac_address": {"ROW_mac_address": rows[0]}})
+        self.assertEqual(rows[:1], list(reply_rows(module, "show mac", single, "ROW_mac_address")))
+        self.assertEqual([], list(reply_rows(module, "show mac", '{"TABLE_mac_address": {"ROW_mac_address": []}}', "ROW_mac_address")))
+        self.assertEqual([], list(reply_rows(module, "show mac", '{}', "ROW_mac_address")))
+        self.assertEqual([], module.warnings)
+        self.assertEqual(rows[:2], list(reply_rows(module, "show mac", data.decode()[:-30], "ROW_mac_address")))
+        self.assertEqual([], list(reply_rows(module, "show mac", "% Invalid command", "ROW_mac_address")))
+        self.assertEqual(2, len(module.warnings))
+
+    def test_spool_cleanup(self):
+        """Replies no module opened expire from the per connection spool directory"""
+        cliconf = Cliconf(None)
+        with patch.object(cliconf, "send_command", return_value="x" * 100):
+            first = cliconf.get_spooled("show vlan | json", threshold=10)["path"]
+            self.addCleanup(shutil.rmtree, os.path.dirname(first))
+            os.utime(first, (time.time() - SPOOL_EXPIRY - 1,) * 2)
+            second = cliconf.get_spooled("show vlan | json", threshold=10)["path"]
+        self.assertEqual(os.path.dirname(first), os.path.dirname(second))
+        self.assertFalse(os.path.exists(first))
+        reply = SpooledReply(second, 100, 0.1)
+        self.assertEqual([], os.listdir(os.path.dirname(second)))
+        reply.close()
+
+
+class FakeModule:
+    """Module with params only"""
+
+    def __init__(self, statedir=None):
+        self.params = {"state_dir": statedir, "state_key": "sw1"}
+        self._socket_path = "/tmp/sock0"
+        self.warnings = []
+
+    def warn(self, msg):
+        """Collect warning"""
+        self.warnings.append(msg)
+
+    @staticmethod
+    def jsonify(data):
+        """Same as AnsibleModule"""
+        return json.dumps(data)
+
+
+class TestCachedConfig(unittest.TestCase):
+    """Unit tests for fingerprint cached running config."""
+
+    def setUp(self):
+        self.statedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.statedir)
+        self.addCleanup(cisconx9._DEVICE_CONFIGS.clear)  # pylint: disable=protected-access
+
+    def cached(self, fingerprint, config):
+        """get_cached_config of a new module run, returns (config, downloaded)"""
+        cisconx9._DEVICE_CONFIGS.clear()  # pylint: disable=protected-access
+        with patch.object(cisconx9, "config_fingerprint", return_value=fingerprint), \
+                patch.object(cisconx9, "get_config", return_value=config) as download:
+            return get_cached_config(FakeModule(self.statedir)), download.called
+
+    def test_cached_config(self):
+        """Config is downloaded only when fingerprint changes or is unknown"""
+        self.assertEqual(("vlan 10", True), self.cached("a", "vlan 10"))
+        self.assertEqual(("vlan 10", False), self.cached("a", "vlan 20"))
+        self.assertEqual(("vlan 20", True), self.cached("b", "vlan 20"))
+        self.assertEqual(("vlan 30", True), self.cached(None, "vlan 30"))
+
+
+class TestSessions(unittest.TestCase):
+    """Unit tests for commands dispatched over several sessions."""
+
+    def test_dispatch(self):
+        """Slow command runs alongside the others, replies stay in order"""
+        busy = set()
+
+        def session_exec(socket_path, command):
+            self.assertNotIn(socket_path, busy)
+            busy.add(socket_path)
+            command = json.loads(command)["command"]
+            time.sleep(0.3 if command == "show ip route vrf all" else 0.05)
+            busy.discard(socket_path)
+            return 0, f"{command} on {socket_path}", ""
+
+        commands = ["show ip route vrf all"] + [f"show vlan id {idx}" for idx in range(5)]
+        with patch.object(cisconx9, "session_exec", side_effect=session_exec):
+            start = time.perf_counter()
+            replies = run_commands(FakeModule(), commands, raw=True, sessions=["/tmp/sock1"])
+            elapsed = time.perf_counter() - start
+        self.assertEqual(commands, [reply.split(" on ")[0] for reply in replies])
+        self.assertEqual({"/tmp/sock0", "/tmp/sock1"}, {reply.split(" on ")[1] for reply in replies})
+        self.assertLess(elapsed, 0.45)
+
+    def test_command_timeout(self):
+        """Command past its deadline leaves the rest unanswered, session stays blocked"""
+        self.addCleanup(cisconx9._BLOCKED_SESSIONS.clear)  # pylint: disable=protected-access
+
+        def exec_command(_module, command):
+            time.sleep(1 if "lldp" in command else 0)
+            return 0, command, ""
+
+        commands = ["show vlan", "show lldp neighbors detail", "show version"]
+        with patch.object(cisconx9, "exec_command", side_effect=exec_command):
+            start = time.perf_counter()
+            with self.assertRaises(DeadlineExceeded) as ctx:
+                run_commands(FakeModule(), commands, raw=True, deadline=Deadline(command_timeout=0.1))
+            self.assertLess(time.perf_counter() - start, 0.5)
+            self.assertEqual("show lldp neighbors detail", ctx.exception.command)
+            self.assertEqual([None, None], ctx.exception.responses[1:])
+            with self.assertRaises(DeadlineExceeded):
+                run_commands(FakeModule(), ["show version"], raw=True, deadline=Deadline(command_timeout=0.1))
+
+
+class TestPerf(unittest.TestCase):
+    """Unit tests for per command metrics."""
+
+    def test_perf_report(self):
+        """Calls, retries, bytes and decode time per command, slow commands warned"""
+        def exec_command(_module, command):
+            command = json.loads(command)["command"]
+            time.sleep(0.2 if "lldp" in command else 0)
+            return 0, '{"TABLE_vlan": {}}' if command.endswith("| json") else "text", ""
+
+        module = FakeModule()
+        stats = []
+        with patch.object(cisconx9, "exec_command", side_effect=exec_command):
+            for _ in range(2):
+                run_commands(module, ["show vlan | json", "show lldp neighbors detail"], normalize=True, stats=stats)
+        report = perf_report(module, stats, slow=0.1)
+        self.assertEqual({"calls": 2, "retries": 0, "bytes": 36}, {key: report["show vlan | json"][key] for key in ("calls", "retries", "bytes")})
+        self.assertGreater(report["show vlan | json"]["decode"], 0)
+        self.assertEqual(0, report["show lldp neighbors detail"]["decode"])
+        self.assertGreaterEqual(report["show lldp neighbors detail"]["max"], 0.2)
+        self.assertEqual(1, len(module.warnings))
+        self.assertIn("show lldp neighbors detail", module.warnings[0])
+
+    def test_transport_retry(self):
+        """Only transport errors are retried, bytes are counted as sent"""
+        replies = {"show vlan": [(1, "", "unable to connect to socket"), (0, "caf\u00e9", "")],
+                   "show bogus": [(-32603, "", "% Invalid command"), (0, "", "")]}
+
+        def exec_command(_module, command):
+            return replies[json.loads(command)["command"]].pop(0)
+
+        module, stats = FakeModule(), []
+        with patch.object(cisconx9, "exec_command", side_effect=exec_command), patch.object(cisconx9, "TRANSPORT_BACKOFF", 0):
+            self.assertEqual(["caf\u00e9"], run_commands(module, ["show vlan"], stats=stats))
+            self.assertEqual((-32603, "", "% Invalid command"), cisconx9._run_command(module, {"command": "show bogus", "prompt": None}, None, stats))  # pylint: disable=protected-access
+            replies["show vlan"] = [(1, "", "unable to connect to socket")] * (cisconx9.TRANSPORT_RETRIES + 2)
+            self.assertEqual(1, cisconx9._run_command(module, {"command": "show vlan", "prompt": None}, None, stats)[0])  # pylint: disable=protected-access
+        self.assertEqual(1, len(replies["show vlan"]))
+        report = perf_report(module, stats)
+        self.assertEqual({"calls": 5, "retries": 3, "bytes": 5}, {key: report["show vlan"][key] for key in ("calls", "retries", "bytes")})
+        self.assertEqual({"calls": 1, "retries": 0}, {key: report["show bogus"][key] for key in ("calls", "retries")})
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Running-config packing unit tests (synthetic config)."""
+__metaclass__ = type
+
+import json
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.configpack import pack_config, unpack_config
+
+
+def port(idx):
+    """Interface block, same for every port except its name"""
+    return {"__XML__value": f"Ethernet1/{idx}",
+            "m1:description": {"__XML__PARAM__desc-line": {"__XML__value": "to-host"}},
+            "m1:mtu": {"__XML__PARAM__mtu": {"__XML__value": "9216"}}, "m1:no": {"m2:shutdown": {}}}
+
+
+class TestConfigPack(unittest.TestCase):
+    """Unit tests for configpack module_utils."""
+
+    def setUp(self):
+        self.config = {"nf:filter": {"m:configure": {"m:terminal": {
+            "interface": {"__XML__PARAM__interface": [port(idx) for idx in range(1, 100)]},
+            # Original data that looks like references
+            "x": [{"$ref": "0"}, {"$lit": {"$ref": "1"}}, {"$tpl": "2", "$v": [None]}, [], {}, None, 1.5]}}}}
+
+    def test_roundtrip(self):
+        """Exact reconstruction (key order included) and smaller payload"""
+        for compress in (False, True):
+            packed = json.loads(json.dumps(pack_config(self.config, compress=compress)))
+            self.assertEqual(json.dumps(self.config), json.dumps(unpack_config(packed)))
+            self.assertLess(len(json.dumps(packed)), len(json.dumps(self.config)) / 2)
+
+    def test_marker_keys(self):
+        """Dicts with marker keys next to other keys, repeated and nested"""
+        odd = [{"$tpl": "x", "other": 1}, {"$ref": "0", "b": [1, 2], "c": {"$v": [None], "$lit": 3}},
+               {"$v": [1], "a": "port"}, {"a": {"$lit": {"$ref": "1"}, "b": None}}]
+        config = {"x": [dict(item, idx=idx) for idx in range(5) for item in odd] + odd * 3}
+        for min_block in (0, 48):
+            for compress in (False, True):
+                packed = json.loads(json.dumps(pack_config(config, compress=compress, min_block=min_block)))
+                self.assertEqual(json.dumps(config), json.dumps(unpack_config(packed)))
+
+    def test_block_keys(self):
+        """Every distinct block gets its own key"""
+        config = [[{"n": idx, "m": f"v{idx}"}] * 2 for idx in range(300)]
+        packed = pack_config(config, min_block=0)
+        self.assertEqual(300, len(packed["blocks"]))
+        self.assertEqual(config, unpack_config(packed))
+
+    def test_plain(self):
+        """Plain config is returned as is"""
+        self.assertIs(self.config, unpack_config(self.config))
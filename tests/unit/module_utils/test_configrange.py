@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Range compressed config commands unit tests."""
+__metaclass__ = type
+
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.configrange import equivalent, optimize_commands, to_blocks
+
+
+def items(config):
+    """(parents, text) items of [(header, [children])]"""
+    out = []
+    for header, children in config:
+        out.append(((), header))
+        out.extend(((header,), child) for child in children)
+    return out
+
+
+class TestConfigRange(unittest.TestCase):
+    """Unit tests for range compressed config commands."""
+
+    def test_merge_ranges(self):
+        """Blocks with the same children become one range block"""
+        config = [(f"vlan {vlan}", ["name SENSE"]) for vlan in list(range(100, 200)) + [250]]
+        config += [(f"interface Ethernet1/{port}", ["switchport mode trunk", "no shutdown"]) for port in (1, 2, 3, 4, 7)]
+        config += [("interface Ethernet1/5", ["description uplink"]), ("hostname sw1", []), ("vlan 300", [])]
+        commands, stats = optimize_commands(items(config))
+        self.assertEqual(["vlan 100-199,250", "name SENSE",
+                          "interface Ethernet1/1-4, Ethernet1/7", "switchport mode trunk", "no shutdown",
+                          "interface Ethernet1/5", "description uplink", "hostname sw1", "vlan 300"], commands)
+        self.assertEqual({"commands_in": 221, "commands_out": 9, "optimized": True}, stats)
+
+    def test_trunk_vlans(self):
+        """Trunk allowed vlan add/remove lines are folded to their net effect, absolute lists are kept"""
+        adds = ["switchport trunk allowed vlan add 10", "switchport trunk allowed vlan add 11-20",
+                "switchport trunk allowed vlan remove 15", "switchport trunk allowed vlan remove 30"]
+        config = [("interface Ethernet1/1", adds),
+                  ("interface Ethernet1/2", ["switchport trunk allowed vlan 1-5"] + adds),
+                  ("interface Ethernet1/3", adds + ["no switchport trunk allowed vlan"])]
+        commands, _ = optimize_commands(items(config))
+        self.assertEqual(["interface Ethernet1/1",
+                          "switchport trunk allowed vlan add 10-14,16-20", "switchport trunk allowed vlan remove 15,30",
+                          "interface Ethernet1/2", "switchport trunk allowed vlan 1-5"] + adds +
+                         ["interface Ethernet1/3"] + adds + ["no switchport trunk allowed vlan"], commands)
+        config = [(f"interface Ethernet1/{port}", ["switchport trunk allowed vlan except 10", "switchport trunk allowed vlan add 10"])
+                  for port in (1, 2)]
+        commands, _ = optimize_commands(items(config))
+        self.assertEqual(["interface Ethernet1/1-2", "switchport trunk allowed vlan except 10", "switchport trunk allowed vlan add 10"], commands)
+
+    def test_equivalent(self):
+        """Changed per object config is detected"""
+        blocks = to_blocks(items([("interface Ethernet1/1", ["no shutdown"]), ("interface Ethernet1/2", ["no shutdown"])]))
+        self.assertTrue(equivalent(blocks, [("interface Ethernet1/1-2", ["no shutdown"])]))
+        self.assertFalse(equivalent(blocks, [("interface Ethernet1/1-3", ["no shutdown"])]))
+        self.assertFalse(equivalent(blocks, [("interface Ethernet1/1-2", ["shutdown"])]))
+        self.assertEqual(5, optimize_commands([((), "router bgp 1"), (("router bgp 1",), "vrf a"),
+                                               (("router bgp 1", "vrf a"), "x"), ((), "vlan 1"), ((), "vlan 2")])[1]["commands_out"])
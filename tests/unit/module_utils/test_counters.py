@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Counter rate computation unit tests (synthetic samples)."""
+__metaclass__ = type
+
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.counters import (COUNTER32, COUNTER64, COUNTER_NAMES, compute_rates, counter_delta, make_sample)
+
+
+def sample(mono, octets, pkts=0, wall=None):
+    """Sample with in/out octets set to octets and all other counters to pkts"""
+    values = [octets, octets] + [pkts] * (len(COUNTER_NAMES) - 2)
+    return make_sample({"Ethernet1/1": values}, mono=mono, wall=wall if wall is not None else 1700000000 + mono)
+
+
+class TestCounters(unittest.TestCase):
+    """Unit tests for counters module_utils."""
+
+    def test_counter_delta_no_wrap(self):
+        """Plain increase"""
+        self.assertEqual(1000, counter_delta(5000, 6000))
+
+    def test_counter_delta_wrap32(self):
+        """32 bit counter wrapped"""
+        self.assertEqual(1100, counter_delta(COUNTER32 - 100, 1000, bits=32))
+
+    def test_counter_delta_wrap64(self):
+        """64 bit counter wrapped"""
+        self.assertEqual(150, counter_delta(COUNTER64 - 50, 100))
+
+    def test_counter_delta_reset(self):
+        """Cleared counters are not treated as wrap"""
+        self.assertEqual(10, counter_delta(1000, 10))
+        self.assertEqual(10, counter_delta(COUNTER64 // 4, 10))
+        # A 64 bit counter below 2**32 was cleared, not wrapped
+        self.assertEqual(10, counter_delta(COUNTER32 - 100, 10))
+        self.assertEqual(10, counter_delta(COUNTER32 // 4, 10, bits=32))
+
+    def test_rates(self):
+        """Rates over 30s interval"""
+        interval, rates = compute_rates(sample(100, 1000, 10), sample(130, 1000 + 30 * 125, 13))
+        self.assertEqual(30, interval)
+        self.assertEqual(1000, rates["Ethernet1/1"]["in_bps"])
+        self.assertEqual(1000, rates["Ethernet1/1"]["out_bps"])
+        self.assertEqual(3, rates["Ethernet1/1"]["in_errors_delta"])
+
+    def test_rates_wrap(self):
+        """Rates over a wrapped 64 bit counter"""
+        _, rates = compute_rates(sample(100, COUNTER64 - 100), sample(110, 900))
+        self.assertEqual(800, rates["Ethernet1/1"]["in_bps"])
+
+    def test_no_previous(self):
+        """First run has no rates"""
+        self.assertEqual((None, {}), compute_rates({}, sample(100, 1000)))
+
+    def test_controller_reboot(self):
+        """Samples from before controller reboot are not comparable"""
+        prev = sample(5000, 1000, wall=1700000000)
+        cur = sample(10, 2000, wall=1700000100)
+        self.assertEqual((None, {}), compute_rates(prev, cur))
+
+    def test_new_port(self):
+        """Port without previous reading has no rates"""
+        prev = sample(100, 1000)
+        cur = sample(130, 2000)
+        cur["ports"]["Ethernet1/2"] = list(cur["ports"]["Ethernet1/1"])
+        _, rates = compute_rates(prev, cur)
+        self.assertNotIn("Ethernet1/2", rates)
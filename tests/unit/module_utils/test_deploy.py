@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fan-out config deployment unit tests (fake connections)."""
+__metaclass__ = type
+
+import time
+import threading
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.deploy import DeployError, DeployTarget, deploy, plan, push_config
+
+
+class FakeConnection:
+    """Records config commands, sleeps delay per command, rejects fail
+    command, replies running to show running-config"""
+
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, delay=0.0, fail=None, log=None, running=""):
+        self.delay = delay
+        self.running = running
+        self.fail = fail
+        self.commands = []
+        self.log = log if log is not None else []
+
+    def exec_command(self, command):
+        """Run command (fail may be a list of commands)"""
+        with self.lock:
+            FakeConnection.active += 1
+            FakeConnection.peak = max(FakeConnection.peak, FakeConnection.active)
+        try:
+            time.sleep(self.delay)
+            if command == "show running-config":
+                return self.running
+            self.commands.append(command)
+            self.log.append((id(self), command))
+            if command == self.fail or (isinstance(self.fail, list) and command in self.fail):
+                return "% Invalid command at '^' marker."
+            return ""
+        finally:
+            with self.lock:
+                FakeConnection.active -= 1
+
+
+class TestDeploy(unittest.TestCase):
+    """Unit tests for deploy module_utils."""
+
+    def setUp(self):
+        FakeConnection.active = FakeConnection.peak = 0
+
+    def test_concurrency_limit(self):
+        """All devices pushed, at most max_workers at a time, concurrently"""
+        conns = [FakeConnection(delay=0.02) for _ in range(6)]
+        start = time.perf_counter()
+        result = deploy([DeployTarget(f"sw{idx}", conn, ["vlan 10"]) for idx, conn in enumerate(conns)], max_workers=3)
+        self.assertTrue(result["ok"])
+        self.assertEqual(3, FakeConnection.peak)
+        self.assertLess(time.perf_counter() - start, 6 * 3 * 0.02)
+        self.assertEqual(["configure terminal", "vlan 10", "end"], conns[0].commands)
+        self.assertIn("load", result["devices"]["sw0"]["timings"])
+
+    def test_waves_in_order(self):
+        """Wave 1 starts after wave 0 finished"""
+        log = []
+        first, second = FakeConnection(delay=0.01, log=log), FakeConnection(log=log)
+        deploy([DeployTarget("sw2", second, ["vlan 10"], wave=1), DeployTarget("sw1", first, ["vlan 10"], wave=0)])
+        self.assertEqual([id(first)] * 3 + [id(second)] * 3, [conn for conn, _ in log])
+
+    def test_abort_on_failure(self):
+        """Failed device stops later waves and leaves config mode"""
+        bad = FakeConnection(fail="vlan 10")
+        later = FakeConnection()
+        result = deploy([DeployTarget("sw1", bad, ["vlan 10", "name x"]), DeployTarget("sw2", later, ["vlan 10"], wave=1)])
+        self.assertFalse(result["ok"])
+        self.assertEqual("failed", result["devices"]["sw1"]["status"])
+        self.assertEqual("skipped", result["devices"]["sw2"]["status"])
+        self.assertEqual(["configure terminal", "vlan 10", "end"], bad.commands)
+        self.assertEqual([], later.commands)
+
+    def test_no_abort(self):
+        """Without abort_on_failure other devices are pushed and saved"""
+        later = FakeConnection()
+        result = deploy([DeployTarget("sw1", FakeConnection(fail="vlan 10"), ["vlan 10"]), DeployTarget("sw2", later, ["vlan 10"], wave=1)],
+                        save=True, abort_on_failure=False)
+        self.assertEqual("ok", result["devices"]["sw2"]["status"])
+        self.assertIn("copy running-config startup-config", later.commands[-1])
+
+    def test_end_failure(self):
+        """A failed end does not hide the error of the failed command"""
+        conn = FakeConnection(fail=["vlan 10", "end"])
+        with self.assertRaises(DeployError) as ctx:
+            push_config(conn, ["vlan 10", "name x"])
+        self.assertTrue(str(ctx.exception).startswith("vlan 10: "))
+        self.assertEqual(["configure terminal", "vlan 10", "end"], conn.commands)
+
+    def test_duplicate_names(self):
+        """Targets with the same name are rejected before anything is pushed"""
+        conn = FakeConnection()
+        self.assertRaises(ValueError, deploy, [DeployTarget("sw1", conn, ["vlan 10"]), DeployTarget("sw1", conn, ["vlan 20"], wave=1)])
+        self.assertEqual([], conn.commands)
+
+    def test_running_config(self):
+        """Only lines missing from the running config are pushed, unchanged devices are not"""
+        conns = [FakeConnection(running="vlan 10\n  name x\n"), FakeConnection(running="vlan 10\n  name y\n")]
+        result = deploy([DeployTarget(f"sw{idx}", conn, ["vlan 10", "  name x"]) for idx, conn in enumerate(conns)])
+        self.assertEqual([False, True], [result["devices"][name]["changed"] for name in ("sw0", "sw1")])
+        self.assertEqual([], conns[0].commands)
+        self.assertEqual(["configure terminal", "vlan 10", "name x", "end"], conns[1].commands)
+        result = deploy([DeployTarget("sw0", conns[0], ["vlan 10"])], match="none")
+        self.assertTrue(result["devices"]["sw0"]["changed"])
+
+    def test_plan(self):
+        """Check mode plan lists the lines of each device"""
+        result = plan([DeployTarget("sw1", None, ["vlan 10"]), DeployTarget("sw2", None, [], wave=1)])
+        self.assertEqual({"status": "check_mode", "wave": 0, "commands": 1, "updates": ["vlan 10"], "changed": True}, result["devices"]["sw1"])
+        self.assertFalse(result["devices"]["sw2"]["changed"])
+        self.assertRaises(ValueError, plan, [DeployTarget("sw1", None, []), DeployTarget("sw1", None, [])])
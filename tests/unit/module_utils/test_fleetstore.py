@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fleet facts store unit tests (synthetic facts)."""
+__metaclass__ = type
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network import fleetstore
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.fleetstore import FleetStore
+
+
+def facts(tagged, nexthop="10.0.0.1"):
+    """Facts of a switch trunking VLAN 100 on tagged ports"""
+    return {"ansible_net_hostname": "sw",
+            "ansible_net_interfaces": {"Ethernet1/1": {"operstatus": "up", "mac": "a411.bb40.0001", "switchport": "yes"},
+                                       "Vlan100": {"operstatus": "active", "tagged": tagged}},
+            "ansible_net_info": {"macs": ["a4:11:bb:40:00:01", "a4:11:bb:40:00:ff"]},
+            "ansible_net_lldp": {"Ethernet1/1": {"local_port_id": "Ethernet1/1", "remote_chassis_id": "Et:he:rn:et:1/:2",
+                                                 "remote_system_name": "sw2"}},
+            "ansible_net_ipv4": [{"vrf": "default", "to": "0.0.0.0/0", "from": nexthop},
+                                 {"vrf": "default", "to": "10.1.0.0/16", "from": "10.0.0.2"}],
+            "ansible_net_ipv6": [{"vrf": "default", "to": "2001:db8::/32", "from": "fe80::1"}]}
+
+
+class TestFleetStore(unittest.TestCase):
+    """Unit tests for fleetstore module_utils."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = FleetStore(os.path.join(self.tmpdir, "fleet.db"))
+        self.store.update_host("sw1", facts(["Ethernet1/1"]))
+        self.store.update_host("sw2", facts([]))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_queries(self):
+        """Indexed lookups across hosts"""
+        self.assertEqual(["sw1", "sw2"], self.store.hosts())
+        self.assertEqual([("sw1", "Ethernet1/1"), ("sw2", None)], [(row["host"], row["port"]) for row in self.store.find_vlan(100)])
+        self.assertEqual([("sw1", "Ethernet1/1"), ("sw2", "Ethernet1/1")],
+                         [(row["host"], row["port"]) for row in self.store.query("mac", "a411.bb40.0001")])
+        self.assertEqual(["Ethernet1/2"], [row["remote_port"] for row in self.store.find_neighbor("sw2", host="sw1")])
+        self.assertEqual(["10.1.0.0/16", "0.0.0.0/0"], [row["prefix"] for row in self.store.find_address("10.1.2.3", host="sw1")])
+        self.assertEqual(["2001:db8::/32"], [row["prefix"] for row in self.store.find_prefix("2001:db8:0::/32", host="sw2")])
+        self.assertRaises(ValueError, self.store.query, "mac", "nomac")
+        self.assertRaises(ValueError, self.store.query, "hosts", "sw1")
+
+    def test_incremental(self):
+        """Only changed sections are rewritten, missing ones are kept"""
+        self.assertEqual([], self.store.update_host("sw1", facts(["Ethernet1/1"])))
+        self.assertEqual(["routes"], self.store.update_host("sw1", facts(["Ethernet1/1"], nexthop="10.0.0.9")))
+        self.assertEqual(["interfaces"], self.store.update_host("sw1", {"ansible_net_interfaces": {}}))
+        self.assertEqual(["sw2"], [row["host"] for row in self.store.find_vlan(100)])
+        self.assertEqual(1, len(self.store.find_neighbor("sw2", host="sw1")))
+        self.store.remove_host("sw2")
+        self.assertEqual([], self.store.find_vlan(100))
+        self.assertEqual(["sw1"], self.store.hosts())
+
+    def test_locked(self):
+        """Store whose schema can not be created closes its connection"""
+        conns = []
+        sqlite_connect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            conns.append(sqlite_connect(*args, **kwargs))
+            return conns[-1]
+
+        self.store.conn.execute("BEGIN IMMEDIATE")
+        try:
+            with patch.object(fleetstore, "LOCK_TIMEOUT", 0), patch.object(fleetstore.sqlite3, "connect", side_effect=connect):
+                self.assertRaises(sqlite3.OperationalError, FleetStore, os.path.join(self.tmpdir, "fleet.db"))
+        finally:
+            self.store.conn.execute("ROLLBACK")
+        self.assertRaises(sqlite3.ProgrammingError, conns[0].execute, "SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""MAC address normalization unit tests."""
+__metaclass__ = type
+
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.macaddr import format_mac, normalize_mac, parse_mac
+
+
+def mac_splitter(inputmac):
+    """macSplitter of cisconx9_facts before macaddr (reference output)"""
+    macaddr = inputmac.strip().replace(".", "")
+    return ":".join(macaddr[index:index + 2] for index in range(0, len(macaddr), 2))
+
+
+class TestMacAddr(unittest.TestCase):
+    """Unit tests for macaddr module_utils."""
+
+    def test_parse_format(self):
+        """All device forms parse to the same int, others are not MACs"""
+        for text in ("a411.bb40.c601", "A4:11:BB:40:C6:01", "a4-11-bb-40-c6-01", " a411bb40c601 "):
+            self.assertEqual(0xa411bb40c601, parse_mac(text), text)
+        for text in ("", "a411.bb40", "a411.bb40.c601.0000", "g411.bb40.c601", "Ethernet1/1"):
+            self.assertIsNone(parse_mac(text), text)
+        self.assertEqual("a4:11:bb:40:c6:01", format_mac(0xa411bb40c601))
+        self.assertEqual("00:00:00:00:00:01", format_mac(1))
+
+    def test_normalize(self):
+        """Same output as the previous macSplitter for device MACs and other values"""
+        for text in ("a411.bb40.c601", "A411.BB40.C601", " 000e.1e05.0001 ", "Ethernet1/1", "Eth1/2", "null"):
+            self.assertEqual(mac_splitter(text), normalize_mac(text), text)
+        self.assertEqual("a4:11:bb:40:c6:01", normalize_mac("a4-11-bb-40-c6-01"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Interface records unit tests."""
+__metaclass__ = type
+
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.records import InterfaceRecord, port_key
+
+
+class TestRecords(unittest.TestCase):
+    """port_key and InterfaceRecord tests"""
+
+    def test_port_key(self):
+        """Ports sort by type and numbers, not as text"""
+        names = ["Vlan100", "Ethernet1/10", "port-channel2", "Ethernet1/2", "Vlan20", "Ethernet1/1/3", "mgmt0"]
+        self.assertEqual(sorted(names, key=port_key),
+                         ["Ethernet1/1/3", "Ethernet1/2", "Ethernet1/10", "mgmt0", "port-channel2", "Vlan20", "Vlan100"])
+
+    def test_record(self):
+        """Only set fields are output, tagged once per port"""
+        record = InterfaceRecord()
+        record.update({"operstatus": "up", "mtu": "9216"})
+        record.append("ipv4", {"address": "10.0.0.1"})
+        portbits = {}
+        record.add_tagged("Ethernet1/1", portbits)
+        record.add_tagged("Ethernet1/1", portbits)
+        record.add_tagged("Ethernet1/2", portbits)
+        self.assertEqual(record.to_dict(), {"operstatus": "up", "mtu": "9216", "ipv4": [{"address": "10.0.0.1"}],
+                                            "tagged": ["Ethernet1/1", "Ethernet1/2"]})
+        # Ports already tagged (show vlan) are not added again
+        vlan = InterfaceRecord(tagged=["Ethernet1/2"])
+        vlan.add_tagged("Ethernet1/1", portbits)
+        vlan.add_tagged("Ethernet1/2", portbits)
+        self.assertEqual(["Ethernet1/2", "Ethernet1/1"], vlan.tagged)
+        self.assertEqual({"Ethernet1/1": 1, "Ethernet1/2": 2}, portbits)
+        self.assertEqual(record.get("duplex", "none"), "none")
+        placeholder = InterfaceRecord.placeholder().to_dict()
+        self.assertEqual(placeholder["channel-member"], None)
+        self.assertEqual(len(placeholder), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Replay shell unit tests (synthetic session)."""
+__metaclass__ = type
+
+import json
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.replay import INVALID_COMMAND, ReplaySession, ReplayShell
+
+
+def read_all(shell):
+    """Read everything queued in shell"""
+    out = b""
+    while shell._pos < len(shell._buffer):  # pylint: disable=protected-access
+        out += shell.recv(7)
+    return out.decode("utf-8")
+
+
+class TestReplay(unittest.TestCase):
+    """Unit tests for replay module_utils."""
+
+    def setUp(self):
+        reply = {"TABLE_vlan": {"ROW_vlan": {"vlan": "1"}}}
+        self.shell = ReplayShell(ReplaySession(commands={"show vlan | json": reply}, hostname="sw1"))
+        self.assertTrue(read_all(self.shell).endswith("sw1# "))
+
+    def test_command(self):
+        """Recorded output is echoed and followed by prompt"""
+        self.shell.sendall(b"show vlan | json\r")
+        self.assertEqual('show vlan | json\r\n{"TABLE_vlan": {"ROW_vlan": {"vlan": "1"}}}\r\nsw1# ', read_all(self.shell))
+        self.shell.sendall(b"show bgp\r")
+        self.assertIn(INVALID_COMMAND, read_all(self.shell))
+
+    def test_config_mode(self):
+        """Configure mode changes prompt and logs commands"""
+        for command, prompt in (("configure terminal", "sw1(config)# "), ("interface Ethernet1/1", "sw1(config-if)# "),
+                                ("exit", "sw1(config)# "), ("end", "sw1# ")):
+            self.shell.sendall(command.encode() + b"\r")
+            self.assertTrue(read_all(self.shell).endswith(prompt))
+        self.assertEqual(["interface Ethernet1/1"], self.shell.config_log)
+
+    def test_scale(self):
+        """ROW lists are multiplied"""
+        session = ReplaySession(commands={"show vlan | json": {"TABLE_vlan": {"ROW_vlan": {"vlan": "1"}}}}, scale=3)
+        self.assertEqual(3, len(json.loads(session.output("show vlan | json"))["TABLE_vlan"]["ROW_vlan"]))
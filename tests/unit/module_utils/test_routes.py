@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Route index unit tests."""
+__metaclass__ = type
+
+import json
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.routes import aggregate_routes, build_route_index, lookup_route, route_commands
+
+ROUTES = [
+    {"vrf": "default", "to": "0.0.0.0/0", "from": "231.125.196.129"},
+    {"vrf": "default", "to": "10.0.0.0/8", "from": "10.255.0.1"},
+    {"vrf": "default", "to": "10.1.2.0/24", "from": "10.1.2.1"},
+    {"vrf": "default", "to": "10.1.2.0/24", "from": "10.1.2.2"},
+    {"vrf": "default", "to": "2b0b:7d:0:4421::/64", "from": "2b0b:7d:0:4421:f0:0:196:139"},
+    {"vrf": "management", "to": "172.24.20.0/24", "from": "172.24.20.1"},
+]
+
+
+class TestRouteIndex(unittest.TestCase):
+    """Unit tests for route index."""
+
+    def setUp(self):
+        # Lookups must work on the serialized form
+        self.index = json.loads(json.dumps(build_route_index(ROUTES)))
+
+    def test_longest_match(self):
+        """Most specific prefix wins, ECMP next hops are kept"""
+        self.assertEqual({"prefix": "10.1.2.0/24", "nexthops": ["10.1.2.1", "10.1.2.2"]}, lookup_route(self.index, "10.1.2.3"))
+        self.assertEqual("10.0.0.0/8", lookup_route(self.index, "10.1.3.3")["prefix"])
+        self.assertEqual("0.0.0.0/0", lookup_route(self.index, "8.8.8.8")["prefix"])
+
+    def test_vrf_and_family(self):
+        """Lookups are per VRF and address family"""
+        self.assertEqual(["172.24.20.1"], lookup_route(self.index, "172.24.20.5", "management")["nexthops"])
+        self.assertIsNone(lookup_route(self.index, "8.8.8.8", "management"))
+        self.assertEqual("2b0b:7d:0:4421::/64", lookup_route(self.index, "2b0b:7d:0:4421::5")["prefix"])
+        self.assertIsNone(lookup_route(self.index, "2b0b:7d:0:4422::5"))
+
+
+class TestRouteAggregation(unittest.TestCase):
+    """Unit tests for route aggregation."""
+
+    def test_aggregate(self):
+        """Adjacent and covered prefixes of one VRF and next hop are merged"""
+        routes = [{"vrf": "default", "to": f"10.0.{i}.0/24", "from": "10.255.0.1"} for i in range(4)]
+        routes += [{"vrf": "default", "to": "10.0.1.128/25", "from": "10.255.0.1"},
+                   {"vrf": "default", "to": "10.0.4.0/24", "from": "10.255.0.1"},
+                   {"vrf": "default", "to": "10.0.5.0/24", "from": "10.255.0.2"},
+                   {"vrf": "vpn", "to": "10.0.6.0/24", "from": "10.255.0.1"},
+                   {"vrf": "default", "to": "2b0b:7d::/33", "from": "fe80::1"},
+                   {"vrf": "default", "to": "2b0b:7d:8000::/33", "from": "fe80::1"}]
+        out, stats = aggregate_routes(routes)
+        self.assertEqual([{"vrf": "default", "to": "10.0.0.0/22", "from": "10.255.0.1"},
+                          {"vrf": "default", "to": "10.0.4.0/24", "from": "10.255.0.1"},
+                          {"vrf": "default", "to": "10.0.5.0/24", "from": "10.255.0.2"},
+                          {"vrf": "default", "to": "2b0b:7d::/32", "from": "fe80::1"},
+                          {"vrf": "vpn", "to": "10.0.6.0/24", "from": "10.255.0.1"}], out)
+        self.assertEqual({"routes": 10, "aggregated": 5, "ratio": 2.0}, stats)
+
+    def test_same_reachability(self):
+        """Nothing to merge: lookups give the same result"""
+        out, _ = aggregate_routes(ROUTES)
+        for address in ("10.1.2.3", "10.200.0.1", "8.8.8.8", "2b0b:7d:0:4421::5"):
+            self.assertEqual(lookup_route(build_route_index(ROUTES), address), lookup_route(build_route_index(out), address))
+
+
+class TestRouteCommands(unittest.TestCase):
+    """Unit tests for filtered route commands."""
+
+    def test_route_commands(self):
+        """Commands per VRF, prefix family and source"""
+        self.assertEqual([(4, "show ip route vrf all | json"), (6, "show ipv6 route vrf all | json")], route_commands())
+        self.assertEqual([(4, "show ip route 10.0.0.0/8 longer-prefixes static vrf default | json"),
+                          (4, "show ip route 10.0.0.0/8 longer-prefixes static vrf vpn | json"),
+                          (6, "show ipv6 route 2b0b:7d::/32 longer-prefixes static vrf default | json"),
+                          (6, "show ipv6 route 2b0b:7d::/32 longer-prefixes static vrf vpn | json")],
+                         route_commands(["default", "vpn"], ["10.1.0.0/8", "2b0b:7d::/32"], ["static"]))
+        for args in ({"prefixes": ["10.0.0.0/33"]}, {"prefixes": ["host"]}, {"vrfs": ["all | no-more"]}):
+            with self.assertRaises(ValueError):
+                route_commands(**args)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""LLDP topology graph unit tests (synthetic LLDP facts)."""
+__metaclass__ = type
+
+import json
+import unittest
+
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.topology import Topology
+
+
+def lldp(**ports):
+    """LLDP facts as cisconx9_facts reports them: {local port: (system, remote port)}"""
+    out = {}
+    for local, (system, remote) in ports.items():
+        local = local.replace("_", "/")
+        out[local] = {"local_port_id": local, "remote_chassis_id": ":".join(remote[idx:idx + 2] for idx in range(0, len(remote), 2))}
+        if system:
+            out[local]["remote_system_name"] = system
+    return out
+
+
+class TestTopology(unittest.TestCase):
+    """Unit tests for topology module_utils."""
+
+    def setUp(self):
+        self.topo = Topology()
+        self.topo.add_macs("sw2", ["a411.bb40.0001"])
+        self.topo.update_host("sw1.example.org", lldp(Ethernet1_1=("sw2", "Ethernet1/2"), Ethernet1_3=(None, "a411.bb40.0001"),
+                                                      Ethernet1_4=(None, "000e.1e05.8fb0")))
+        self.topo.update_host("sw2", lldp(Ethernet1_2=("sw1", "Ethernet1/1")), macs=["a411.bb40.0001"])
+
+    def test_graph(self):
+        """Both ends of a link make one edge, MACs resolve to hosts"""
+        self.assertEqual({"Ethernet1/1": ("sw2", "Ethernet1/2"), "Ethernet1/3": ("sw2", "a4:11:bb:40:00:01"),
+                          "Ethernet1/4": ("00:0e:1e:05:8f:b0", "00:0e:1e:05:8f:b0")}, self.topo.neighbors("sw1"))
+        self.assertEqual(3, len(self.topo.edges))
+
+    def test_incremental(self):
+        """Only changed edges are reported, serialized form survives a round trip"""
+        topo = Topology.load(json.loads(json.dumps(self.topo.dump())))
+        self.assertEqual((set(), set()), topo.update_host("sw2", lldp(Ethernet1_2=("sw1", "Ethernet1/1")), macs=["a411.bb40.0001"]))
+        # Link still reported by sw2
+        self.assertEqual((set(), set()), topo.update_host("sw1", lldp(Ethernet1_3=(None, "a411.bb40.0001"), Ethernet1_4=(None, "000e.1e05.8fb0"))))
+        added, removed = topo.update_host("sw2", lldp(Ethernet1_5=("sw3", "Ethernet1/1")), macs=["a411.bb40.0001"])
+        self.assertEqual([("sw2", "Ethernet1/5", "sw3", "Ethernet1/1")], [topo.edge_names(edge) for edge in added])
+        self.assertEqual([("sw1", "Ethernet1/1", "sw2", "Ethernet1/2")], [topo.edge_names(edge) for edge in removed])
+        self.assertEqual(topo.dump(), Topology.load(topo.dump()).dump())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cisconx9 config module unit tests."""
+__metaclass__ = type
+
+import shutil
+import tempfile
+
+from unittest.mock import patch
+from ansible_collections.sense.cisconx9.tests.unit.modules.cisconx9_module import TestciscoNX9Module, set_module_args
+from ansible_collections.sense.cisconx9.plugins.modules import cisconx9_config
+
+MODULE = 'ansible_collections.sense.cisconx9.plugins.modules.cisconx9_config'
+
+
+class TestciscoNX9Config(TestciscoNX9Module):
+    """Unit tests for cisconx9_config idempotence fast path."""
+
+    module = cisconx9_config
+
+    def setUp(self):
+        """Device with a running config and a config change marker."""
+        super(TestciscoNX9Config, self).setUp()
+        self.marker = '100'
+        self.running = 'hostname sw1\n'
+        self.statedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.statedir)
+        mocks = {'run_commands': self.run_commands, 'get_config': self.get_config, 'get_cached_config': self.get_config,
+                 'load_config': self.load_config}
+        self.mocks = {}
+        for name, side_effect in mocks.items():
+            mocker = patch(f'{MODULE}.{name}', side_effect=side_effect)
+            self.mocks[name] = mocker.start()
+            self.addCleanup(mocker.stop)
+
+    def run_commands(self, module, commands, **kwargs):
+        """Only the marker command is expected"""
+        self.assertEqual(['show accounting log last-index'], commands)
+        return [self.marker]
+
+    def get_config(self, module, *args, **kwargs):
+        """Running config"""
+        return self.running
+
+    def load_config(self, module, commands, stats=None):
+        """Push changes the config and the marker"""
+        self.running = 'hostname sw2\n'
+        self.marker = str(int(self.marker) + 1)
+
+    def args(self, **kwargs):
+        """Module args of an idempotent hostname change"""
+        return dict({'lines': ['hostname sw2'], 'idempotence': True, 'state_dir': self.statedir, 'state_key': 'sw1'}, **kwargs)
+
+    def test_cisconx9_config_idempotence_hit(self):
+        """Test an applied candidate at an unchanged marker is not downloaded, diffed or pushed."""
+        set_module_args(self.args())
+        result = self.execute_module(changed=True, commands=['hostname sw2'])
+        self.assertFalse(result['idempotence_hit'])
+        self.assertEqual(1, self.mocks['load_config'].call_count)
+        self.mocks['get_config'].reset_mock()
+        result = self.execute_module(changed=False)
+        self.assertTrue(result['idempotence_hit'])
+        self.assertNotIn('commands', result)
+        self.mocks['get_config'].assert_not_called()
+        self.assertEqual(1, self.mocks['load_config'].call_count)
+
+    def test_cisconx9_config_device_changed(self):
+        """Test a changed device config falls through to a normal diff."""
+        set_module_args(self.args())
+        self.execute_module(changed=True, commands=['hostname sw2'])
+        # Config changed on the device (and the marker with it)
+        self.running = 'hostname sw1\n'
+        self.marker = '200'
+        set_module_args(self.args(config_cache=True))
+        result = self.execute_module(changed=True, commands=['hostname sw2'])
+        self.assertFalse(result['idempotence_hit'])
+        self.mocks['get_cached_config'].assert_called()
+        self.assertEqual(2, self.mocks['load_config'].call_count)
+        # Device already has the candidate: verified by diff, then a hit
+        self.marker = '300'
+        self.execute_module(changed=False)
+        result = self.execute_module(changed=False)
+        self.assertTrue(result['idempotence_hit'])
+        self.assertEqual(2, self.mocks['load_config'].call_count)
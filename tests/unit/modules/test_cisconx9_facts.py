@@ -3,12 +3,24 @@
 """Cisconx9 module unit tests."""
 __metaclass__ = type
 
+import os
 import json
+import shutil
+import tempfile
+import unittest
 
 from unittest.mock import *
 from ansible_collections.sense.cisconx9.tests.unit.modules.cisconx9_module import TestciscoNX9Module, load_fixture
 from ansible_collections.sense.cisconx9.tests.unit.modules.cisconx9_module import set_module_args
 from ansible_collections.sense.cisconx9.plugins.modules import cisconx9_facts
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.cisconx9 import DeadlineExceeded, SpooledReply, normalize_reply
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.counters import COUNTER_NAMES
+from ansible_collections.sense.cisconx9.plugins.module_utils.network.routes import lookup_route
+
+
+def failed_parse_job(index):
+    """parse_job of a worker which can not parse"""
+    raise OSError(f"worker {index} failed")
 
 
 class TestciscoNX9Facts(TestciscoNX9Module):
@@ -48,7 +60,11 @@ class TestciscoNX9Facts(TestciscoNX9Module):
                     command = str(command).replace('|', '')
                 filename = str(command).replace(' ', '_')
                 filename = filename.replace('/', '7')
-                output.append(load_fixture(filename))
+                data = load_fixture(filename)
+                if kwargs.get('raw'):
+                    output.append(data if isinstance(data, str) else json.dumps(data))
+                else:
+                    output.append(normalize_reply(data, kwargs.get('schema')))
             return output
 
         self.run_commands.side_effect = load_from_file
@@ -62,6 +78,14 @@ class TestciscoNX9Facts(TestciscoNX9Module):
         self.assertEquals('cisco Nexus9000C93600CD-GX Chassis', ansible_facts['ansible_net_hwid'])
         self.assertEquals('9.3(10)', ansible_facts['ansible_net_version'])
 
+    def test_cisconx9_facts_gather_subset_opt_in(self):
+        """Test fingerprint, counters and mac_table are gathered only if named."""
+        for gather_subset, subsets in [(['!routing'], ['config', 'default', 'interfaces']),
+                                       (['all', '!config'], ['default', 'interfaces', 'routing']),
+                                       (['mac_table', '!interfaces'], ['default', 'mac_table'])]:
+            set_module_args({'gather_subset': gather_subset})
+            self.assertEqual([subsets], self.execute_module()['ansible_facts']['ansible_net_gather_subset'])
+
     def test_cisconx9_facts_gather_subset_config(self):
         """Test the gather_subset=config option."""
         set_module_args({'gather_subset': 'config'})
@@ -101,3 +125,217 @@ class TestciscoNX9Facts(TestciscoNX9Module):
         self.assertIn("ansible_net_ipv6", ansible_facts)
         self.assertIn({'vrf': 'default', 'to': '2b0b:7d:0:2841::1/128', 'from': '2b0b:7d:0:2841::1'}, ansible_facts['ansible_net_ipv6'])
         self.assertIn( {'vrf': 'default', 'to': '2b0b:7d:0:4421::/64', 'from': '2b0b:7d:0:4421:f0:0:196:139'}, ansible_facts['ansible_net_ipv6'])
+
+    def test_cisconx9_facts_gather_subset_mac_table(self):
+        """Test the gather_subset=mac_table option."""
+        set_module_args({'gather_subset': ['mac_table']})
+        ansible_facts = self.execute_module()['ansible_facts']
+        rows = load_fixture('show_mac_address-table__json')['TABLE_mac_address']['ROW_mac_address']
+        table = ansible_facts['ansible_net_mac_table']
+        # Entries which are not MACs are left out
+        rows = [row for row in rows if row['disp_mac_addr'] != 'bad']
+        self.assertEqual(len({(row['disp_port'], row['disp_vlan'], row['disp_mac_addr']) for row in rows}),
+                         ansible_facts['ansible_net_mac_table_count'])
+        self.assertEqual(sorted({row['disp_port'] for row in rows}), sorted(table))
+        self.assertIn('00:00:0c:07:ac:00', table['Ethernet1/1']['100'])
+        self.assertEqual(sorted(table['Ethernet1/1']['100']), table['Ethernet1/1']['100'])
+
+    def test_cisconx9_facts_mac_table_limit(self):
+        """Test mac_table_limit caps the table and warns."""
+        set_module_args({'gather_subset': ['mac_table']})
+        full = self.execute_module()['ansible_facts']['ansible_net_mac_table']
+        set_module_args({'gather_subset': ['mac_table'], 'mac_table_limit': 3})
+        with patch.object(cisconx9_facts.AnsibleModule, 'warn') as warn:
+            ansible_facts = self.execute_module()['ansible_facts']
+        self.assertEqual(3, ansible_facts['ansible_net_mac_table_count'])
+        self.assertTrue(ansible_facts['ansible_net_mac_table_truncated'])
+        kept = [(port, vlan, mac) for port, vlans in ansible_facts['ansible_net_mac_table'].items() for vlan, macs in vlans.items() for mac in macs]
+        self.assertEqual(3, len(kept))
+        for port, vlan, mac in kept:
+            self.assertIn(mac, full[port][vlan])
+        self.assertTrue(any('mac_table_limit' in call.args[0] for call in warn.call_args_list))
+
+    def test_cisconx9_facts_parse_mode_parallel(self):
+        """Test parse_mode=parallel gives the same facts as serial."""
+        results = {}
+        for mode in ('serial', 'parallel'):
+            set_module_args({'gather_subset': ['interfaces', 'routing'], 'parse_mode': mode})
+            results[mode] = self.execute_module()['ansible_facts']
+        self.assertEqual(results['serial'], results['parallel'])
+
+    def test_cisconx9_facts_parse_mode_parallel_errors(self):
+        """Test errors of subsets parsed in the module are raised, failed workers fall back to serial parsing."""
+        set_module_args({'gather_subset': ['interfaces', 'routing'], 'parse_mode': 'parallel'})
+        with patch.object(cisconx9_facts.Default, 'parse', side_effect=OSError('disk full')):
+            with self.assertRaisesRegex(Exception, 'disk full'):
+                self.execute_module()
+        serial = self.execute_module()['ansible_facts']
+        with patch.object(cisconx9_facts, 'parse_job', failed_parse_job):
+            self.assertEqual(serial, self.execute_module()['ansible_facts'])
+
+    def test_cisconx9_facts_parse_mode_parallel_spooled(self):
+        """Test spooled replies parsed by workers are closed by the module."""
+        load_fixtures = self.load_fixtures
+        spooled = []
+
+        def spool_replies(commands=None):
+            load_fixtures(commands)
+            load_from_file = self.run_commands.side_effect
+
+            def run_commands(module, commands, **kwargs):
+                replies = load_from_file(module, commands, **kwargs)
+                if not kwargs.get('raw'):
+                    return replies
+                for index, reply in enumerate(replies):
+                    fd, path = tempfile.mkstemp()
+                    os.write(fd, reply.encode())
+                    os.close(fd)
+                    replies[index] = SpooledReply(path, len(reply), 0.1)
+                    spooled.append(replies[index])
+                return replies
+            self.run_commands.side_effect = run_commands
+
+        set_module_args({'gather_subset': ['interfaces', 'routing'], 'parse_mode': 'serial'})
+        serial = self.execute_module()['ansible_facts']
+        self.load_fixtures = spool_replies
+        set_module_args({'gather_subset': ['interfaces', 'routing'], 'parse_mode': 'parallel'})
+        self.assertEqual(serial, self.execute_module()['ansible_facts'])
+        self.assertTrue(spooled)
+        self.assertTrue(all(reply.fobj.closed for reply in spooled))
+
+    def test_cisconx9_facts_time_budget(self):
+        """Test subsets fetched in time are returned when another times out."""
+        load_fixtures = self.load_fixtures
+
+        def hang_routing(commands=None):
+            load_fixtures(commands)
+            load_from_file = self.run_commands.side_effect
+
+            def run_commands(module, commands, **kwargs):
+                if 'route' in commands[0] and kwargs.get('deadline'):
+                    raise DeadlineExceeded(commands[0])
+                return load_from_file(module, commands, **kwargs)
+            self.run_commands.side_effect = run_commands
+
+        self.load_fixtures = hang_routing
+        set_module_args({'gather_subset': ['interfaces', 'routing'], 'time_budget': 10})
+        ansible_facts = self.execute_module()['ansible_facts']
+        self.assertIn('ansible_net_interfaces', ansible_facts)
+        self.assertNotIn('ansible_net_ipv4', ansible_facts)
+        self.assertEqual('ok', ansible_facts['ansible_net_gather_status']['interfaces']['status'])
+        self.assertEqual('timeout', ansible_facts['ansible_net_gather_status']['routing']['status'])
+
+    def test_cisconx9_facts_schedule(self):
+        """Test subsets younger than their max age come from the state store."""
+        statedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, statedir)
+        args = {'gather_subset': ['interfaces', 'routing'], 'schedule': True, 'state_dir': statedir, 'max_age': {'interfaces': 0}}
+        set_module_args(args)
+        first = self.execute_module()['ansible_facts']
+        self.run_commands.reset_mock()
+        set_module_args(args)
+        second = self.execute_module()['ansible_facts']
+        commands = [cmd for call in self.run_commands.call_args_list for cmd in call[0][1]]
+        self.assertIn('show interface | json', commands)
+        self.assertNotIn('show version | json', commands)
+        self.assertNotIn('show ip route vrf all | json', commands)
+        self.assertEqual('cached', second['ansible_net_gather_status']['routing']['status'])
+        self.assertEqual('ok', second['ansible_net_gather_status']['interfaces']['status'])
+        first.pop('ansible_net_gather_status')
+        second.pop('ansible_net_gather_status')
+        self.assertEqual(first, second)
+
+    def test_cisconx9_facts_schedule_params(self):
+        """Test facts saved with other subset options are gathered again."""
+        statedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, statedir)
+        args = {'gather_subset': ['routing'], 'schedule': True, 'state_dir': statedir}
+        set_module_args(args)
+        self.execute_module()
+        for extra, status in [({}, 'cached'), ({'routing_aggregate': True}, 'ok'), ({'routing_aggregate': True}, 'cached'),
+                              ({'routing_index': True}, 'ok')]:
+            set_module_args(dict(args, **extra))
+            facts = self.execute_module()['ansible_facts']
+            self.assertEqual(status, facts['ansible_net_gather_status']['routing']['status'])
+            self.assertEqual('routing_aggregate' in extra, 'ansible_net_route_aggregation' in facts)
+
+    def test_cisconx9_facts_route_index_aggregate(self):
+        """Test route index keeps the routes aggregation merges."""
+        def prefix(network, nexthop):
+            return {'ipprefix': network, 'TABLE_path': {'ROW_path': [{'ipnexthop': nexthop}]}}
+        reply = {'TABLE_vrf': {'ROW_vrf': [{'vrf-name-out': 'default', 'TABLE_addrf': {'ROW_addrf': [{'TABLE_prefix': {'ROW_prefix': [
+            prefix('10.0.0.0/24', '10.9.0.1'), prefix('10.0.1.0/24', '10.9.0.1'), prefix('10.0.0.0/23', '10.9.0.2')]}}]}}]}}
+        self.run_commands.side_effect = lambda module, commands, **kwargs: [json.dumps(reply if 'ipv6' not in command else {}) for command in commands]
+        set_module_args({'gather_subset': ['routing'], 'routing_aggregate': True, 'routing_index': True})
+        with patch.object(self, 'load_fixtures'):
+            facts = self.execute_module()['ansible_facts']
+        self.assertEqual([{'vrf': 'default', 'to': '10.0.0.0/23', 'from': '10.9.0.1'}, {'vrf': 'default', 'to': '10.0.0.0/23', 'from': '10.9.0.2'}],
+                         facts['ansible_net_ipv4'])
+        self.assertEqual({'prefix': '10.0.0.0/24', 'nexthops': ['10.9.0.1']}, lookup_route(facts['ansible_net_route_index'], '10.0.0.5'))
+
+    def test_cisconx9_facts_memory_budget(self):
+        """Test per subset memory report and spill of facts over the budget."""
+        set_module_args({'gather_subset': ['interfaces']})
+        facts = self.execute_module()['ansible_facts']
+        set_module_args({'gather_subset': ['interfaces'], 'memory_budget': 100})
+        result = self.execute_module()
+        memory = result['ansible_facts'].pop('ansible_net_memory')
+        self.assertEqual(facts, result['ansible_facts'])
+        self.assertEqual(['default', 'interfaces'], sorted(memory['subsets']))
+        self.assertGreater(memory['subsets']['interfaces']['parse_mb'], 0)
+        self.assertFalse(memory['spill'])
+        with patch('ansible_collections.sense.cisconx9.plugins.module_utils.network.membudget.OUTPUT_FACTOR', 10**6):
+            set_module_args({'gather_subset': ['interfaces'], 'memory_budget': 1})
+            result = self.execute_module()
+        self.addCleanup(os.unlink, result['ansible_facts_file']['file'])
+        self.assertTrue(result['ansible_facts']['ansible_net_memory']['spill'])
+        with open(result['ansible_facts_file']['file'], encoding='utf-8') as fd:
+            self.assertEqual(facts['ansible_net_interfaces'], json.load(fd)['ansible_net_interfaces'])
+
+
+class TestFactsRows(unittest.TestCase):
+    """Unit tests for cisconx9_facts table specs."""
+
+    def test_outer_levels(self):
+        """Fields of outer rows are in every inner row; interfaces without addresses give one row"""
+        reply = {"TABLE_intf": {"ROW_intf": [{"intf-name": "Vlan10"},
+                                             {"intf-name": "Vlan20", "TABLE_addr": {"ROW_addr": {"addr": "2001:db8::1/64"}}}]}}
+        self.assertEqual([{"interface": "Vlan10"}, {"interface": "Vlan20", "ipv6": {"address": "2001:db8::1", "masklen": "64"}}],
+                         list(cisconx9_facts.IPV6_TABLE.rows(reply)))
+        paths = {"ROW_path": [{"ipnexthop": "10.0.0.1"}, {"ipnexthop": "10.0.0.2"}]}
+        reply = {"TABLE_vrf": {"ROW_vrf": [{"vrf-name-out": "default", "TABLE_addrf": {"ROW_addrf": {"TABLE_prefix": {"ROW_prefix": [
+            {"ipprefix": "10.1.0.0/16", "TABLE_path": paths}, {"ipprefix": "10.2.0.0/16"}]}}}}]}}
+        self.assertEqual([{"vrf": "default", "to": "10.1.0.0/16", "from": "10.0.0.1"}, {"vrf": "default", "to": "10.1.0.0/16", "from": "10.0.0.2"}],
+                         list(cisconx9_facts.ROUTE_TABLE.rows(reply)))
+
+    def test_defaults(self):
+        """Values not reported by the device get their defaults"""
+        reply = {"TABLE_interface": {"ROW_interface": [{"interface": "Ethernet1/1"}]}}
+        self.assertEqual([{"interface": "Ethernet1/1", "trunk_vlans": "none"}], list(cisconx9_facts.SWITCHPORT_TABLE.rows(reply)))
+        reply = {"TABLE_interface": {"ROW_interface": [{"interface": "Ethernet1/1", "eth_inbytes": "100", "eth_outbytes": "n/a"}]}}
+        [row] = cisconx9_facts.COUNTERS_TABLE.rows(reply)
+        self.assertEqual("Ethernet1/1", row.pop("interface"))
+        self.assertEqual([100] + [0] * (len(row) - 1), [row[name] for name in COUNTER_NAMES])
+        reply = {"TABLE_mac_address": {"ROW_mac_address": [{"disp_mac_addr": "a411.bb40.0001", "disp_port": "Ethernet1/1"}]}}
+        self.assertEqual([{"mac": 0xa411bb400001, "vlan": "0", "port": "Ethernet1/1"}], list(cisconx9_facts.MAC_TABLE.rows(reply)))
+
+    def test_skip_values(self):
+        """null and empty values are left out"""
+        reply = {"TABLE_nbor_detail": {"ROW_nbor_detail": [{"l_port_id": "Eth1/1", "port_id": "000e.1e05.0001", "port_desc": "null",
+                                                            "sys_name": "null"}]}}
+        self.assertEqual([{"local_port_id": "Ethernet1/1", "remote_chassis_id": "00:0e:1e:05:00:01"}], list(cisconx9_facts.LLDP_TABLE.rows(reply)))
+        self.assertEqual({"hostname": "sw1"}, cisconx9_facts.VERSION_TABLE.first({"host_name": "sw1", "chassis_id": "", "rr_sys_ver": None}))
+
+    def test_required_keys(self):
+        """Rows without their key field, rows which are not dicts and wrongly typed tables are dropped"""
+        reply = {"TABLE_interface": {"ROW_interface": [{"state": "up"}, "garbage", {"interface": "Ethernet1/1", "state": "up"}]}}
+        self.assertEqual([{"interface": "Ethernet1/1", "operstatus": "up"}], list(cisconx9_facts.INTERFACE_TABLE.rows(reply)))
+        reply = {"TABLE_nbor_detail": {"ROW_nbor_detail": [{"l_port_id": "", "sys_name": "sw2"}]}}
+        self.assertEqual([], list(cisconx9_facts.LLDP_TABLE.rows(reply)))
+        reply = {"TABLE_mac_address": {"ROW_mac_address": [{"disp_mac_addr": "a411.bb40.0001"}, {"disp_mac_addr": "bad", "disp_port": "Ethernet1/1"}]}}
+        self.assertEqual([], list(cisconx9_facts.MAC_TABLE.rows(reply)))
+        reply = {"TABLE_vrf": {"ROW_vrf": [{"vrf-name-out": "default", "TABLE_addrf": {"ROW_addrf": [{"TABLE_prefix": {"ROW_prefix": [
+            {"ipprefix": "10.1.0.0/16", "TABLE_path": {"ROW_path": [{"ipnexthop": ""}, {"uptime": "1d"}]}}]}}]}}]}}
+        self.assertEqual([], list(cisconx9_facts.ROUTE_TABLE.rows(reply)))
+        for reply in ({}, {"TABLE_interface": []}, {"TABLE_interface": {"ROW_interface": "none"}}, []):
+            self.assertEqual([], list(cisconx9_facts.INTERFACE_TABLE.rows(reply)))